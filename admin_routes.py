@@ -1,38 +1,80 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, abort, stream_with_context, send_file
 from flask_login import login_required, current_user
-from sqlalchemy import func, desc, or_, case
+from sqlalchemy import func, desc, or_, false
 from sqlalchemy.orm import joinedload
 from datetime import datetime, date
-import csv, io
 from datetime import date
 from flask import jsonify
 from decimal import Decimal
 import pytz
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import func, and_
+from sqlalchemy import func
 from flask_login import login_required
-import pandas as pd
 from flask import Response
 import xlsxwriter
 from sqlalchemy import extract
-from models import db, Site, Labour, Payment, Attendance, User, LabourMonthlyExpenses, log_event, AuditLog
+from models import db, Site, Labour, Payment, Attendance, User, LabourMonthlyExpenses, log_event
 from sqlalchemy.exc import IntegrityError
 import re
-from services.image_service import save_and_compress_image
-
-from services.dashboard_service import get_admin_dashboard_data
+from services.image_queue_service import enqueue_labour_documents
+
+from services.dashboard_service import get_admin_dashboard_data_cached
+from services.cache_service import bump_data_version
+from services.audit_writer import audit_writer
+from services.compression_service import compressor
+from services.labour_search_service import (
+    labour_search_filter,
+    index_labours,
+    remove_labours,
+    typeahead
+)
+from services.audit_log_service import (
+    parse_audit_filters,
+    search_audit_logs,
+    list_audit_actions
+)
+from services.audit_archive_service import (
+    start_archive_run,
+    get_archive_run,
+    get_latest_archive_run,
+    run_to_dict
+)
+from services.payroll_service import (
+    get_site_payroll,
+    close_payroll_month,
+    reopen_payroll_month,
+    is_month_closed
+)
+from services.ledger_service import apply_ledger_delta, month_key
+from services.payroll_bulk_service import (
+    load_all_sites_payroll,
+    summarize_by_site,
+    all_sites_sheets
+)
 from services.site_dashboard_service import get_admin_site_dashboard
+from services.attendance_calendar_service import (
+    get_month_daily_stats,
+    get_attendance_heatmap,
+    MAX_HEATMAP_MONTHS
+)
+from services.attendance_export_service import build_export_query, iter_attendance_csv
+from services.labour_import_service import import_labours, MAX_IMPORT_ROWS
+from services.export_job_service import (
+    submit_export,
+    get_export_job,
+    job_to_dict
+)
+from services.xlsx_export_service import (
+    xlsx_response,
+    MONTHLY_PAYROLL_COLUMNS,
+    SALARY_SHEET_COLUMNS
+)
 
 import os
-from PIL import Image
-from werkzeug.utils import secure_filename
 
 
 
-MAX_FILE_SIZE = 1 * 1024 * 1024   # 1 MB per file
-MAX_WIDTH = 1200                 # resize width
-JPEG_QUALITY = 75                # compression quality
 
 
 admin_bp = Blueprint('admin_bp', __name__, url_prefix='/admin', template_folder='templates')
@@ -47,7 +89,7 @@ def to_ist(dt):
     return dt.astimezone(IST)
 
 def log_action(action, details=None, site_id=None):
-    log = AuditLog(
+    audit_writer.write(dict(
         user_id=current_user.id,
         username=current_user.username,
         role=current_user.role,
@@ -56,9 +98,7 @@ def log_action(action, details=None, site_id=None):
         details=details,
         ip_address=request.remote_addr,
         created_at=datetime.utcnow()  # always store UTC
-    )
-    db.session.add(log)
-    db.session.commit()
+    ))
 
 
 
@@ -75,100 +115,6 @@ def _to_int(v):
     except Exception:
         return None
 
-def save_and_compress_image(file, labour_id, filename):
-    if not file or not file.filename:
-        return None
-
-    # ---- HARD SIZE CHECK (1 MB) ----
-    file.seek(0, os.SEEK_END)
-    size = file.tell()
-    file.seek(0)
-
-    if size > MAX_FILE_SIZE:
-        raise ValueError("File size must be less than 1 MB")
-
-    # ---- Create upload directory ----
-    upload_dir = os.path.join(
-        current_app.root_path,
-        'static', 'uploads', 'labours', str(labour_id)
-    )
-    os.makedirs(upload_dir, exist_ok=True)
-
-    safe_name = secure_filename(filename)
-    full_path = os.path.join(upload_dir, safe_name)
-
-    # ---- Image processing ----
-    img = Image.open(file)
-
-    # Convert PNG / RGBA to RGB
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
-
-    # Resize if too wide
-    if img.width > MAX_WIDTH:
-        ratio = MAX_WIDTH / img.width
-        img = img.resize(
-            (MAX_WIDTH, int(img.height * ratio)),
-            Image.LANCZOS
-        )
-
-    # Save as optimized JPEG
-    img.save(
-        full_path,
-        format="JPEG",
-        quality=JPEG_QUALITY,
-        optimize=True
-    )
-
-    return f"uploads/labours/{labour_id}/{safe_name}"
-
-#----------archive_audit_logs(days=180)---------------------------
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from models import AuditLog, AuditLogArchive
-
-
-def archive_audit_logs_keep_last_3_months():
-    now = datetime.utcnow()
-
-    # First day of current month
-    first_day_current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    # Keep current + last 2 months → archive older than this
-    cutoff = first_day_current_month - relativedelta(months=2)
-
-    old_logs = AuditLog.query.filter(
-        AuditLog.created_at < cutoff
-    ).all()
-
-    if not old_logs:
-        return 0
-
-    for log in old_logs:
-        archived = AuditLogArchive(
-            user_id=log.user_id,
-            username=log.username,
-            role=log.role,
-            site_id=log.site_id,
-            action=log.action,
-            details=log.details,
-            ip_address=log.ip_address,
-            created_at=log.created_at
-        )
-        db.session.add(archived)
-        db.session.delete(log)
-
-    db.session.commit()
-    return len(old_logs)
-
-
-from flask import send_from_directory
-
-@admin_bp.route('/uploads/<path:filename>')
-@login_required
-def uploaded_file(filename):
-    return send_from_directory('uploads', filename)
-
 
 # dashboard-----------------------------------------------------
 
@@ -179,7 +125,7 @@ def admin_dashboard():
     if current_user.role != 'admin':
         return redirect(url_for('auth.login'))
 
-    dashboard = get_admin_dashboard_data()
+    dashboard = get_admin_dashboard_data_cached()
 
     return render_template(
         "admin_dashboard.html",
@@ -208,7 +154,9 @@ def admin_add_site():
         address = request.form.get('address')
         location = request.form.get('location')
         s = Site(site_name=site_name, address=address, location=location, is_active=True)
-        db.session.add(s); db.session.commit()
+        db.session.add(s)
+        bump_data_version()
+        db.session.commit()
         flash('Site added', 'success')
         return redirect(url_for('admin_bp.admin_sites'))
     return render_template('admin_add_site.html')
@@ -227,6 +175,7 @@ def admin_edit_site(site_id):
         site.location = request.form.get('location')
         site.manager_id = request.form.get('manager_id') or None
 
+        bump_data_version()
         db.session.commit()
         flash('Site updated successfully', 'success')
         return redirect(url_for('admin_bp.admin_sites'))
@@ -244,7 +193,9 @@ def delete_site(site_id):
     if not _admin_required():
         return redirect(url_for('auth.login'))
     site = Site.query.get_or_404(site_id)
-    db.session.delete(site); db.session.commit()
+    db.session.delete(site)
+    bump_data_version()
+    db.session.commit()
     flash('Site deleted', 'info')
     return redirect(url_for('admin_bp.admin_sites'))
 
@@ -257,6 +208,7 @@ def toggle_site_status(site_id):
     site = Site.query.get_or_404(site_id)
     site.is_active = not site.is_active
 
+    bump_data_version()
     db.session.commit()
     flash(
         f"Site {'activated' if site.is_active else 'deactivated'} successfully",
@@ -271,7 +223,8 @@ def admin_site_dashboard(site_id):
     if current_user.role != 'admin':
         return redirect(url_for('auth.login'))
 
-    dashboard = get_admin_site_dashboard(site_id)
+    compare = request.args.get('compare', 'yesterday')
+    dashboard = get_admin_site_dashboard(site_id, compare=compare)
 
     if not dashboard:
         abort(404)
@@ -303,7 +256,9 @@ def admin_add_manager():
         pwd = generate_password_hash(request.form.get('password') or 'manager123')
         site_id = _to_int(request.form.get('site_id'))
         m = User(username=username, password=pwd, role='manager', site_id=site_id)
-        db.session.add(m); db.session.commit()
+        db.session.add(m)
+        bump_data_version()
+        db.session.commit()
         flash('Manager added', 'success')
         return redirect(url_for('admin_bp.admin_managers'))
     sites = Site.query.all()
@@ -324,6 +279,7 @@ def admin_edit_manager(manager_id):
         site_id = request.form.get('site_id')
         manager.site_id = int(site_id) if site_id else None
 
+        bump_data_version()
         db.session.commit()
         flash('Manager updated successfully', 'success')
         return redirect(url_for('admin_bp.admin_managers'))
@@ -344,6 +300,7 @@ def delete_manager(manager_id):
 
     manager = User.query.filter_by(id=manager_id, role='manager').first_or_404()
     db.session.delete(manager)
+    bump_data_version()
     db.session.commit()
 
     flash('Manager deleted successfully', 'success')
@@ -363,15 +320,10 @@ def admin_labours():
 
     query = Labour.query
 
-    # 🔍 Search by name OR phone
+    # 🔍 Search name / phone / gate pass / bank via the token index
     if search:
-        query = query.filter(
-            or_(
-                Labour.name.ilike(f"%{search}%"),
-                Labour.phone.ilike(f"%{search}%"),
-                func.coalesce(Labour.gate_pass_id, '').ilike(f"%{search}%")
-            )
-        )
+        match = labour_search_filter(search, site_id=_to_int(site_id))
+        query = query.filter(match if match is not None else false())
 
     #  Filter by site
     if site_id:
@@ -435,6 +387,9 @@ def admin_add_labour():
 
         try:
             db.session.add(labour)
+            db.session.flush()
+            index_labours([labour])
+            bump_data_version()
             db.session.commit()  # MUST commit first to get labour.id
         except IntegrityError:
             db.session.rollback()
@@ -445,42 +400,14 @@ def admin_add_labour():
             return redirect(url_for('admin_bp.admin_add_labour'))
 
         # ---- FILE UPLOADS (WITH ROLLBACK) ----
+        # validated + staged here; resized/encoded on the image pool
         try:
-            photo = request.files.get('photo')
-            aadhaar_front = request.files.get('aadhaar_front')
-            aadhaar_back = request.files.get('aadhaar_back')
-            gate_pass_front = request.files.get('gate_pass_front')
-            gate_pass_back = request.files.get('gate_pass_back')
-
-            if photo:
-                labour.photo_path = save_and_compress_image(
-                    photo, labour.id, 'photo.jpg'
-                )
-
-            if aadhaar_front:
-                labour.aadhaar_front_path = save_and_compress_image(
-                    aadhaar_front, labour.id, 'aadhaar_front.jpg'
-                )
-
-            if aadhaar_back:
-                labour.aadhaar_back_path = save_and_compress_image(
-                    aadhaar_back, labour.id, 'aadhaar_back.jpg'
-                )
-
-            if gate_pass_front:
-                labour.gate_pass_front_path = save_and_compress_image(
-                    gate_pass_front, labour.id, 'gate_pass_front.jpg'
-                )
-
-            if gate_pass_back:
-                labour.gate_pass_back_path = save_and_compress_image(
-                    gate_pass_back, labour.id, 'gate_pass_back.jpg'
-                )
-
+            enqueue_labour_documents(labour, request.files)
             db.session.commit()
 
         except ValueError as e:
             # rollback fully (NO orphan labour)
+            remove_labours([labour.id])
             db.session.delete(labour)
             db.session.commit()
             flash(str(e), 'danger')
@@ -500,6 +427,56 @@ def admin_add_labour():
     return render_template('admin_add_labour.html', sites=sites)
 
 
+@admin_bp.route('/labours/import', methods=['GET', 'POST'])
+@login_required
+def admin_import_labours():
+    if not _admin_required():
+        return redirect(url_for('auth.login'))
+
+    sites = Site.query.order_by(Site.site_name.asc()).all()
+    report = None
+
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        default_site_id = _to_int(request.form.get('site_id'))
+        dry_run = request.form.get('dry_run') == 'on'
+
+        if not upload or not upload.filename:
+            flash('Choose a CSV or XLSX file to import.', 'danger')
+            return redirect(url_for('admin_bp.admin_import_labours'))
+
+        try:
+            report = import_labours(upload, default_site_id=default_site_id, dry_run=dry_run)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin_bp.admin_import_labours'))
+
+        if report['inserted']:
+            log_action(
+                action='labours_imported',
+                details=f"{report['inserted']} labours imported from '{upload.filename}' "
+                        f"({len(report['errors'])} rows rejected)",
+                site_id=report['site_ids'][0] if len(report['site_ids']) == 1 else None
+            )
+
+        if request.args.get('format') == 'json':
+            return jsonify(report)
+
+        if report['dry_run']:
+            flash(f"{report['valid']} of {report['total']} rows are valid.", 'info')
+        elif report['inserted']:
+            flash(f"{report['inserted']} labours imported.", 'success')
+        else:
+            flash('No labours were imported.', 'warning')
+
+    return render_template(
+        'admin_import_labours.html',
+        sites=sites,
+        report=report,
+        max_rows=MAX_IMPORT_ROWS
+    )
+
+
 @admin_bp.route('/labours/<int:labour_id>/edit', methods=['GET', 'POST'])
 @login_required
 def admin_edit_labour(labour_id):
@@ -539,6 +516,8 @@ def admin_edit_labour(labour_id):
         labour.is_active = is_active
 
         try:
+            index_labours([labour])
+            bump_data_version()
             db.session.commit()
         except IntegrityError:
             db.session.rollback()
@@ -552,37 +531,7 @@ def admin_edit_labour(labour_id):
 
         # ---- OPTIONAL FILE REPLACEMENT ----
         try:
-            photo = request.files.get('photo')
-            aadhaar_front = request.files.get('aadhaar_front')
-            aadhaar_back = request.files.get('aadhaar_back')
-            gate_pass_front = request.files.get('gate_pass_front')
-            gate_pass_back = request.files.get('gate_pass_back')
-
-            if photo:
-                labour.photo_path = save_and_compress_image(
-                    photo, labour.id, 'photo.jpg'
-                )
-
-            if aadhaar_front:
-                labour.aadhaar_front_path = save_and_compress_image(
-                    aadhaar_front, labour.id, 'aadhaar_front.jpg'
-                )
-
-            if aadhaar_back:
-                labour.aadhaar_back_path = save_and_compress_image(
-                    aadhaar_back, labour.id, 'aadhaar_back.jpg'
-                )
-
-            if gate_pass_front:
-                labour.gate_pass_front_path = save_and_compress_image(
-                    gate_pass_front, labour.id, 'gate_pass_front.jpg'
-                )
-
-            if gate_pass_back:
-                labour.gate_pass_back_path = save_and_compress_image(
-                    gate_pass_back, labour.id, 'gate_pass_back.jpg'
-                )
-
+            enqueue_labour_documents(labour, request.files)
             db.session.commit()
         except ValueError as e:
             db.session.rollback()
@@ -657,9 +606,12 @@ def delete_labour(labour_id):
         return redirect(url_for('admin_bp.admin_labours'))
 
     # SAFE HARD DELETE (NO DEPENDENCIES)
+    labour_name, site_id = labour.name, labour.site_id
 
     try:
+        remove_labours([labour.id])
         db.session.delete(labour)
+        bump_data_version()
         db.session.commit()
     except Exception:
         db.session.rollback()
@@ -670,20 +622,12 @@ def delete_labour(labour_id):
         )
         return redirect(url_for('admin_bp.admin_labours'))
 
-    # AUDIT LOG
-   
-    log = AuditLog(
-        user_id=current_user.id,
-        username=current_user.username,
-        role=current_user.role,
-        site_id=labour.site_id,
+    # ---- AUDIT ----
+    log_action(
         action='labour_deleted',
-        details=f"Labour '{labour.name}' deleted",
-        ip_address=request.remote_addr,
-        created_at=datetime.utcnow()
+        details=f"Labour '{labour_name}' deleted",
+        site_id=site_id
     )
-    db.session.add(log)
-    db.session.commit()
 
     flash('Labour deleted successfully', 'success')
     return redirect(url_for('admin_bp.admin_labours'))
@@ -695,6 +639,17 @@ def delete_labour(labour_id):
 from datetime import datetime
 from sqlalchemy import extract
 
+CLOSED_MONTH_MESSAGE = 'Payroll for {month} is closed for this site. Reopen the month first.'
+
+
+def _closed_month(site_id, *days):
+    """'YYYY-MM' of the first closed site-month among `days`, else None."""
+    for day in days:
+        if day and site_id and is_month_closed(site_id, day):
+            return month_key(day)
+    return None
+
+
 @admin_bp.route('/payments')
 @login_required
 def admin_payments():
@@ -774,7 +729,19 @@ def admin_add_payment():
             created_by_id=current_user.id if current_user.is_authenticated else None
         )
 
+        # frozen payroll → advances of that site-month are read-only
+        closed = _closed_month(payment.site_id, payment.date)
+        if closed:
+            flash(CLOSED_MONTH_MESSAGE.format(month=closed), 'danger')
+            return redirect(url_for('admin_bp.admin_add_payment'))
+
         db.session.add(payment)
+        if payment.date:
+            apply_ledger_delta(
+                payment.labour_id, payment.site_id, payment.date,
+                advances=payment.advance
+            )
+        bump_data_version()
         db.session.commit()
         flash('Advance payment recorded', 'success')
         return redirect(url_for('admin_bp.admin_payments'))
@@ -800,10 +767,32 @@ def admin_edit_payment(payment_id):
 
     if request.method == 'POST':
         # ❌ DO NOT change labour_id or site_id
-        payment.date = request.form.get('date')
+        old_date, old_advance = payment.date, payment.advance
+        new_date = request.form.get('date')
+
+        # both the month the advance leaves and the one it moves into
+        closed = _closed_month(payment.site_id, old_date, new_date)
+        if closed:
+            flash(CLOSED_MONTH_MESSAGE.format(month=closed), 'danger')
+            return redirect(url_for('admin_bp.admin_edit_payment', payment_id=payment.id))
+
+        payment.date = new_date
         payment.advance = request.form.get('advance') or 0
         payment.note = request.form.get('note')
 
+        # ledger: back out the old entry, book the new one
+        if old_date:
+            apply_ledger_delta(
+                payment.labour_id, payment.site_id, old_date,
+                advances=-Decimal(str(old_advance or 0))
+            )
+        if payment.date:
+            apply_ledger_delta(
+                payment.labour_id, payment.site_id, payment.date,
+                advances=payment.advance
+            )
+
+        bump_data_version()
         db.session.commit()
         flash('Payment updated successfully', 'success')
         return redirect(url_for('admin_bp.admin_payments'))
@@ -823,7 +812,19 @@ def delete_payment(payment_id):
         return redirect(url_for('auth.login'))
 
     payment = Payment.query.get_or_404(payment_id)
+
+    closed = _closed_month(payment.site_id, payment.date)
+    if closed:
+        flash(CLOSED_MONTH_MESSAGE.format(month=closed), 'danger')
+        return redirect(url_for('admin_bp.admin_payments'))
+
+    if payment.date:
+        apply_ledger_delta(
+            payment.labour_id, payment.site_id, payment.date,
+            advances=-Decimal(str(payment.advance or 0))
+        )
     db.session.delete(payment)
+    bump_data_version()
     db.session.commit()
     flash('Payment deleted successfully', 'success')
     return redirect(url_for('admin_bp.admin_payments'))
@@ -980,52 +981,28 @@ def export_attendance_report():
             d2 = datetime.strptime(end_date, "%Y-%m-%d").date()
     except: d2 = None
 
-    q = Attendance.query.join(Labour, Attendance.labour_id == Labour.id)
-    if site_id:
-        sid = _to_int(site_id)
-        if sid:
-            q = q.filter(Attendance.site_id == sid)
-    if d1:
-        q = q.filter(Attendance.date >= d1)
-    if d2:
-        q = q.filter(Attendance.date <= d2)
-    if day_shift_filter:
-        q = q.filter(Attendance.day_shift == day_shift_filter)
-    if ot_filter:
-        if ot_filter == "Yes":
-            q = q.filter(Attendance.night_shift_flag == True)
-        elif ot_filter == "No":
-            q = q.filter(Attendance.night_shift_flag == False)
-        elif ot_filter == "Worked":
-            q = q.filter(or_(Attendance.day_shift_flag == True, Attendance.night_shift_flag == True))
-
-    rows = q.order_by(Attendance.date.desc()).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id','date','labour_id','labour_name','site_id','day_shift','day_flag','night_shift','night_flag','note'])
-    for r in rows:
-        writer.writerow([
-            r.id,
-            r.date.isoformat() if r.date else '',
-            r.labour_id,
-            getattr(r, 'labour').name if getattr(r, 'labour', None) else '',
-            r.site_id,
-            r.day_shift,
-            int(bool(r.day_shift_flag)),
-            r.night_shift,
-            int(bool(r.night_shift_flag)),
-            r.note or ''
-        ])
-    csv_data = output.getvalue()
-    output.close()
+    query = build_export_query(
+        site_id=_to_int(site_id) if site_id else None,
+        start_date=d1,
+        end_date=d2,
+        day_shift=day_shift_filter,
+        ot=ot_filter
+    )
+
     filename = f"attendance_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-    return Response(csv_data, mimetype='text/csv', headers={"Content-Disposition": f"attachment; filename={filename}"})
+    return Response(
+        stream_with_context(iter_attendance_csv(query)),
+        mimetype='text/csv',
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 # reports page
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import func, and_
+from sqlalchemy import func
 from flask_login import login_required
 
 @admin_bp.route('/monthly-report', methods=['GET'])
@@ -1042,194 +1019,180 @@ def monthly_report():
     sites = Site.query.order_by(Site.site_name.asc()).all()
     rows = []
     grand_total = Decimal('0.00')
-    
+    payroll_run = None
 
     if site_id and month:
-        start_date = datetime.strptime(month + '-01', '%Y-%m-%d').date()
-        end_date = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+        # closed months come from the frozen snapshot, open ones are live
+        rows, payroll_run = get_site_payroll(site_id, month)
+        grand_total = sum((r['net_payable'] for r in rows), Decimal('0.00'))
 
+    # -------- EXCEL EXPORT --------
+    if export == '1' and rows:
+        return xlsx_response(
+            [('Monthly Payroll', MONTHLY_PAYROLL_COLUMNS, rows)],
+            f'Monthly_Payroll_Report_{month}.xlsx'
+        )
 
-        attendance_subq = (
-            db.session.query(
-                Attendance.labour_id.label('labour_id'),
+    return render_template(
+        'monthly_report.html',
+        sites=sites,
+        rows=rows,
+        selected_site=site_id,
+        selected_month=month,
+        grand_total=grand_total,
+        payroll_run=payroll_run
+    )
 
-                func.sum(
-                    case((Attendance.day_shift_flag == 1, 1), else_=0)
-                ).label('day_shift'),
 
-                func.sum(
-                    case((Attendance.night_shift_flag == 1, 1), else_=0)
-                ).label('night_shift'),
-            )
-            .filter(
-                Attendance.site_id == site_id,
-                Attendance.date >= start_date,
-                Attendance.date < end_date
+@admin_bp.route('/monthly-report/all-sites', methods=['GET'])
+@login_required
+def monthly_report_all_sites():
+
+    if current_user.role != 'admin':
+        return redirect(url_for('auth.login'))
+
+    month = request.args.get('month')          # YYYY-MM
+    export = request.args.get('export', '0')
+
+    site_totals = []
+    grand_total = 0.0
+
+    if month:
+        df = load_all_sites_payroll(month)
+
+        if export == '1' and not df.empty:
+            return xlsx_response(
+                all_sites_sheets(df),
+                f'All_Sites_Payroll_{month}.xlsx'
             )
-            .group_by(Attendance.labour_id)
-            .subquery()
-        )
 
+        site_totals = summarize_by_site(df)
+        grand_total = float(df['net_payable'].sum()) if not df.empty else 0.0
 
+    return render_template(
+        'monthly_report_all_sites.html',
+        site_totals=site_totals,
+        selected_month=month,
+        grand_total=grand_total
+    )
 
 
+# ------------------------------
+#--------BACKGROUND EXPORT JOBS-------
+# -------------------------------
 
+def _export_job_json(job):
+    return job_to_dict(
+        job,
+        download_url=url_for('admin_bp.download_export_job', job_id=job.id)
+    )
 
 
-        data = (
-            db.session.query(
-                Labour.id,
-                Labour.name.label('labour_name'),
-                Site.site_name,
-                Labour.bank_account,
-                Labour.ifsc_code,
-                Labour.daily_wage,
+@admin_bp.route('/exports', methods=['POST'])
+@login_required
+def create_export_job():
+    if current_user.role != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
 
-                
-                func.coalesce(attendance_subq.c.day_shift, 0).label('day_shift'),
-                func.coalesce(attendance_subq.c.night_shift, 0).label('night_shift'),
+    data = request.get_json(silent=True) or request.form.to_dict()
+    kind = data.pop('kind', None)
 
-                func.coalesce(func.sum(Payment.advance), Decimal('0.00')).label('advance_paid'),
-                func.coalesce(
-                    LabourMonthlyExpenses.mess_amount +
-                    LabourMonthlyExpenses.canteen_amount,
-                    Decimal('0.00')
-                ).label('expenses')
-            )
-            .join(attendance_subq, attendance_subq.c.labour_id == Labour.id)
-            .join(Site, Site.id == Labour.site_id)
+    try:
+        job = submit_export(kind, data, user=current_user)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    return jsonify(_export_job_json(job)), 202
 
-            .outerjoin(
-                Payment,
-                and_(
-                    Payment.labour_id == Labour.id,
-                    Payment.site_id == site_id,
-                    Payment.date >= start_date,
-                    Payment.date < end_date
-                )
-            )
-            .outerjoin(
-                LabourMonthlyExpenses,
-                and_(
-                    LabourMonthlyExpenses.labour_id == Labour.id,
-                    LabourMonthlyExpenses.site_id == site_id,
-                    LabourMonthlyExpenses.month == month
-                )
-            )
-            .filter(Labour.is_active == True)
-            .group_by(
-                Labour.id,
-                Labour.name,
-                Site.site_name,
-                Labour.bank_account,
-                Labour.ifsc_code,
-                Labour.daily_wage,
-                LabourMonthlyExpenses.mess_amount,
-                LabourMonthlyExpenses.canteen_amount
-            )
 
-            .order_by(Labour.name.asc())
-            .all()
-        )
+@admin_bp.route('/exports/<int:job_id>', methods=['GET'])
+@login_required
+def export_job_status(job_id):
+    if current_user.role != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
 
+    job = get_export_job(job_id)
+    if not job:
+        return jsonify({"error": "Not found"}), 404
 
-        for r in data:
-            day = int(r.day_shift or 0)
-            night = int(r.night_shift or 0)
+    return jsonify(_export_job_json(job))
 
-            total_shifts = day + night
-            wage = Decimal(r.daily_wage or 0)
 
-            total_pay = wage * total_shifts
+@admin_bp.route('/exports/<int:job_id>/download', methods=['GET'])
+@login_required
+def download_export_job(job_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('auth.login'))
 
-            advance = Decimal(r.advance_paid or 0)
-            expenses = Decimal(r.expenses or 0)
+    job = get_export_job(job_id)
+    if not job or job.status != 'done' or not job.artifact_path or not os.path.exists(job.artifact_path):
+        abort(404)
 
-            net = total_pay - advance - expenses
-            grand_total += net
+    return send_file(
+        job.artifact_path,
+        mimetype=job.mimetype,
+        as_attachment=True,
+        download_name=job.filename
+    )
 
-            rows.append({
-                'labour_name': r.labour_name,
-                'site_name': r.site_name,
-                'total_shifts': total_shifts, 
-                'day_shift': day,
-                'night_shift': night,
-                'total_pay': total_pay,
-                'advance_paid': advance,
-                'expenses': expenses,
-                'net_payable': net
-            })
 
+# ------------------------------
+#--------PAYROLL CLOSE / REOPEN-------
+# -------------------------------
 
+@admin_bp.route('/payroll/close', methods=['POST'])
+@login_required
+def close_payroll():
+    if not _admin_required():
+        return redirect(url_for('auth.login'))
 
-    # -------- EXCEL EXPORT --------
-    # -------- EXCEL EXPORT --------
-    if export == '1' and rows:
-        df = pd.DataFrame(rows)
-
-        df.insert(0, 'Sl. No.', range(1, len(df) + 1))
-
-        df = df[[
-            'Sl. No.',
-            'labour_name',
-            'total_shifts',
-            'day_shift',
-            'night_shift',
-            'total_pay',
-            'advance_paid',
-            'expenses',
-            'net_payable'
-        ]]
-
-        df.columns = [
-            'Sl. No.',
-            'Name',
-            'Total Shifts',
-            'Day Shift',
-            'Night Shift',
-            'Total Pay',
-            'Advance Paid',
-            'Expenses',
-            'Net Payable'
-        ]
-
-        # TOTAL ROW (PROPER TOTALS)
-        df.loc[len(df)] = [
-            '',
-            'TOTAL',
-            df['Total Shifts'].sum(),
-            df['Day Shift'].sum(),
-            df['Night Shift'].sum(),
-            df['Total Pay'].sum(),
-            df['Advance Paid'].sum(),
-            df['Expenses'].sum(),
-            df['Net Payable'].sum()
-        ]
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Monthly Payroll')
-
-        output.seek(0)
-        return Response(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                'Content-Disposition':
-                'attachment;filename=Monthly_Payroll_Report.xlsx'
-            }
-        )
+    site_id = _to_int(request.form.get('site_id'))
+    month = request.form.get('month')
 
-    return render_template(
-        'monthly_report.html',
-        sites=sites,
-        rows=rows,
-        selected_site=site_id,
-        selected_month=month,
-        grand_total=grand_total
+    if not site_id or not month:
+        flash('Site and month are required', 'danger')
+        return redirect(url_for('admin_bp.monthly_report'))
+
+    try:
+        run = close_payroll_month(site_id, month, user=current_user)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('admin_bp.monthly_report', site_id=site_id, month=month))
+
+    log_action(
+        action='payroll_closed',
+        details=f"Payroll {month} closed (run {run.id}, net {run.total_net})",
+        site_id=site_id
+    )
+
+    flash(f'Payroll for {month} closed', 'success')
+    return redirect(url_for('admin_bp.monthly_report', site_id=site_id, month=month))
+
+
+@admin_bp.route('/payroll/reopen', methods=['POST'])
+@login_required
+def reopen_payroll():
+    if not _admin_required():
+        return redirect(url_for('auth.login'))
+
+    site_id = _to_int(request.form.get('site_id'))
+    month = request.form.get('month')
+
+    try:
+        reopen_payroll_month(site_id, month)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('admin_bp.monthly_report', site_id=site_id, month=month))
+
+    log_action(
+        action='payroll_reopened',
+        details=f"Payroll {month} reopened",
+        site_id=site_id
     )
 
+    flash(f'Payroll for {month} reopened', 'warning')
+    return redirect(url_for('admin_bp.monthly_report', site_id=site_id, month=month))
+
 
 # ------------------------------
 #--------Monthly EXPENSES-------
@@ -1284,12 +1247,21 @@ def save_monthly_expense():
     mess = float(data.get('mess', 0))
     canteen = float(data.get('canteen', 0))
 
+    closed = _closed_month(site_id, month)
+    if closed:
+        return jsonify({'status': 'error', 'message': CLOSED_MONTH_MESSAGE.format(month=closed)}), 409
+
     expense = LabourMonthlyExpenses.query.filter_by(
         labour_id=labour_id,
         site_id=site_id,
         month=month
     ).first()
 
+    old_total = (
+        float(expense.mess_amount or 0) + float(expense.canteen_amount or 0)
+        if expense else 0.0
+    )
+
     if expense:
         expense.mess_amount = mess
         expense.canteen_amount = canteen
@@ -1305,6 +1277,11 @@ def save_monthly_expense():
         )
         db.session.add(expense)
 
+    apply_ledger_delta(
+        labour_id, site_id, month,
+        expenses=Decimal(str(mess + canteen)) - Decimal(str(old_total))
+    )
+
     db.session.commit()
     return jsonify({'status': 'ok'})
 
@@ -1317,28 +1294,57 @@ def admin_audit_logs():
         flash('Access denied', 'danger')
         return redirect(url_for('admin_bp.admin_dashboard'))
 
-    # Filters
-    role = request.args.get('role')
-    site_id = request.args.get('site_id')
-
-    query = AuditLog.query
-
-    if role:
-        query = query.filter(AuditLog.role == role)
-
-    if site_id:
-        query = query.filter(AuditLog.site_id == site_id)
-
-    logs = query.order_by(AuditLog.created_at.desc()).limit(500).all()
+    try:
+        filters = parse_audit_filters(request.args)
+        logs, next_cursor = search_audit_logs(
+            filters,
+            cursor=request.args.get('before'),
+            limit=request.args.get('per_page', type=int)
+        )
+    except ValueError as e:
+        if request.args.get('format') == 'json':
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'danger')
+        return redirect(url_for('admin_bp.admin_audit_logs'))
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'logs': [
+                {
+                    'id': log.id,
+                    'created_at': log.created_at.isoformat() if log.created_at else None,
+                    'user_id': log.user_id,
+                    'username': log.username,
+                    'role': log.role,
+                    'site_id': log.site_id,
+                    'action': log.action,
+                    'details': log.details,
+                    'ip_address': log.ip_address
+                }
+                for log in logs
+            ],
+            'next_cursor': next_cursor
+        })
 
     sites = Site.query.all()
+    users = User.query.order_by(User.username.asc()).all()
+
+    # filters without the cursor, for the "older" / "newest" links
+    page_args = {k: v for k, v in request.args.items() if k not in ('before', 'format') and v}
 
     return render_template(
     'admin_audit_logs.html',
     logs=logs,
     sites=sites,
-    selected_role=role,
-    selected_site=site_id,
+    users=users,
+    actions=list_audit_actions(),
+    filters=filters,
+    next_cursor=next_cursor,
+    page_args=page_args,
+    is_first_page=not request.args.get('before'),
+    archive_run=get_latest_archive_run(),
+    selected_role=filters['role'],
+    selected_site=request.args.get('site_id'),
     pytz=pytz   
     )
 
@@ -1358,158 +1364,167 @@ def labour_salary_sheet():
     sites = Site.query.order_by(Site.site_name.asc()).all()
     rows = []
     grand_total = Decimal('0.00')
+    payroll_run = None
 
     if site_id and month:
-        start_date = datetime.strptime(month + '-01', '%Y-%m-%d').date()
-        end_date = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-
-        attendance_subq = (
-            db.session.query(
-                Attendance.labour_id.label('labour_id'),
-
-                func.sum(
-                    case((Attendance.day_shift_flag == 1, 1), else_=0)
-                ).label('day_shift'),
-
-                func.sum(
-                    case((Attendance.night_shift_flag == 1, 1), else_=0)
-                ).label('night_shift')
-            )
-            .filter(
-                Attendance.site_id == site_id,
-                Attendance.date >= start_date,
-                Attendance.date < end_date
-            )
-            .group_by(Attendance.labour_id)
-            .subquery()
-        )
-
-
-
-
-        raw_rows = (
-            db.session.query(
-                Labour.name,
-                Labour.bank_account,
-                Labour.ifsc_code,
-                Labour.daily_wage,
-
-                func.coalesce(attendance_subq.c.day_shift, 0).label('day_shift'),
-                func.coalesce(attendance_subq.c.night_shift, 0).label('night_shift')
-            )
-            .join(attendance_subq, attendance_subq.c.labour_id == Labour.id)
-            .filter(Labour.is_active == True)
-            .order_by(Labour.name.asc())
-            .all()
-        )
-
-
-
-        for r in raw_rows:
-            total_shifts = int(r.day_shift) + int(r.night_shift)
-            total_pay = Decimal(r.daily_wage) * total_shifts
+        payroll_rows, payroll_run = get_site_payroll(site_id, month)
 
+        for r in payroll_rows:
             rows.append({
-                'name': r.name,
-                'bank_account': r.bank_account,
-                'ifsc_code': r.ifsc_code,
-                'total_pay': total_pay
+                'name': r['labour_name'],
+                'bank_account': r['bank_account'],
+                'ifsc_code': r['ifsc_code'],
+                'total_pay': r['total_pay']
             })
 
-            grand_total += total_pay
-
-
+            grand_total += r['total_pay']
 
         # ---------- EXCEL EXPORT ----------
         if export == '1':
-            df = pd.DataFrame(rows)
-            df.insert(0, 'Sl. No.', range(1, len(df) + 1))
-            df.rename(columns={
-                'name': 'Name',
-                'bank_account': 'Bank Account',
-                'ifsc_code': 'IFSC Code',
-                'total_pay': 'Total Pay'
-            }, inplace=True)
-
-            # ✅ TOTAL ROW (correct)
-            df.loc[len(df)] = {
-                'Sl. No.': '',
-                'Name': 'TOTAL',
-                'Bank Account': '',
-                'IFSC Code': '',
-                'Total Pay': grand_total
-            }
-
-            output = pd.ExcelWriter('salary_sheet.xlsx', engine='xlsxwriter')
-            df.to_excel(output, index=False, sheet_name='Salary Sheet')
-            output.close()
-
-            return Response(
-                open('salary_sheet.xlsx', 'rb'),
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                headers={'Content-Disposition': 'attachment;filename=Labour_Salary_Sheet.xlsx'}
+            return xlsx_response(
+                [('Salary Sheet', SALARY_SHEET_COLUMNS, payroll_rows)],
+                f'Labour_Salary_Sheet_{month}.xlsx'
             )
 
-
     return render_template(
         'salary_sheet.html',
         sites=sites,
         rows=rows,
         selected_site=site_id,
         selected_month=month,
-        grand_total=grand_total
+        grand_total=grand_total,
+        payroll_run=payroll_run
     )
 
 
 
-#----------MANUAL METHOD archive_audit_logs(days=180)---------------------------
+#----------MANUAL AUDIT ARCHIVE (runs in the background)---------------------------
 @admin_bp.route('/audit/archive-now', methods=['POST'])
 @login_required
 def archive_audit_now():
     if current_user.role != 'admin':
         return redirect(url_for('auth.login'))
 
-    count = archive_audit_logs(days=180)
+    try:
+        run = start_archive_run(user=current_user)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('admin_bp.admin_audit_logs'))
+
+    if request.args.get('format') == 'json':
+        return jsonify(run_to_dict(run)), 202
 
-    flash(f'{count} audit logs archived successfully.', 'success')
+    flash(
+        f'Archiving audit logs older than {run.cutoff.strftime("%d-%m-%Y")} '
+        f'(run #{run.id}).', 'info'
+    )
     return redirect(url_for('admin_bp.admin_audit_logs'))
 
 
+@admin_bp.route('/audit/archive/<int:run_id>', methods=['GET'])
+@login_required
+def archive_audit_status(run_id):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    run = get_archive_run(run_id)
+    if not run:
+        return jsonify({'error': 'Archive run not found'}), 404
+
+    return jsonify(run_to_dict(run))
+
+
 #------------LABOUR SUMMAY MODAL-------------
 from flask import jsonify
-from services.labour_summary_service import build_monthly_summary
+from services.labour_summary_service import (
+    build_monthly_summary,
+    serialize_labour,
+    parse_labour_ids,
+    parse_month,
+    batch_summaries_payload
+)
 
 @admin_bp.route('/api/labour/<int:labour_id>/monthly-summary')
 @login_required
 def labour_monthly_summary(labour_id):
 
-    month = request.args.get('month')
-    if not month:
-        return jsonify({"error": "Month is required"}), 400
+    try:
+        month = parse_month(request.args.get('month'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     labour = Labour.query.get_or_404(labour_id)
 
     summary = build_monthly_summary(labour, month)
 
-    def file_url(path):
-        return url_for('static', filename=path) if path else None
-
     return jsonify({
-        "labour": {
-            "name": labour.name,
-            "phone": labour.phone,
-            "site": labour.site.site_name if labour.site else "-",
-            "gate_pass_id": labour.gate_pass_id,
-            "photo_url": file_url(labour.photo_path),
-            "aadhaar_front_url": file_url(labour.aadhaar_front_path),
-            "aadhaar_back_url": file_url(labour.aadhaar_back_path),
-            "gate_pass_front_url": file_url(labour.gate_pass_front_path),
-            "gate_pass_back_url": file_url(labour.gate_pass_back_path)
-        },
+        "labour": serialize_labour(labour),
         **summary
     })
 
 
+@admin_bp.route('/api/labours/search')
+@login_required
+def admin_labour_typeahead():
+    """Typeahead over all labours, or one site with ?site_id=."""
+
+    if current_user.role != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify({
+        "results": typeahead(
+            request.args.get('q'),
+            site_id=request.args.get('site_id', type=int),
+            limit=request.args.get('limit', type=int),
+            active_only=request.args.get('all') != '1'
+        )
+    })
+
+
+@admin_bp.route('/api/compression-stats')
+@login_required
+def admin_compression_stats():
+    """Response compression counters of the worker process answering."""
+
+    if current_user.role != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    stats = compressor.stats()
+    stats['pid'] = os.getpid()
+    return jsonify(stats)
+
+
+@admin_bp.route('/api/labours/monthly-summary')
+@login_required
+def labours_monthly_summary():
+    """Batch summaries: ?month=YYYY-MM plus ?ids=1,2,3 or ?site_id=N."""
+
+    if current_user.role != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        month = parse_month(request.args.get('month'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    ids = parse_labour_ids(request.args.get('ids'))
+    site_id = request.args.get('site_id', type=int)
+
+    if not ids and not site_id:
+        return jsonify({"error": "ids or site_id is required"}), 400
+
+    query = Labour.query.options(joinedload(Labour.site))
+    if ids:
+        query = query.filter(Labour.id.in_(ids))
+    if site_id:
+        query = query.filter(Labour.site_id == site_id, Labour.is_active == True)
+
+    return jsonify(batch_summaries_payload(
+        query.order_by(Labour.name.asc(), Labour.id.asc()),
+        month
+    ))
+
+
 #-------------------VIEW MONTHLY ATTANDANCE---------------
 
 @admin_bp.route("/sites/<int:site_id>/monthly-attendance")
@@ -1527,75 +1542,50 @@ def admin_monthly_attendance(site_id):
     month = request.args.get("month", today.month, type=int)
     year = request.args.get("year", today.year, type=int)
 
-    start_date = date(year, month, 1)
-    if month == 12:
-        end_date = date(year + 1, 1, 1)
-    else:
-        end_date = date(year, month + 1, 1)
+    # --- Daily attendance stats (one GROUP BY date over the rollup) ---
+    total_labours, daily_stats = get_month_daily_stats(site_id, year, month)
 
-    # --- Daily attendance stats (SAME LOGIC AS MANAGER) ---
-    daily_stats = []
+    return render_template(
+        "admin_monthly_attendance.html",
+        site=site,
+        month=month,
+        year=year,
+        total_labours=total_labours,
+        daily_stats=daily_stats
+    )
 
-    day = start_date
-    while day < end_date:
-        present = (
-            db.session.query(func.count(func.distinct(Attendance.labour_id)))
-            .filter(
-                Attendance.site_id == site_id,
-                Attendance.date == day,
-                or_(
-                    Attendance.day_shift_flag.is_(True),
-                    Attendance.night_shift_flag.is_(True)
-                )
-            )
-            .scalar()
-        ) or 0
 
-        total_labours = (
-            Labour.query
-            .filter(
-                Labour.site_id == site_id,
-                Labour.is_active.is_(True)
-            )
-            .count()
-        )
+#-------------------ATTENDANCE HEAT MAP (MULTI-MONTH)---------------
 
-        absent = max(total_labours - present, 0)
+@admin_bp.route("/attendance/heatmap")
+@login_required
+def admin_attendance_heatmap():
 
-        day_shift = (
-            db.session.query(func.count())
-            .filter(
-                Attendance.site_id == site_id,
-                Attendance.date == day,
-                Attendance.day_shift_flag.is_(True)
-            )
-            .scalar()
-        ) or 0
+    if current_user.role != "admin":
+        return redirect(url_for("auth.login"))
 
-        night_shift = (
-            db.session.query(func.count())
-            .filter(
-                Attendance.site_id == site_id,
-                Attendance.date == day,
-                Attendance.night_shift_flag.is_(True)
-            )
-            .scalar()
-        ) or 0
-
-        daily_stats.append({
-            "date": day,
-            "present": present,
-            "absent": absent,
-            "day": day_shift,
-            "night": night_shift
-        })
+    today = date.today()
+    site_id = request.args.get("site_id", type=int)
+    month = request.args.get("month", today.month, type=int)
+    year = request.args.get("year", today.year, type=int)
+    months = request.args.get("months", 3, type=int)
 
-        day += timedelta(days=1)
+    site = Site.query.get_or_404(site_id) if site_id else None
+
+    total_labours, heatmap = get_attendance_heatmap(
+        year, month, months=months, site_id=site_id
+    )
+
+    sites = Site.query.order_by(Site.site_name.asc()).all()
 
     return render_template(
-        "admin_monthly_attendance.html",
+        "admin_attendance_heatmap.html",
         site=site,
+        sites=sites,
+        heatmap=heatmap,
+        total_labours=total_labours,
         month=month,
         year=year,
-        daily_stats=daily_stats
+        months=len(heatmap),
+        max_months=MAX_HEATMAP_MONTHS
     )
@@ -11,9 +11,22 @@ def create_app():
     from auth import auth_bp
     from admin_routes import admin_bp
     from manager_routes import manager_bp
+    from document_routes import documents_bp
 
     db.init_app(app)
 
+    from services.audit_writer import audit_writer
+    audit_writer.init_app(app)
+
+    from services.image_service import rendition_url
+    app.add_template_global(rendition_url)
+
+    from services.asset_service import assets
+    assets.init_app(app)
+
+    from services.compression_service import compressor
+    compressor.init_app(app)
+
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
     login_manager.init_app(app)
@@ -28,6 +41,10 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(manager_bp)
+    app.register_blueprint(documents_bp)
+
+    from commands import register_commands
+    register_commands(app)
 
     from flask import redirect
 
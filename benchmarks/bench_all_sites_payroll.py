@@ -0,0 +1,80 @@
+"""
+Benchmark: vectorised all-sites payroll computation.
+
+Feeds compute_payroll_frame() synthetic pre-aggregated frames (what the
+three grouped queries return) at growing labour counts and reports the
+time per row. Linear scaling shows up as a flat "us/row" column.
+
+    python benchmarks/bench_all_sites_payroll.py
+
+Reference run (Python 3.11, pandas 2.3, numpy 2.4): 0.5-0.6 us/row from
+25k to 400k labours (9 ms at 10k, 237 ms at 400k).
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.payroll_bulk_service import compute_payroll_frame  # noqa: E402
+
+
+SITES = 40
+SIZES = [10_000, 25_000, 50_000, 100_000, 200_000, 400_000]
+REPEATS = 5
+
+
+def make_frames(n, rng):
+    labour_id = np.arange(1, n + 1)
+    site_id = rng.integers(1, SITES + 1, size=n)
+
+    shifts = pd.DataFrame({
+        'site_id': site_id,
+        'labour_id': labour_id,
+        'labour_name': [f'Labour {i}' for i in labour_id],
+        'bank_account': '000123456789',
+        'ifsc_code': 'SBIN0000001',
+        'daily_wage': rng.integers(400, 900, size=n).astype(float),
+        'day_shift': rng.integers(0, 31, size=n),
+        'night_shift': rng.integers(0, 15, size=n),
+    })
+
+    # roughly half the labourers took an advance, a third have mess/canteen
+    adv_idx = rng.choice(n, size=n // 2, replace=False)
+    advances = pd.DataFrame({
+        'site_id': site_id[adv_idx],
+        'labour_id': labour_id[adv_idx],
+        'advance_paid': rng.integers(500, 5000, size=len(adv_idx)).astype(float),
+    })
+
+    exp_idx = rng.choice(n, size=n // 3, replace=False)
+    expenses = pd.DataFrame({
+        'site_id': site_id[exp_idx],
+        'labour_id': labour_id[exp_idx],
+        'expenses': rng.integers(100, 2000, size=len(exp_idx)).astype(float),
+    })
+
+    return shifts, advances, expenses
+
+
+def main():
+    rng = np.random.default_rng(42)
+
+    print(f"{'labours':>10} {'best ms':>10} {'us/row':>8}")
+    for n in SIZES:
+        frames = make_frames(n, rng)
+
+        best = float('inf')
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            compute_payroll_frame(*frames)
+            best = min(best, time.perf_counter() - start)
+
+        print(f"{n:>10} {best * 1000:>10.1f} {best / n * 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
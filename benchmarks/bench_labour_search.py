@@ -0,0 +1,134 @@
+"""
+Benchmark: indexed labour search vs ilike('%term%').
+
+Builds a throwaway SQLite database with 200k labours spread over 40 sites,
+indexes them with rebuild_labour_search() and times typical typeahead
+queries (name prefix, name fragment, phone suffix, gate pass) both ways,
+all-sites and scoped to one site.
+
+    python benchmarks/bench_labour_search.py [labours]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import or_, func, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Site, Labour  # noqa: E402
+from services.labour_search_service import rebuild_labour_search, typeahead, labour_search_filter  # noqa: E402
+
+
+SITES = 40
+LABOURS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+REPEATS = 20
+INSERT_BATCH = 5000
+
+FIRST = ['ramesh', 'suresh', 'mahesh', 'raju', 'anil', 'sunil', 'vijay', 'ajay',
+         'santosh', 'manoj', 'prakash', 'dinesh', 'ganesh', 'mukesh', 'rakesh']
+LAST = ['kumar', 'yadav', 'singh', 'patil', 'sharma', 'gupta', 'verma', 'shinde',
+        'pawar', 'jadhav', 'chavan', 'more', 'kale', 'gaikwad', 'mishra']
+
+QUERIES = ['ram', 'kesh', 'patil', 'sunil sha', '43217', 'gp1234']
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n, rng):
+    db.session.execute(Site.__table__.insert().values([
+        {'id': i, 'site_name': f'Site {i}', 'is_active': True} for i in range(1, SITES + 1)
+    ]))
+
+    phones = rng.choice(9_000_000_000, size=n, replace=False) + 1_000_000_000
+    sites = rng.integers(1, SITES + 1, size=n)
+    first = rng.integers(0, len(FIRST), size=n)
+    last = rng.integers(0, len(LAST), size=n)
+
+    rows = [
+        {
+            'name': f'{FIRST[first[i]].title()} {LAST[last[i]].title()}',
+            'phone': str(phones[i]),
+            'gate_pass_id': f'GP{i:06d}',
+            'bank_account': str(phones[i])[::-1] + '00',
+            'ifsc_code': 'SBIN0000001',
+            'site_id': int(sites[i]),
+            'is_active': True,
+        }
+        for i in range(n)
+    ]
+    for i in range(0, n, INSERT_BATCH):
+        db.session.execute(Labour.__table__.insert().values(rows[i:i + INSERT_BATCH]))
+    db.session.commit()
+
+
+def ilike_search(q, site_id=None, limit=10):
+    like = f'%{q}%'
+    query = db.session.query(Labour.id).filter(
+        or_(
+            Labour.name.ilike(like),
+            Labour.phone.ilike(like),
+            func.coalesce(Labour.gate_pass_id, '').ilike(like)
+        )
+    )
+    if site_id:
+        query = query.filter(Labour.site_id == site_id)
+    return query.order_by(Labour.name).limit(limit).all()
+
+
+def best_ms(fn):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+
+            start = time.perf_counter()
+            seed(LABOURS, rng)
+            print(f'seeded {LABOURS} labours in {time.perf_counter() - start:.1f}s')
+
+            start = time.perf_counter()
+            rebuild_labour_search()
+            print(f'indexed in {time.perf_counter() - start:.1f}s')
+
+            # the token lookup must be an index SEARCH, not a SCAN. Fresh
+            # connections: EXPLAIN does not notice the indexes the rebuild
+            # re-created through another connection
+            db.session.close()
+            db.engine.dispose()
+            plan_q = db.session.query(Labour.id).filter(labour_search_filter('kesh', site_id=7))
+            plan = db.session.execute(
+                text(f'EXPLAIN QUERY PLAN {plan_q.statement.compile(compile_kwargs={"literal_binds": True})}')
+            ).all()
+            print('\nplan:', '; '.join(row[-1] for row in plan))
+
+            print(f"\n{'query':>12} {'scope':>6} {'ilike ms':>10} {'index ms':>10} {'hits':>5}")
+            for q in QUERIES:
+                for scope in (None, 7):
+                    slow = best_ms(lambda: ilike_search(q, scope))
+                    fast = best_ms(lambda: typeahead(q, site_id=scope))
+                    hits = len(typeahead(q, site_id=scope))
+                    print(f"{q:>12} {scope or 'all':>6} {slow:>10.2f} {fast:>10.2f} {hits:>5}")
+
+
+if __name__ == '__main__':
+    main()
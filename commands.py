@@ -0,0 +1,213 @@
+# commands.py — Flask CLI commands (`flask <command>`)
+import os
+from datetime import datetime
+
+import click
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def register_commands(app):
+
+    @app.cli.command('rebuild-attendance-rollup')
+    @click.option('--site-id', type=int, default=None, help='Only rebuild this site.')
+    @click.option('--start', default=None, help='First date (YYYY-MM-DD), inclusive.')
+    @click.option('--end', default=None, help='Last date (YYYY-MM-DD), inclusive.')
+    def rebuild_attendance_rollup(site_id, start, end):
+        """Back-fill site_daily_attendance from the attendance table."""
+        from services.attendance_rollup_service import rebuild_site_daily_attendance
+
+        count = rebuild_site_daily_attendance(
+            site_id=site_id,
+            start_date=_parse_date(start),
+            end_date=_parse_date(end)
+        )
+        click.echo(f'{count} site-day rollup rows rebuilt.')
+
+    @app.cli.command('rebuild-labour-ledger')
+    @click.option('--labour-id', type=int, default=None, help='Only rebuild this labour.')
+    def rebuild_labour_ledger_cmd(labour_id):
+        """Back-fill labour_ledger_month from attendance, payments and expenses."""
+        from services.ledger_service import rebuild_labour_ledger
+
+        count = rebuild_labour_ledger(labour_id=labour_id)
+        click.echo(f'{count} labour-month ledger rows rebuilt.')
+
+    @app.cli.command('prune-exports')
+    @click.option('--days', type=int, default=7, show_default=True,
+                  help='Delete export jobs older than this many days.')
+    def prune_exports(days):
+        """Remove old background export jobs and their files."""
+        from services.export_job_service import prune_export_jobs
+
+        count = prune_export_jobs(days=days)
+        click.echo(f'{count} export jobs pruned.')
+
+    @app.cli.command('archive-audit-logs')
+    @click.option('--months', type=int, default=None,
+                  help='Months to keep, current month included (default AUDIT_RETENTION_MONTHS).')
+    @click.option('--chunk-size', type=int, default=None,
+                  help='Audit log ids per chunk (default AUDIT_ARCHIVE_CHUNK).')
+    def archive_audit_logs(months, chunk_size):
+        """Move old audit logs to audit_log_archive; resumes an interrupted run."""
+        from services.audit_archive_service import prepare_archive_run, run_archive
+
+        run, fresh = prepare_archive_run(months)
+        if not fresh:
+            raise click.ClickException(f'Archive run #{run.id} is already {run.status}.')
+
+        click.echo(f'Run #{run.id}: archiving logs before {run.cutoff:%Y-%m-%d}, '
+                   f'ids {run.last_id + 1}..{run.max_id}')
+
+        def report(r):
+            click.echo(f'  {r.progress:3d}%  up to id {r.last_id}, {r.moved} moved')
+
+        try:
+            run = run_archive(run.id, chunk_size=chunk_size, progress=report)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{run.moved} audit logs archived.')
+
+    @app.cli.command('build-audit-search')
+    def build_audit_search():
+        """Create (and back-fill) the full-text index over audit_log.details."""
+        from services.audit_log_service import ensure_audit_search_index
+
+        try:
+            click.echo(ensure_audit_search_index())
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command('partition-tables')
+    @click.option('--table', type=click.Choice(['audit_log', 'attendance', 'all']), default='all')
+    @click.option('--months-ahead', type=int, default=None,
+                  help='Future months to pre-create (default PARTITION_MONTHS_AHEAD).')
+    def partition_tables(table, months_ahead):
+        """Convert tables to monthly partitions (one-off) and pre-create future months."""
+        from services.partition_service import (
+            PARTITIONED_TABLES, partition_table, ensure_future_partitions
+        )
+
+        for name in (PARTITIONED_TABLES if table == 'all' else [table]):
+            try:
+                created = partition_table(name, months_ahead=months_ahead)
+            except ValueError as e:
+                if table != 'all':
+                    raise click.ClickException(str(e))
+                click.echo(f'{name}: skipped. {e}', err=True)
+                continue
+            if created:
+                click.echo(f'{name}: partitioned into {created} partitions.')
+                continue
+            added = ensure_future_partitions(name, months_ahead=months_ahead)
+            if added:
+                click.echo(f"{name}: added {', '.join(added)}.")
+            else:
+                click.echo(f'{name}: nothing to do (up to date, or not MySQL).')
+
+    @app.cli.command('partition-status')
+    def partition_status():
+        """List the monthly partitions of audit_log and attendance."""
+        from services.partition_service import PARTITIONED_TABLES, list_partitions
+
+        for name in PARTITIONED_TABLES:
+            parts = list_partitions(name)
+            if not parts:
+                click.echo(f'{name}: plain table')
+                continue
+            click.echo(f'{name}:')
+            for p in parts:
+                click.echo(f"  {p['name']:<8} ~{p['rows']} rows")
+
+    @app.cli.command('drop-partitions')
+    @click.option('--table', type=click.Choice(['audit_log', 'attendance']), required=True)
+    @click.option('--before', required=True, help='Months before this one (YYYY-MM) are removed.')
+    @click.option('--exchange', is_flag=True,
+                  help='Swap each month into a standalone xchg_ table instead of discarding it.')
+    @click.confirmation_option(prompt='Remove whole months from the live table?')
+    def drop_partitions_cmd(table, before, exchange):
+        """Drop (or exchange out) monthly partitions older than --before."""
+        from services.partition_service import (
+            partitions_before, drop_partitions, exchange_partition
+        )
+
+        cutoff = datetime.strptime(before, '%Y-%m').date()
+        names = partitions_before(table, cutoff)
+        if not names:
+            click.echo('No partitions to remove.')
+            return
+
+        if exchange:
+            for name in names:
+                click.echo(f'{name} -> {exchange_partition(table, name)}')
+        else:
+            drop_partitions(table, names)
+            click.echo(f"Dropped {', '.join(names)}.")
+
+    @app.cli.command('rebuild-labour-search')
+    @click.option('--site-id', type=int, default=None, help='Only rebuild this site.')
+    def rebuild_labour_search_cmd(site_id):
+        """Back-fill labour_search_tokens from the labours table."""
+        from services.labour_search_service import rebuild_labour_search
+
+        count = rebuild_labour_search(site_id=site_id)
+        click.echo(f'{count} labours indexed.')
+
+    @app.cli.command('build-thumbnails')
+    @click.option('--labour-id', type=int, default=None, help='Only this labour.')
+    @click.option('--force', is_flag=True, help='Regenerate even when a manifest exists.')
+    @click.option('--reencode', is_flag=True, help='Re-store documents with the current encoder settings.')
+    def build_thumbnails(labour_id, force, reencode):
+        """Move legacy static uploads into the document store and back-fill renditions."""
+        from services.image_queue_service import backfill_renditions
+
+        generated, missing = backfill_renditions(labour_id=labour_id, force=force, reencode=reencode)
+        click.echo(f'{generated} documents processed, {missing} files missing.')
+
+    @app.cli.command('process-staged-images')
+    def process_staged_images():
+        """Finish uploads left in the staging dir (e.g. by a restart)."""
+        from services.image_queue_service import requeue_staged, shutdown_pool
+
+        queued, skipped = requeue_staged()
+        shutdown_pool()
+        click.echo(f'{queued} uploads processed, {skipped} skipped.')
+
+    @app.cli.command('prune-documents')
+    @click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+    def prune_documents_cmd(dry_run):
+        """Delete stored documents no labour references any more."""
+        from services.document_store import prune_documents
+
+        removed, freed = prune_documents(dry_run=dry_run)
+        verb = 'Would remove' if dry_run else 'Removed'
+        click.echo(f'{verb} {removed} documents ({freed / 1024 / 1024:.1f} MB).')
+
+    @app.cli.command('vendor-assets')
+    @click.option('--force', is_flag=True, help='Download again even when present.')
+    def vendor_assets_cmd(force):
+        """Download third-party CSS/JS/fonts into static/vendor (commit the result)."""
+        from services.asset_service import vendor_assets
+
+        count = vendor_assets(app.static_folder, force=force, log=lambda rel: click.echo(f'  {rel}'))
+        click.echo(f'{count} files written.')
+
+    @app.cli.command('build-assets')
+    @click.option('--clean', is_flag=True, help='Remove outputs of previous builds.')
+    def build_assets_cmd(clean):
+        """Bundle, minify, fingerprint and precompress static assets."""
+        from services.asset_service import build_assets, clean_assets, brotli
+
+        dist = app.config.get('ASSET_DIST_DIR') or os.path.join(app.static_folder, 'dist')
+        try:
+            manifest = build_assets(app.static_folder, dist, log=click.echo)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+        if not brotli:
+            click.echo('brotli not installed: only .gz variants written.')
+        if clean:
+            click.echo(f'{clean_assets(dist, manifest)} stale files removed.')
+        click.echo(f'{len(manifest)} assets built into {dist}.')
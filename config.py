@@ -38,5 +38,71 @@ class Config:
     # --------------------
     APP_TIMEZONE = "Asia/Kolkata"
 
+    # --------------------
+    # BACKGROUND EXPORTS
+    # --------------------
+    EXPORT_DIR = os.environ.get("EXPORT_DIR") or os.path.join(BASE_DIR, "exports")
+    EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))
+
+    # --------------------
+    # IMAGE PROCESSING
+    # --------------------
+    IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+    # jobs in flight before uploads fall back to inline processing
+    IMAGE_QUEUE_MAX = int(os.environ.get("IMAGE_QUEUE_MAX", 32))
+    UPLOAD_STAGING_DIR = os.environ.get("UPLOAD_STAGING_DIR") or os.path.join(BASE_DIR, "uploads_incoming")
+
+    # --------------------
+    # DOCUMENT STORAGE
+    # --------------------
+    # content-addressed labour documents, served via /documents/<key>.jpg
+    DOCUMENT_STORE_DIR = os.environ.get("DOCUMENT_STORE_DIR") or os.path.join(BASE_DIR, "document_store")
+    DOCUMENT_MAX_AGE = int(os.environ.get("DOCUMENT_MAX_AGE", 31536000))
+    # nginx `internal` location mapped to DOCUMENT_STORE_DIR, e.g. "/_documents"
+    DOCUMENT_ACCEL_PREFIX = os.environ.get("DOCUMENT_ACCEL_PREFIX")
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "0") in ("1", "true", "True")
+
+    # --------------------
+    # STATIC ASSETS
+    # --------------------
+    # output of `flask build-assets`, served under /assets/
+    ASSET_DIST_DIR = os.environ.get("ASSET_DIST_DIR") or os.path.join(BASE_DIR, "static", "dist")
+    ASSET_MAX_AGE = int(os.environ.get("ASSET_MAX_AGE", 31536000))
+
+    # --------------------
+    # RESPONSE COMPRESSION
+    # --------------------
+    COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "1") not in ("0", "false", "False")
+    # bodies smaller than this go out as is (headers would eat the gain)
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 5))
+
+    # --------------------
+    # AUDIT LOG WRITER
+    # --------------------
+    AUDIT_ASYNC = os.environ.get("AUDIT_ASYNC", "1") not in ("0", "false", "False")
+    AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 200))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 2.0))
+    AUDIT_MAX_QUEUE = int(os.environ.get("AUDIT_MAX_QUEUE", 10000))
+    # consecutive failed flushes before the entries at the head are dropped
+    AUDIT_MAX_ATTEMPTS = int(os.environ.get("AUDIT_MAX_ATTEMPTS", 5))
+
+    # months kept in audit_log (current month included); older rows are archived
+    AUDIT_RETENTION_MONTHS = int(os.environ.get("AUDIT_RETENTION_MONTHS", 3))
+    AUDIT_ARCHIVE_CHUNK = int(os.environ.get("AUDIT_ARCHIVE_CHUNK", 5000))
+
+    # --------------------
+    # OFFLINE SYNC
+    # --------------------
+    # the pull only returns rows whose updated_at is at least this old, so a
+    # write stamped earlier but committed later cannot fall behind a cursor
+    SYNC_PULL_LAG_SECONDS = int(os.environ.get("SYNC_PULL_LAG_SECONDS", 10))
+
+    # --------------------
+    # PARTITIONING (MySQL)
+    # --------------------
+    PARTITION_MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", 3))
+
 
 
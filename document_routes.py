@@ -0,0 +1,50 @@
+# document_routes.py
+# Labour documents from the content-addressed store (services/document_store.py).
+# The file name is the content hash, so responses are immutable: long max-age,
+# the name as a strong ETag, and If-None-Match answered without touching disk.
+from flask import Blueprint, current_app, request, abort, send_file
+from flask_login import login_required
+
+from services.document_store import parse_document_name, document_disk_path
+
+documents_bp = Blueprint('documents', __name__)
+
+
+def _cache_headers(response, name):
+    response.set_etag(name)
+    # login-protected documents: browser cache only, never shared proxies.
+    # send_file() marks responses no-cache, which would make browsers
+    # revalidate on every view and defeat the immutable max-age
+    response.cache_control.no_cache = None
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config.get('DOCUMENT_MAX_AGE', 31536000)
+    response.cache_control.immutable = True
+    return response
+
+
+@documents_bp.route('/documents/<name>')
+@login_required
+def document(name):
+    parsed = parse_document_name(name)
+    if not parsed:
+        abort(404)
+    _, mimetype = parsed
+
+    if request.if_none_match.contains_weak(name):
+        return _cache_headers(current_app.response_class(status=304), name)
+
+    accel = current_app.config.get('DOCUMENT_ACCEL_PREFIX')
+    if accel:
+        # nginx serves the bytes from an `internal` location mapped to the store
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{accel.rstrip('/')}/{name[:2]}/{name}"
+        return _cache_headers(response, name)
+
+    path = document_disk_path(name)
+    try:
+        # honours USE_X_SENDFILE
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=False)
+    except FileNotFoundError:
+        abort(404)
+    return _cache_headers(response, name)
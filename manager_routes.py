@@ -1,18 +1,31 @@
 # manager_routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 from datetime import datetime, date
-from sqlalchemy import or_
+from sqlalchemy import false
 from datetime import date, timedelta
-from sqlalchemy import and_, or_
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
 from models import db, Site, Labour, Attendance, Payment, log_event
 
-from calendar import monthrange
-from sqlalchemy import func, case
 import re
-from services.image_service import save_and_compress_image
+from services.image_queue_service import enqueue_labour_documents
+from services.attendance_rollup_service import get_site_day, get_site_day_version
+from services.cache_service import bump_data_version
+from services.audit_writer import audit_writer
+from services.labour_search_service import labour_search_filter, index_labours, typeahead
+from services.attendance_calendar_service import get_month_daily_stats
+from services.payroll_service import is_month_closed
+from services.ledger_service import apply_ledger_delta
+from services.attendance_write_service import (
+    save_attendance_grid,
+    parse_cell_deltas,
+    apply_cell_deltas,
+    AttendanceVersionConflict
+)
+from services.attendance_sync_service import parse_ops, apply_sync_ops, changes_since
 
 from models import LabourMonthlyExpenses
 
@@ -29,13 +42,9 @@ night_shift_map = {
     'absent': 'Absent'
 }
 
-from flask import request
-from datetime import datetime
-from models import AuditLog
-
 
 def log_action(user, action, details=None, site_id=None):
-    log = AuditLog(
+    audit_writer.write(dict(
         user_id=user.id if user else None,
         username=user.username if user else None,
         role=user.role if user else None,
@@ -44,9 +53,7 @@ def log_action(user, action, details=None, site_id=None):
         details=json.dumps(details) if isinstance(details, dict) else details,
         ip_address=request.remote_addr,
         created_at=datetime.utcnow()
-    )
-    db.session.add(log)
-    db.session.commit()   
+    ))
 
 
 def _manager_required():
@@ -56,7 +63,6 @@ def _manager_required():
     return True
 
 from datetime import datetime
-from sqlalchemy import func, or_
 from flask import render_template, redirect, url_for
 from flask_login import login_required, current_user
 
@@ -75,20 +81,9 @@ def manager_dashboard():
         is_active=True
     ).count()
 
-    # 2️⃣ Today Present (day OR night shift)
-    today_present = (
-        Attendance.query
-        .join(Labour)
-        .filter(
-            Labour.site_id == site_id,
-            Attendance.date == today,
-            or_(
-                Attendance.day_shift_flag == True,
-                Attendance.night_shift_flag == True
-            )
-        )
-        .count()
-    )
+    # 2️⃣ Today Present (day OR night shift) — from the daily rollup
+    today_rollup = get_site_day(site_id, today)
+    today_present = today_rollup.present if today_rollup else 0
 
     # 3️⃣ Today Absent
     today_absent = max(total_labours - today_present, 0)
@@ -108,16 +103,8 @@ def manager_dashboard():
         .scalar()
     )
 
-    # 5️⃣ Attendance marked today?
-    attendance_marked = (
-        Attendance.query
-        .join(Labour)
-        .filter(
-            Labour.site_id == site_id,
-            Attendance.date == today
-        )
-        .count() > 0
-    )
+    # 5️⃣ Attendance marked today? (rollup row exists once a save happened)
+    attendance_marked = today_rollup is not None
 
     # 6️⃣ Recent Activity (last 5 actions)
     recent_attendance = (
@@ -212,15 +199,8 @@ def labours():
     query = Labour.query.filter(Labour.site_id == current_user.site_id)
 
     if search:
-        like = f"%{search}%"
-        query = query.filter(
-            or_(
-                Labour.name.ilike(like),
-                Labour.phone.ilike(like),
-                Labour.bank_account.ilike(like),
-                Labour.ifsc_code.ilike(like)
-            )
-        )
+        match = labour_search_filter(search, site_id=current_user.site_id)
+        query = query.filter(match if match is not None else false())
 
     labours = query.order_by(Labour.id.desc()).all()
 
@@ -261,6 +241,7 @@ def manager_edit_labour(labour_id):
             return redirect(url_for('manager_bp.manager_edit_labour', labour_id=labour.id))
 
         try:
+            index_labours([labour])
             db.session.commit()
         except IntegrityError:
             db.session.rollback()
@@ -269,27 +250,7 @@ def manager_edit_labour(labour_id):
 
         # ---- FILE UPDATES (ALLOWED) ----
         try:
-            photo = request.files.get('photo')
-            aadhaar_front = request.files.get('aadhaar_front')
-            aadhaar_back = request.files.get('aadhaar_back')
-            gate_pass_front = request.files.get('gate_pass_front')
-            gate_pass_back = request.files.get('gate_pass_back')
-
-            if photo:
-                labour.photo_path = save_and_compress_image(photo, labour.id, 'photo.jpg')
-
-            if aadhaar_front:
-                labour.aadhaar_front_path = save_and_compress_image(aadhaar_front, labour.id, 'aadhaar_front.jpg')
-
-            if aadhaar_back:
-                labour.aadhaar_back_path = save_and_compress_image(aadhaar_back, labour.id, 'aadhaar_back.jpg')
-
-            if gate_pass_front:
-                labour.gate_pass_front_path = save_and_compress_image(gate_pass_front, labour.id, 'gate_pass_front.jpg')
-
-            if gate_pass_back:
-                labour.gate_pass_back_path = save_and_compress_image(gate_pass_back, labour.id, 'gate_pass_back.jpg')
-
+            enqueue_labour_documents(labour, request.files)
             db.session.commit()
 
         except ValueError as e:
@@ -342,83 +303,29 @@ def mark_attendance():
 
     if request.method == 'POST':
 
-        changes = []  #  THIS IS THE KEY
-        changed_count = 0
-
-        for labour in labours:
-            day_flag = int(request.form.get(f'day_shift_{labour.id}', 0))
-            night_flag = int(request.form.get(f'night_shift_{labour.id}', 0))
-
-            attendance = Attendance.query.filter_by(
-                labour_id=labour.id,
-                date=date_obj
-            ).first()
-
-            before = {
-                "day": "Present" if attendance and attendance.day_shift_flag else "Absent",
-                "night": "Present" if attendance and attendance.night_shift_flag else "Absent"
-            }
-
-            after = {
-                "day": "Present" if day_flag else "Absent",
-                "night": "Present" if night_flag else "Absent"
-            }
-
-            if attendance:
-                if attendance.day_shift_flag != bool(day_flag) or attendance.night_shift_flag != bool(night_flag):
-                    attendance.day_shift_flag = bool(day_flag)
-                    attendance.night_shift_flag = bool(night_flag)
-
-                    changes.append({
-                        "labour_id": labour.id,
-                        "labour_name": labour.name,
-                        "before": before,
-                        "after": after,
-                        "note": "updated"
-                    })
-                    changed_count += 1
-            else:
-                attendance = Attendance(
-                    labour_id=labour.id,
-                    site_id=site_id,
-                    date=date_obj,
-                    day_shift_flag=bool(day_flag),
-                    night_shift_flag=bool(night_flag)
-                )
-                db.session.add(attendance)
-
-                changes.append({
-                    "labour_id": labour.id,
-                    "labour_name": labour.name,
-                    "before": {"day": "Absent", "night": "Absent"},
-                    "after": after,
-                    "note": "created"
-                })
-                changed_count += 1
-
-        db.session.commit()
+        # frozen payroll → attendance for that month is read-only
+        if is_month_closed(site_id, date_obj):
+            flash('Payroll for this month is closed. Attendance can no longer be changed.', 'danger')
+            return redirect(url_for('manager_bp.mark_attendance', date=selected_date))
 
-        #  STRUCTURED AUDIT LOG
-        audit_payload = {
-            "date": selected_date,
-            "changed_count": changed_count,
-            "changes": changes
+        flags = {
+            labour.id: (
+                int(request.form.get(f'day_shift_{labour.id}', 0)),
+                int(request.form.get(f'night_shift_{labour.id}', 0))
+            )
+            for labour in labours
         }
 
-        log = AuditLog(
-            user_id=current_user.id,
-            username=current_user.username,
-            role=current_user.role,
-            site_id=site_id,
-            action='mark_attendance',
-            details=json.dumps(audit_payload, ensure_ascii=False),
-            ip_address=request.remote_addr,
-            created_at=datetime.utcnow()
+        # one prefetch + bulk upsert; audit entry in the same transaction
+        save_attendance_grid(
+            site_id,
+            date_obj,
+            labours,
+            flags,
+            user=current_user,
+            ip_address=request.remote_addr
         )
 
-        db.session.add(log)
-        db.session.commit()
-
         flash('Attendance saved successfully', 'success')
         return redirect(url_for('manager_bp.mark_attendance', date=selected_date))
 
@@ -435,10 +342,118 @@ def mark_attendance():
         labours=labours,
         attendance_map=attendance_map,
         selected_date=selected_date,
-        today=date.today().isoformat()
+        today=date.today().isoformat(),
+        attendance_version=get_site_day_version(site_id, date_obj),
+        month_closed=is_month_closed(site_id, date_obj)
     )
 
 
+@manager_bp.route('/api/attendance/autosave', methods=['POST'])
+@login_required
+def autosave_attendance():
+    """
+    Apply only the changed grid cells.
+    Body: {"date": "YYYY-MM-DD", "version": n,
+           "changes": [{"labour_id": 1, "shift": "day", "value": 1}, ...]}
+    """
+    if current_user.role != 'manager':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    payload = request.get_json(silent=True) or {}
+    site_id = current_user.site_id
+
+    try:
+        date_obj = datetime.strptime(payload.get('date') or '', '%Y-%m-%d').date()
+        version = int(payload.get('version', 0))
+        deltas = parse_cell_deltas(payload.get('changes'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e) or "Invalid payload"}), 400
+
+    if date_obj > date.today():
+        return jsonify({"error": "Cannot mark attendance for a future date."}), 400
+
+    if is_month_closed(site_id, date_obj):
+        return jsonify({"error": "Payroll for this month is closed."}), 409
+
+    labours = Labour.query.filter(
+        Labour.id.in_(list(deltas)),
+        Labour.site_id == site_id,
+        Labour.is_active == True
+    ).all()
+
+    unknown = set(deltas) - {l.id for l in labours}
+    if unknown:
+        return jsonify({"error": "Unknown labour", "labour_ids": sorted(unknown)}), 400
+
+    try:
+        new_version, rollup, changed = apply_cell_deltas(
+            site_id, date_obj, labours, deltas, version,
+            user=current_user,
+            ip_address=request.remote_addr
+        )
+    except AttendanceVersionConflict as e:
+        return jsonify({
+            "error": str(e),
+            "version": e.version,
+            "cells": {str(k): v for k, v in e.cells.items()}
+        }), 409
+    except IntegrityError:
+        # first save of the day raced another one creating the rollup row
+        db.session.rollback()
+        return jsonify({
+            "error": "Attendance was changed by someone else. Reload to continue.",
+            "version": get_site_day_version(site_id, date_obj)
+        }), 409
+
+    return jsonify({
+        "version": new_version,
+        "changed": changed,
+        "present": rollup.present if rollup else 0,
+        "day_shifts": rollup.day_shifts if rollup else 0,
+        "night_shifts": rollup.night_shifts if rollup else 0
+    })
+
+
+
+
+@manager_bp.route('/api/attendance/sync', methods=['POST'])
+@login_required
+def sync_attendance():
+    """
+    Offline backlog upload + pull.
+    Body: {"cursor": "<from last sync>" | null,
+           "ops": [{"op_id", "labour_id", "date", "day_shift",
+                    "night_shift", "updated_at"}, ...]}
+    Replaying the same op ids is safe; they come back as "duplicate".
+    """
+    if current_user.role != 'manager':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    payload = request.get_json(silent=True) or {}
+    site_id = current_user.site_id
+
+    try:
+        ops = parse_ops(payload.get('ops', []))
+        cursor = payload.get('cursor')
+        results = apply_sync_ops(
+            site_id, ops,
+            user=current_user,
+            ip_address=request.remote_addr
+        ) if ops else []
+        changes, next_cursor, has_more = changes_since(site_id, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        # the same batch is being applied by a parallel request
+        db.session.rollback()
+        return jsonify({"error": "Sync already in progress, retry."}), 409
+
+    return jsonify({
+        "results": results,
+        "changes": changes,
+        "cursor": next_cursor,
+        "has_more": has_more
+    })
 
 
 @manager_bp.route('/attendance/monthly')
@@ -451,53 +466,11 @@ def manager_monthly_attendance():
     year = request.args.get('year', date.today().year, type=int)
     month = request.args.get('month', date.today().month, type=int)
 
-    start_date = date(year, month, 1)
-    end_date = date(year, month, monthrange(year, month)[1])
-
-    # Total active labours at this site
-    total_labours = Labour.query.filter_by(
-        site_id=current_user.site_id,
-        is_active=True
-    ).count()
-
-    # Date-wise aggregation
-    rows = (
-        db.session.query(
-            Attendance.date.label('date'),
-            func.sum(case((Attendance.day_shift_flag == True, 1), else_=0)).label('day_count'),
-            func.sum(case((Attendance.night_shift_flag == True, 1), else_=0)).label('night_count')
-        )
-        .filter(
-            Attendance.site_id == current_user.site_id,
-            Attendance.date >= start_date,
-            Attendance.date <= end_date
-        )
-        .group_by(Attendance.date)
-        .order_by(Attendance.date)
-        .all()
+    # Date-wise aggregation (one GROUP BY date over the daily rollup)
+    total_labours, daily_stats = get_month_daily_stats(
+        current_user.site_id, year, month
     )
 
-    attendance_map = {r.date: r for r in rows}
-
-    daily_stats = []
-
-    for d in range(1, end_date.day + 1):
-        current_date = date(year, month, d)
-        r = attendance_map.get(current_date)
-
-        day = int(r.day_count) if r else 0
-        night = int(r.night_count) if r else 0
-        present = day + night
-        absent = max(total_labours - present, 0)
-
-        daily_stats.append({
-            "date": current_date,
-            "present": present,
-            "absent": absent,
-            "day": day,
-            "night": night
-        })
-
     return render_template(
         'manager_monthly_attendance.html',
         daily_stats=daily_stats,
@@ -556,6 +529,10 @@ def add_payment():
             flash('Future dates are not allowed', 'danger')
             return redirect(url_for('manager_bp.add_payment'))
 
+        if is_month_closed(current_user.site_id, date_obj):
+            flash('Payroll for this month is closed', 'danger')
+            return redirect(url_for('manager_bp.add_payment'))
+
         # Ensure labour belongs to same site (SECURITY)
         labour = Labour.query.filter_by(
             id=labour_id,
@@ -578,6 +555,8 @@ def add_payment():
 
 
         db.session.add(payment)
+        apply_ledger_delta(labour.id, current_user.site_id, date_obj, advances=advance)
+        bump_data_version()
         db.session.commit()
 
         log_action(
@@ -630,8 +609,13 @@ def payment_history():
 # =========================================================
 # MANAGER – LABOUR MONTHLY SUMMARY (READ ONLY)
 # =========================================================
-from flask import jsonify
-from services.labour_summary_service import build_monthly_summary
+from services.labour_summary_service import (
+    build_monthly_summary,
+    serialize_labour,
+    parse_labour_ids,
+    parse_month,
+    batch_summaries_payload
+)
 
 @manager_bp.route('/api/labour/<int:labour_id>/monthly-summary')
 @login_required
@@ -640,9 +624,10 @@ def manager_labour_monthly_summary(labour_id):
     if not _manager_required():
         return jsonify({"error": "Unauthorized"}), 403
 
-    month = request.args.get('month')
-    if not month:
-        return jsonify({"error": "Month is required"}), 400
+    try:
+        month = parse_month(request.args.get('month'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     labour = Labour.query.filter_by(
         id=labour_id,
@@ -655,21 +640,54 @@ def manager_labour_monthly_summary(labour_id):
         site_id=current_user.site_id
     )
 
-    def file_url(path):
-        return url_for('static', filename=path) if path else None
-
     return jsonify({
-        "labour": {
-            "name": labour.name,
-            "phone": labour.phone,
-            "site": labour.site.site_name if labour.site else "-",
-            "gate_pass_id": labour.gate_pass_id,
-            "photo_url": file_url(labour.photo_path),
-            "aadhaar_front_url": file_url(labour.aadhaar_front_path),
-            "aadhaar_back_url": file_url(labour.aadhaar_back_path),
-            "gate_pass_front_url": file_url(labour.gate_pass_front_path),
-            "gate_pass_back_url": file_url(labour.gate_pass_back_path)
-        },
+        "labour": serialize_labour(labour),
         **summary
     })
 
+
+@manager_bp.route('/api/labours/monthly-summary')
+@login_required
+def manager_labours_monthly_summary():
+    """Batch summaries for the manager's own site (?ids= optional)."""
+
+    if not _manager_required():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        month = parse_month(request.args.get('month'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    ids = parse_labour_ids(request.args.get('ids'))
+
+    query = Labour.query.options(joinedload(Labour.site)).filter(
+        Labour.site_id == current_user.site_id
+    )
+    if ids:
+        query = query.filter(Labour.id.in_(ids))
+    else:
+        query = query.filter(Labour.is_active == True)
+
+    return jsonify(batch_summaries_payload(
+        query.order_by(Labour.name.asc(), Labour.id.asc()),
+        month,
+        site_id=current_user.site_id
+    ))
+
+
+@manager_bp.route('/api/labours/search')
+@login_required
+def manager_labour_typeahead():
+    """Typeahead over the manager's own site (name / phone / gate pass / bank)."""
+
+    if not _manager_required():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify({
+        "results": typeahead(
+            request.args.get('q'),
+            site_id=current_user.site_id,
+            limit=request.args.get('limit', type=int)
+        )
+    })
@@ -77,6 +77,29 @@ class Labour(db.Model):
         return f"<Labour {self.id} {self.name} ({self.phone})>"
 
 
+class LabourSearchToken(db.Model):
+    """
+    Normalised search index over labours: every suffix (3+ chars) of each
+    name word, phone, gate pass and bank account, so a prefix match on
+    `token` is an index range scan that behaves like a substring match.
+    Maintained by services.labour_search_service.
+    """
+    __tablename__ = 'labour_search_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    labour_id = db.Column(db.Integer, nullable=False)
+    site_id = db.Column(db.Integer, nullable=False)
+    token = db.Column(db.String(64), nullable=False)
+    # 0 = token starts the word / number (ranked first), >0 = inner suffix
+    position = db.Column(db.SmallInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_labour_search_site_token', 'site_id', 'token'),
+        Index('idx_labour_search_token', 'token'),
+        Index('idx_labour_search_labour', 'labour_id'),
+    )
+
+
 
 class Attendance(db.Model):
     __tablename__ = 'attendance'
@@ -98,6 +121,10 @@ class Attendance(db.Model):
         default=datetime.utcnow,
         onupdate=datetime.utcnow
     )
+    # when the flags were edited: the device clock for offline sync ops, the
+    # server clock for online saves. Sync conflicts compare this, while
+    # updated_at (server receipt time) drives the pull cursor.
+    edited_at = db.Column(db.DateTime, nullable=True)
 
     labour = db.relationship('Labour', back_populates='attendances')
     site = db.relationship('Site')
@@ -106,8 +133,47 @@ class Attendance(db.Model):
         UniqueConstraint('labour_id', 'date', name='uniq_labour_date'),
         Index('idx_attendance_site_date', 'site_id', 'date'),
         Index('idx_attendance_labour_date', 'labour_id', 'date'),
+        Index('idx_attendance_site_updated', 'site_id', 'updated_at', 'id'),
+    )
+
+
+class SiteDailyAttendance(db.Model):
+    """Per-site, per-day attendance rollup (maintained on write)."""
+    __tablename__ = 'site_daily_attendance'
+
+    id = db.Column(db.Integer, primary_key=True)
+    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+    present = db.Column(db.Integer, nullable=False, default=0)
+    day_shifts = db.Column(db.Integer, nullable=False, default=0)
+    night_shifts = db.Column(db.Integer, nullable=False, default=0)
+
+    # latest created_at among present rows (drives the "delayed" badge)
+    last_marked = db.Column(db.DateTime, nullable=True)
+
+    # bumped on every write; optimistic-concurrency token for the grid autosave
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        UniqueConstraint('site_id', 'date', name='uniq_site_daily_date'),
+        Index('idx_site_daily_date', 'date'),
     )
 
+    def __repr__(self):
+        return f"<SiteDailyAttendance site={self.site_id} date={self.date} present={self.present}>"
+
+class DataVersion(db.Model):
+    """Monotonic version counters used to invalidate cached payloads."""
+    __tablename__ = 'data_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<DataVersion {self.name}={self.version}>"
+
 class Payment(db.Model):
     __tablename__ = 'payments'
 
@@ -147,6 +213,167 @@ class LabourMonthlyExpenses(db.Model):
     def __repr__(self):
         return f"<LabourMonthlyExpenses {self.id} labour={self.labour_id} month={self.month}>"
 
+class LabourLedgerMonth(db.Model):
+    """
+    Running per-labour, per-site monthly ledger, maintained on write.
+
+    opening_balance / closing_balance carry the labourer's advance balance
+    forward: closing = opening + advances, next month opens at this close.
+    Earned pay is shifts x current daily_wage, so it is derived on read.
+    """
+    __tablename__ = 'labour_ledger_month'
+
+    id = db.Column(db.Integer, primary_key=True)
+    labour_id = db.Column(db.Integer, db.ForeignKey('labours.id'), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+
+    opening_balance = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    day_shifts = db.Column(db.Integer, nullable=False, default=0)
+    night_shifts = db.Column(db.Integer, nullable=False, default=0)
+    advances = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    expenses = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    closing_balance = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('labour_id', 'site_id', 'month', name='uniq_ledger_labour_site_month'),
+    )
+
+    def __repr__(self):
+        return f"<LabourLedgerMonth labour={self.labour_id} site={self.site_id} month={self.month}>"
+
+
+class PayrollRun(db.Model):
+    """A closed (frozen) site-month payroll. Lines never change once written."""
+    __tablename__ = 'payroll_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    status = db.Column(db.String(20), nullable=False, default='closed')
+
+    total_shifts = db.Column(db.Integer, nullable=False, default=0)
+    total_gross = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    total_advance = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    total_expenses = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    total_net = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    closed_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    closed_at = db.Column(db.DateTime, nullable=True)
+
+    site = db.relationship('Site', lazy='joined')
+    closed_by = db.relationship('User', lazy='joined')
+    lines = db.relationship(
+        'PayrollLine', back_populates='run', lazy='dynamic',
+        cascade='all, delete-orphan'
+    )
+
+    __table_args__ = (
+        UniqueConstraint('site_id', 'month', name='uniq_payroll_site_month'),
+        Index('idx_payroll_run_month', 'month'),
+    )
+
+    def __repr__(self):
+        return f"<PayrollRun {self.id} site={self.site_id} month={self.month}>"
+
+
+class PayrollLine(db.Model):
+    __tablename__ = 'payroll_lines'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('payroll_runs.id'), nullable=False)
+    labour_id = db.Column(db.Integer, db.ForeignKey('labours.id'), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+
+    # identity / bank details as they were at close
+    labour_name = db.Column(db.String(150), nullable=False)
+    bank_account = db.Column(db.String(50), nullable=True)
+    ifsc_code = db.Column(db.String(20), nullable=True)
+
+    day_shifts = db.Column(db.Integer, nullable=False, default=0)
+    night_shifts = db.Column(db.Integer, nullable=False, default=0)
+    total_shifts = db.Column(db.Integer, nullable=False, default=0)
+
+    daily_wage = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    gross = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    advance = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    expenses = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    net = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    # one char per day of month: P = present, A = marked absent, . = no record
+    day_marks = db.Column(db.String(31), nullable=True)
+
+    run = db.relationship('PayrollRun', back_populates='lines')
+
+    __table_args__ = (
+        UniqueConstraint('run_id', 'labour_id', name='uniq_payroll_run_labour'),
+        Index('idx_payroll_line_labour_month', 'labour_id', 'month'),
+    )
+
+    def __repr__(self):
+        return f"<PayrollLine run={self.run_id} labour={self.labour_id} net={self.net}>"
+
+
+class SyncOperation(db.Model):
+    """Client operation ids already applied by the offline sync endpoint."""
+    __tablename__ = 'sync_operations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    op_id = db.Column(db.String(64), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), nullable=False)
+
+    # applied / stale / rejected — replays return the same outcome
+    status = db.Column(db.String(20), nullable=False)
+    reason = db.Column(db.String(255), nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'op_id', name='uniq_sync_user_op'),
+        Index('idx_sync_op_received', 'received_at'),
+    )
+
+    def __repr__(self):
+        return f"<SyncOperation {self.op_id} {self.status}>"
+
+
+class ExportJob(db.Model):
+    """A report export run in the background worker pool."""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)            # JSON
+    params_hash = db.Column(db.String(64), nullable=False)
+
+    # queued / running / done / failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    rows_written = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    # closed-month artifacts are reused for identical requests
+    cacheable = db.Column(db.Boolean, nullable=False, default=False)
+    artifact_path = db.Column(db.String(255), nullable=True)
+    filename = db.Column(db.String(255), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_export_job_hash_status', 'params_hash', 'status'),
+        Index('idx_export_job_created', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<ExportJob {self.id} {self.kind} {self.status}>"
+
 class AuditLog(db.Model):
     __tablename__ = 'audit_log'
     id = db.Column(db.Integer, primary_key=True)
@@ -159,13 +386,25 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(45), nullable=True)
     created_at = db.Column(db.DateTime, nullable=True)
 
+    # viewer pages newest-first on (created_at, id) within each filter;
+    # the FULLTEXT / FTS5 index on details is created by `flask build-audit-search`
+    __table_args__ = (
+        Index('idx_audit_created', 'created_at', 'id'),
+        Index('idx_audit_site_created', 'site_id', 'created_at'),
+        Index('idx_audit_role_created', 'role', 'created_at'),
+        Index('idx_audit_user_created', 'user_id', 'created_at'),
+        Index('idx_audit_action_created', 'action', 'created_at'),
+    )
+
     def __repr__(self):
         return f"<AuditLog {self.id} action={self.action}>"
 
 # helper function — standalone so other modules can import log_event
+# commit=True hands the row to the buffered audit writer (written off the
+# request path); commit=False adds it to the caller's open transaction.
 def log_event(user_id=None, username=None, role=None, site_id=None,
               action=None, details=None, ip_address=None, commit=True):
-    entry = AuditLog(
+    row = dict(
         user_id=user_id,
         username=username,
         role=role,
@@ -175,13 +414,13 @@ def log_event(user_id=None, username=None, role=None, site_id=None,
         ip_address=ip_address,
         created_at=datetime.utcnow()
     )
-    db.session.add(entry)
     if commit:
-        try:
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-            raise
+        from services.audit_writer import audit_writer
+        audit_writer.write(row)
+        return AuditLog(**row)
+
+    entry = AuditLog(**row)
+    db.session.add(entry)
     return entry
 
 class AuditLogArchive(db.Model):
@@ -199,3 +438,40 @@ class AuditLogArchive(db.Model):
 
     def __repr__(self):
         return f"<AuditLogArchive {self.id} action={self.action}>"
+
+
+class AuditArchiveRun(db.Model):
+    """One pass of moving old audit_log rows into audit_log_archive."""
+    __tablename__ = 'audit_archive_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cutoff = db.Column(db.DateTime, nullable=False)       # rows created before this move
+
+    # queued / running / done / failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+
+    # audit_log id range being walked; last_id advances with every chunk
+    first_id = db.Column(db.Integer, nullable=False, default=0)
+    max_id = db.Column(db.Integer, nullable=False, default=0)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    moved = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # refreshed with every committed chunk; a run silent for STALE_AFTER is lost
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        span = self.max_id - self.first_id + 1
+        if span <= 0 or self.last_id < self.first_id:
+            return 0
+        return min(99, (self.last_id - self.first_id + 1) * 100 // span)
+
+    def __repr__(self):
+        return f"<AuditArchiveRun {self.id} {self.status} moved={self.moved}>"
@@ -0,0 +1,367 @@
+# services/asset_service.py
+#
+# Self-hosted static asset pipeline. Third-party libraries are vendored into
+# static/vendor/ (`flask vendor-assets`, needs network once; commit the
+# result) instead of being pulled from five CDNs on every page. At deploy
+# `flask build-assets` concatenates and minifies the BUNDLES plus every file
+# in static/css and static/js, copies the fonts/images their CSS references,
+# names each output by content hash ("app.3f9a0c1d2e4b.css"), precompresses
+# it (.gz, and .br when the brotli module is installed) and writes
+# manifest.json.
+#
+# Templates use asset_tags('app.css') for bundles and asset_url(filename) as
+# a drop-in for url_for('static', filename=...). Built files are served from
+# /assets/ with a one-year immutable Cache-Control and the best precompressed
+# variant the client accepts. Without a build, the source files are linked
+# one by one.
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import urllib.request
+from urllib.parse import urljoin, urlsplit
+
+from flask import current_app, request, send_file, abort, url_for
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: .br files are skipped without it
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+
+# vendored file (relative to static/) -> upstream URL it was taken from.
+# vendor/inter/inter.css is kept by hand (self-hosted @font-face for the
+# subset woff2 files next to it), so it has no upstream entry.
+VENDOR = {
+    'vendor/bootstrap-5.3.2/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+    'vendor/popper-2.11.8/popper.min.js':
+        'https://cdn.jsdelivr.net/npm/@popperjs/core@2.11.8/dist/umd/popper.min.js',
+    'vendor/bootstrap-5.3.2/bootstrap.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.min.js',
+    'vendor/fontawesome-6.5.0/css/all.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.0/css/all.min.css',
+    'vendor/cropperjs-1.6.2/cropper.min.css':
+        'https://unpkg.com/cropperjs@1.6.2/dist/cropper.min.css',
+    'vendor/cropperjs-1.6.2/cropper.min.js':
+        'https://unpkg.com/cropperjs@1.6.2/dist/cropper.min.js',
+}
+
+# bundle -> source files (relative to static/), in load order
+BUNDLES = {
+    'vendor.css': [
+        'vendor/bootstrap-5.3.2/bootstrap.min.css',
+        'vendor/fontawesome-6.5.0/css/all.min.css',
+        'vendor/cropperjs-1.6.2/cropper.min.css',
+        'vendor/inter/inter.css',
+    ],
+    'vendor.js': [
+        'vendor/popper-2.11.8/popper.min.js',
+        'vendor/bootstrap-5.3.2/bootstrap.min.js',
+        'vendor/cropperjs-1.6.2/cropper.min.js',
+    ],
+    'app.css': ['css/admin.css', 'css/custom_dashboard.css'],
+    'app.js': ['js/admin.js', 'js/export-jobs.js', 'js/image-cropper.js'],
+    'labours.css': ['css/labour-summary.css'],
+    'labours.js': ['js/labours.js', 'js/labour-typeahead.js'],
+}
+
+# also built one by one, so asset_url() can fingerprint them
+SOURCE_DIRS = ('css', 'js')
+
+MANIFEST = 'manifest.json'
+
+# fonts/images are already compressed; only text gets .gz/.br siblings
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.eot', '.json')
+
+# a modern UA makes Google Fonts answer with woff2
+_FETCH_HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36'}
+
+_CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_SOURCE_MAP_RE = re.compile(r'/[*/]# sourceMappingURL=[^\n]*?(\*/)?$', re.MULTILINE)
+_CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.DOTALL)
+
+
+def _is_external(url):
+    return url.startswith(('data:', 'http:', 'https:', '//', '#'))
+
+
+# =========================
+# VENDORING
+# =========================
+def _fetch(url):
+    req = urllib.request.Request(url, headers=_FETCH_HEADERS)
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return resp.read()
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def vendor_assets(static_root, force=False, log=None):
+    """
+    Download VENDOR files into static/, plus the fonts/images their CSS
+    references (rewritten to local relative URLs). Returns files written.
+    """
+    written = 0
+    fetched = set()
+    for rel, source in VENDOR.items():
+        target = os.path.join(static_root, rel)
+        if os.path.exists(target) and not force:
+            continue
+
+        data = _fetch(source)
+
+        if rel.endswith('.css'):
+            folder = posixpath.dirname(rel)
+
+            def localise(match):
+                nonlocal written
+                url = match.group(2).strip()
+                if url.startswith(('data:', '#')):
+                    return match.group(0)
+                remote = urljoin(source, url)
+                parts = urlsplit(remote)
+                if url.startswith(('http:', 'https:', '//')):
+                    # third-party host (e.g. fonts.gstatic.com): keep the file name
+                    local = posixpath.join(folder, 'files', posixpath.basename(parts.path))
+                else:
+                    local = posixpath.normpath(posixpath.join(folder, urlsplit(url).path))
+                if local not in fetched:
+                    _write(os.path.join(static_root, local), _fetch(remote))
+                    fetched.add(local)
+                    written += 1
+                return f"url({posixpath.relpath(local, folder)})"
+
+            data = _CSS_URL_RE.sub(localise, data.decode('utf-8')).encode('utf-8')
+
+        _write(target, data)
+        written += 1
+        if log:
+            log(rel)
+
+    return written
+
+
+# =========================
+# BUILD
+# =========================
+def _minify(text, kind):
+    text = _SOURCE_MAP_RE.sub('', text)
+    if kind == 'css':
+        if rcssmin:
+            return rcssmin.cssmin(text)
+        # conservative fallback: comments and indentation only
+        text = _CSS_COMMENT_RE.sub('', text)
+        return '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+    if rjsmin:
+        return rjsmin.jsmin(text)
+    return text.strip()
+
+
+def _fingerprint(name, data):
+    stem, ext = posixpath.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def _emit(dist_root, name, data):
+    """Write `data` as its fingerprinted name (+ .gz/.br). Returns that name."""
+    out = _fingerprint(name, data)
+    path = os.path.join(dist_root, out)
+    if not os.path.exists(path):
+        _write(path, data)
+        if out.endswith(COMPRESSIBLE):
+            _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli:
+                _write(path + '.br', brotli.compress(data, quality=11))
+    return out
+
+
+def _rebase_css(text, src, out_name, static_root, dist_root, copied):
+    """Copy files referenced by `src` into dist and point url()s at them."""
+    src_dir = posixpath.dirname(src)
+    out_dir = posixpath.dirname(out_name)
+
+    def rebase(match):
+        url = match.group(2).strip()
+        if _is_external(url):
+            return match.group(0)
+        parts = urlsplit(url)
+        ref = posixpath.normpath(posixpath.join(src_dir, parts.path))
+        if ref not in copied:
+            try:
+                with open(os.path.join(static_root, ref), 'rb') as f:
+                    copied[ref] = _emit(dist_root, posixpath.join('files', posixpath.basename(ref)), f.read())
+            except OSError:
+                return match.group(0)
+        target = posixpath.relpath(copied[ref], out_dir or '.')
+        suffix = f"#{parts.fragment}" if parts.fragment else ''
+        return f"url({target}{suffix})"
+
+    return _CSS_URL_RE.sub(rebase, text)
+
+
+def _build_one(name, sources, static_root, dist_root, copied):
+    kind = 'css' if name.endswith('.css') else 'js'
+    parts = []
+    for src in sources:
+        with open(os.path.join(static_root, src), encoding='utf-8') as f:
+            text = f.read()
+        if kind == 'css':
+            text = _rebase_css(text, src, name, static_root, dist_root, copied)
+        parts.append(_minify(text, kind))
+
+    # ";" guards against a source without a trailing semicolon
+    joined = ('\n' if kind == 'css' else ';\n').join(parts)
+    return _emit(dist_root, name, joined.encode('utf-8'))
+
+
+def build_assets(static_root, dist_root, log=None):
+    """Build bundles + fingerprinted copies and write the manifest."""
+    missing = [src for sources in BUNDLES.values() for src in sources
+               if not os.path.isfile(os.path.join(static_root, src))]
+    if missing:
+        raise ValueError(f"Missing asset sources (run `flask vendor-assets`?): {', '.join(missing)}")
+
+    os.makedirs(dist_root, exist_ok=True)
+    manifest, copied = {}, {}
+
+    for name, sources in BUNDLES.items():
+        manifest[name] = _build_one(name, sources, static_root, dist_root, copied)
+        if log:
+            log(f"{name} -> {manifest[name]}")
+
+    for folder in SOURCE_DIRS:
+        for entry in sorted(os.listdir(os.path.join(static_root, folder))):
+            if entry.endswith(('.css', '.js')):
+                rel = f"{folder}/{entry}"
+                manifest[rel] = _build_one(rel, [rel], static_root, dist_root, copied)
+
+    tmp = os.path.join(dist_root, MANIFEST + '.part')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(dist_root, MANIFEST))
+
+    return manifest
+
+
+def clean_assets(dist_root, manifest):
+    """Remove built files the manifest no longer references. Returns count."""
+    keep = set(manifest.values()) | {MANIFEST}
+    keep |= {f"{name}{ext}" for name in list(keep) for ext in ('.gz', '.br')}
+
+    removed = 0
+    for folder, _, files in os.walk(dist_root):
+        for entry in files:
+            rel = os.path.relpath(os.path.join(folder, entry), dist_root).replace(os.sep, '/')
+            if rel.startswith('files/'):
+                continue  # shared by every build; small and content-named
+            if rel not in keep:
+                os.remove(os.path.join(folder, entry))
+                removed += 1
+    return removed
+
+
+# =========================
+# RUNTIME
+# =========================
+class AssetPipeline:
+
+    def __init__(self):
+        self.app = None
+        self.dist_root = None
+        self.max_age = 31536000
+        self._manifest = None
+        self._manifest_mtime = None
+
+    def init_app(self, app):
+        self.app = app
+        self.dist_root = app.config.get('ASSET_DIST_DIR') or os.path.join(app.static_folder, 'dist')
+        self.max_age = app.config.get('ASSET_MAX_AGE', self.max_age)
+
+        app.add_url_rule('/assets/<path:filename>', endpoint='assets', view_func=self.serve)
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_template_global(self.asset_tags, 'asset_tags')
+        app.extensions['assets'] = self
+
+    @property
+    def manifest(self):
+        """manifest.json, re-read when a new build replaces it."""
+        path = os.path.join(self.dist_root, MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return {}
+        if mtime != self._manifest_mtime:
+            with open(path) as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _source_url(self, filename):
+        if filename in VENDOR and not os.path.isfile(os.path.join(current_app.static_folder, filename)):
+            return VENDOR[filename]
+        return url_for('static', filename=filename)
+
+    def asset_url(self, filename):
+        """url_for('static', filename=...) that prefers the fingerprinted build."""
+        built = self.manifest.get(filename)
+        if built:
+            return url_for('assets', filename=built)
+        return self._source_url(filename)
+
+    def asset_tags(self, bundle):
+        """<link>/<script> tags for a bundle (one per source without a build)."""
+        built = self.manifest.get(bundle)
+        if built:
+            urls = [url_for('assets', filename=built)]
+        else:
+            urls = [self._source_url(src) for src in BUNDLES[bundle]]
+
+        if bundle.endswith('.css'):
+            tag = '<link rel="stylesheet" href="{}">'
+        else:
+            tag = '<script src="{}"></script>'
+        return Markup('\n'.join(tag.format(escape(url)) for url in urls))
+
+    def serve(self, filename):
+        path = safe_join(self.dist_root, filename)
+        if path is None or filename.endswith(('.gz', '.br')) or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, ext in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in request.accept_encodings and os.path.isfile(path + ext):
+                path, encoding = path + ext, candidate
+                break
+
+        response = send_file(path, mimetype=mimetype, conditional=True, max_age=self.max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+assets = AssetPipeline()
@@ -0,0 +1,122 @@
+# services/attendance_calendar_service.py
+
+import calendar
+from datetime import date, timedelta
+
+from models import Labour
+from services.attendance_rollup_service import get_daily_series
+
+
+MAX_HEATMAP_MONTHS = 12
+
+
+def _month_start(year, month):
+    return date(year, month, 1)
+
+
+def _next_month(d):
+    return date(d.year + (d.month == 12), (d.month % 12) + 1, 1)
+
+
+def _add_months(d, n):
+    idx = d.year * 12 + (d.month - 1) + n
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def count_active_labours(site_id=None):
+    q = Labour.query.filter(Labour.is_active.is_(True))
+    if site_id:
+        q = q.filter(Labour.site_id == site_id)
+    return q.count()
+
+
+def get_month_daily_stats(site_id, year, month):
+    """
+    Daily present/absent/day/night for one site-month.
+    Two queries: active labour count + one GROUP BY date.
+    """
+    start_date = _month_start(year, month)
+    end_date = _next_month(start_date)
+
+    total_labours = count_active_labours(site_id)
+    series = get_daily_series(start_date, end_date, site_id=site_id)
+
+    daily_stats = []
+    day = start_date
+    while day < end_date:
+        r = series.get(day)
+        present = int(r.present) if r else 0
+
+        daily_stats.append({
+            "date": day,
+            "present": present,
+            "absent": max(total_labours - present, 0),
+            "day": int(r.day_shifts) if r else 0,
+            "night": int(r.night_shifts) if r else 0
+        })
+        day += timedelta(days=1)
+
+    return total_labours, daily_stats
+
+
+def _heat_level(pct):
+    if pct <= 0:
+        return 0
+    if pct < 50:
+        return 1
+    if pct < 70:
+        return 2
+    if pct < 90:
+        return 3
+    return 4
+
+
+def get_attendance_heatmap(end_year, end_month, months=3, site_id=None):
+    """
+    Calendar heat map of attendance % for `months` months ending at
+    end_year/end_month, for one site or (site_id=None) all sites.
+    Always two queries, whatever the range.
+    """
+    months = max(1, min(int(months or 1), MAX_HEATMAP_MONTHS))
+
+    last_month = _month_start(end_year, end_month)
+    first_month = _add_months(last_month, -(months - 1))
+    range_end = _next_month(last_month)
+
+    total_labours = count_active_labours(site_id)
+    series = get_daily_series(first_month, range_end, site_id=site_id)
+
+    cal = calendar.Calendar(firstweekday=0)
+    result = []
+
+    m = first_month
+    while m < range_end:
+        weeks = []
+        for week in cal.monthdatescalendar(m.year, m.month):
+            cells = []
+            for d in week:
+                if d.month != m.month:
+                    cells.append(None)
+                    continue
+
+                r = series.get(d)
+                present = int(r.present) if r else 0
+                pct = round((present / total_labours) * 100, 1) if total_labours else 0
+
+                cells.append({
+                    "date": d,
+                    "present": present,
+                    "percent": pct,
+                    "level": _heat_level(pct)
+                })
+            weeks.append(cells)
+
+        result.append({
+            "year": m.year,
+            "month": m.month,
+            "label": m.strftime("%b %Y"),
+            "weeks": weeks
+        })
+        m = _next_month(m)
+
+    return total_labours, result
@@ -0,0 +1,110 @@
+# services/attendance_export_service.py
+
+import csv
+import io
+
+from sqlalchemy import or_
+
+from models import db, Attendance, Labour
+
+
+EXPORT_HEADER = [
+    'id', 'date', 'labour_id', 'labour_name', 'site_id',
+    'day_shift', 'day_flag', 'night_shift', 'night_flag', 'note'
+]
+
+# rows fetched per round-trip from the server-side cursor
+YIELD_PER = 2000
+
+# rows buffered before a chunk is handed to the WSGI server
+CHUNK_ROWS = 500
+
+
+def build_export_query(site_id=None, start_date=None, end_date=None,
+                       day_shift=None, ot=None):
+    """
+    Plain column query (no ORM entities) for the attendance CSV export,
+    streamed from a server-side cursor.
+    """
+    q = (
+        db.session.query(
+            Attendance.id,
+            Attendance.date,
+            Attendance.labour_id,
+            Labour.name,
+            Attendance.site_id,
+            Attendance.day_shift_flag,
+            Attendance.night_shift_flag,
+            Attendance.note
+        )
+        .join(Labour, Attendance.labour_id == Labour.id)
+    )
+
+    if site_id:
+        q = q.filter(Attendance.site_id == site_id)
+    if start_date:
+        q = q.filter(Attendance.date >= start_date)
+    if end_date:
+        q = q.filter(Attendance.date <= end_date)
+
+    if day_shift == 'present':
+        q = q.filter(Attendance.day_shift_flag == True)
+    elif day_shift == 'absent':
+        q = q.filter(Attendance.day_shift_flag == False)
+
+    if ot == "Yes":
+        q = q.filter(Attendance.night_shift_flag == True)
+    elif ot == "No":
+        q = q.filter(Attendance.night_shift_flag == False)
+    elif ot == "Worked":
+        q = q.filter(or_(Attendance.day_shift_flag == True, Attendance.night_shift_flag == True))
+
+    return (
+        q.order_by(Attendance.date.desc(), Attendance.id.desc())
+        .execution_options(yield_per=YIELD_PER)
+    )
+
+
+def _shift_label(flag):
+    return 'Present' if flag else 'Absent'
+
+
+def iter_attendance_csv(query, chunk_rows=CHUNK_ROWS):
+    """
+    Yield the CSV in chunks of `chunk_rows` lines. Only one chunk of text
+    and one cursor batch of rows are held at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writerow(EXPORT_HEADER)
+
+    pending = 0
+    for r in query:
+        writer.writerow([
+            r.id,
+            r.date.isoformat() if r.date else '',
+            r.labour_id,
+            r.name or '',
+            r.site_id,
+            _shift_label(r.day_shift_flag),
+            int(bool(r.day_shift_flag)),
+            _shift_label(r.night_shift_flag),
+            int(bool(r.night_shift_flag)),
+            r.note or ''
+        ])
+        pending += 1
+
+        if pending >= chunk_rows:
+            yield drain()
+            pending = 0
+
+    tail = drain()
+    if tail:
+        yield tail
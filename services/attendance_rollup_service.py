@@ -0,0 +1,188 @@
+# services/attendance_rollup_service.py
+
+from sqlalchemy import func, case, or_
+
+from models import db, Attendance, SiteDailyAttendance
+from services.upsert_service import insert_ignore
+
+
+def _present_clause():
+    return or_(
+        Attendance.day_shift_flag.is_(True),
+        Attendance.night_shift_flag.is_(True)
+    )
+
+
+def _rollup_columns():
+    present = _present_clause()
+    return (
+        func.coalesce(func.sum(case((present, 1), else_=0)), 0).label("present"),
+        func.coalesce(
+            func.sum(case((Attendance.day_shift_flag.is_(True), 1), else_=0)), 0
+        ).label("day_shifts"),
+        func.coalesce(
+            func.sum(case((Attendance.night_shift_flag.is_(True), 1), else_=0)), 0
+        ).label("night_shifts"),
+        func.max(case((present, Attendance.created_at), else_=None)).label("last_marked"),
+    )
+
+
+# =========================
+# WRITE PATH
+# =========================
+def lock_site_day(site_id, day):
+    """
+    Lock the rollup row of one (site, date) FOR UPDATE and return its
+    version token. Every writer of a site-day takes this lock before reading
+    the day's attendance, so concurrent saves run one after the other, even
+    the first save of a day: a missing row is inserted first (empty, version
+    0; refresh_site_day() removes it again if nothing ends up marked).
+    Does NOT commit.
+    """
+    insert_ignore(SiteDailyAttendance.__table__, [{
+        'site_id': site_id,
+        'date': day,
+        'present': 0,
+        'day_shifts': 0,
+        'night_shifts': 0,
+        'version': 0
+    }], index_elements=['site_id', 'date'])
+
+    return (
+        db.session.query(SiteDailyAttendance.version)
+        .filter_by(site_id=site_id, date=day)
+        .with_for_update()
+        .scalar()
+    ) or 0
+
+
+def refresh_site_day(site_id, day):
+    """
+    Recompute the rollup row for one (site, date) from raw attendance.
+    Call after the attendance rows are flushed; does NOT commit, so the
+    rollup lands in the caller's transaction.
+    """
+    db.session.flush()
+    lock_site_day(site_id, day)
+
+    agg = (
+        db.session.query(
+            func.count(Attendance.id).label("marked"),
+            *_rollup_columns()
+        )
+        .filter(
+            Attendance.site_id == site_id,
+            Attendance.date == day
+        )
+        .one()
+    )
+
+    # the row lock_site_day() holds; reload in case the session has it cached
+    row = (
+        SiteDailyAttendance.query.filter_by(site_id=site_id, date=day)
+        .populate_existing()
+        .one()
+    )
+
+    # nothing marked for this site-day → no rollup row
+    if not agg.marked:
+        if row:
+            db.session.delete(row)
+        return None
+
+    row.present = int(agg.present or 0)
+    row.day_shifts = int(agg.day_shifts or 0)
+    row.night_shifts = int(agg.night_shifts or 0)
+    row.last_marked = agg.last_marked
+    row.version = (row.version or 0) + 1
+
+    return row
+
+
+def get_site_day_version(site_id, day):
+    """Current version token of a (site, date); 0 when nothing is marked."""
+    return (
+        db.session.query(SiteDailyAttendance.version)
+        .filter_by(site_id=site_id, date=day)
+        .scalar()
+    ) or 0
+
+
+def rebuild_site_daily_attendance(site_id=None, start_date=None, end_date=None):
+    """
+    Back-fill: drop and recompute rollups for the given scope with one
+    INSERT ... SELECT ... GROUP BY. Dates are inclusive. Returns rows written.
+    """
+    SiteDailyAttendance.__table__.create(bind=db.engine, checkfirst=True)
+
+    delete_q = SiteDailyAttendance.query
+    source_q = db.session.query(
+        Attendance.site_id,
+        Attendance.date,
+        *_rollup_columns()
+    )
+
+    if site_id:
+        delete_q = delete_q.filter(SiteDailyAttendance.site_id == site_id)
+        source_q = source_q.filter(Attendance.site_id == site_id)
+    if start_date:
+        delete_q = delete_q.filter(SiteDailyAttendance.date >= start_date)
+        source_q = source_q.filter(Attendance.date >= start_date)
+    if end_date:
+        delete_q = delete_q.filter(SiteDailyAttendance.date <= end_date)
+        source_q = source_q.filter(Attendance.date <= end_date)
+
+    source_q = source_q.group_by(Attendance.site_id, Attendance.date)
+
+    try:
+        delete_q.delete(synchronize_session=False)
+        result = db.session.execute(
+            SiteDailyAttendance.__table__.insert().from_select(
+                ["site_id", "date", "present", "day_shifts", "night_shifts", "last_marked"],
+                source_q.statement
+            )
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result.rowcount or 0
+
+
+# =========================
+# READ PATH
+# =========================
+def get_site_day(site_id, day):
+    return SiteDailyAttendance.query.filter_by(site_id=site_id, date=day).first()
+
+
+def get_day_map(day):
+    """{site_id: SiteDailyAttendance} for every site marked on `day`."""
+    rows = SiteDailyAttendance.query.filter(SiteDailyAttendance.date == day).all()
+    return {r.site_id: r for r in rows}
+
+
+def get_daily_series(start_date, end_date, site_id=None):
+    """
+    {date: row} for start_date <= date < end_date, one GROUP BY date over
+    the rollup. Without site_id the counts are summed across all sites.
+    """
+    q = (
+        db.session.query(
+            SiteDailyAttendance.date.label("date"),
+            func.sum(SiteDailyAttendance.present).label("present"),
+            func.sum(SiteDailyAttendance.day_shifts).label("day_shifts"),
+            func.sum(SiteDailyAttendance.night_shifts).label("night_shifts")
+        )
+        .filter(
+            SiteDailyAttendance.date >= start_date,
+            SiteDailyAttendance.date < end_date
+        )
+    )
+
+    if site_id:
+        q = q.filter(SiteDailyAttendance.site_id == site_id)
+
+    rows = q.group_by(SiteDailyAttendance.date).all()
+    return {r.date: r for r in rows}
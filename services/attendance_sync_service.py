@@ -0,0 +1,283 @@
+# services/attendance_sync_service.py
+#
+# Offline-first sync for site managers. The client queues attendance edits
+# while offline, each with its own op id and the time it was made, and
+# uploads the whole backlog in one request:
+#
+#   - replays of an op id return the stored outcome and change nothing
+#   - an op edited before the server row's last edit loses (last write
+#     wins on edit time, Attendance.edited_at; ops without one are rejected)
+#   - every accepted op, across all dates, is applied in one transaction
+#   - the response carries the server rows changed since the client cursor,
+#     held back until they are SYNC_PULL_LAG_SECONDS old (see changes_since)
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+
+from models import db, Attendance, Labour, PayrollRun, SyncOperation
+from services.attendance_rollup_service import lock_site_day
+from services.attendance_write_service import diff_flags, stage_changes
+from services.cache_service import bump_data_version
+
+
+MAX_SYNC_OPS = 2000
+MAX_PULL_ROWS = 2000
+
+
+# =========================
+# PARSING
+# =========================
+def _parse_datetime(value):
+    """ISO string → naive UTC datetime (what the attendance table stores)."""
+    if not value:
+        return None
+    value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_ops(raw):
+    """Validate the op list shape. Returns [{op_id, labour_id, date, day, night, updated_at}]."""
+    if not isinstance(raw, list):
+        raise ValueError('ops must be a list.')
+    if len(raw) > MAX_SYNC_OPS:
+        raise ValueError(f'At most {MAX_SYNC_OPS} operations per sync.')
+
+    ops = []
+    for item in raw:
+        try:
+            op_id = str(item['op_id']).strip()[:64]
+            edited_at = _parse_datetime(item.get('updated_at'))
+            ops.append({
+                'op_id': op_id,
+                'labour_id': int(item['labour_id']),
+                'date': date.fromisoformat(item['date']),
+                'day': bool(int(item.get('day_shift', 0))),
+                'night': bool(int(item.get('night_shift', 0))),
+                'updated_at': edited_at
+            })
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError('Each op needs op_id, labour_id, date, day_shift, night_shift, updated_at.')
+        if not op_id:
+            raise ValueError('op_id cannot be empty.')
+        if edited_at is None:
+            # without the edit time the op cannot be ordered against other edits
+            raise ValueError(f'Op {op_id} has no updated_at.')
+    return ops
+
+
+def encode_cursor(updated_at, row_id):
+    return f"{updated_at.isoformat()}|{row_id}" if updated_at else None
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None, 0
+    try:
+        ts, row_id = cursor.split('|')
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise ValueError('Invalid sync cursor.')
+
+
+# =========================
+# PUSH
+# =========================
+def _closed_months(site_id, months):
+    if not months:
+        return set()
+    return {
+        m for (m,) in db.session.query(PayrollRun.month).filter(
+            PayrollRun.site_id == site_id,
+            PayrollRun.month.in_(months)
+        )
+    }
+
+
+def apply_sync_ops(site_id, ops, user, ip_address=None):
+    """
+    Apply a batch of client ops in one transaction.
+    Returns [{op_id, status, reason?}] in request order, status one of
+    applied / stale / rejected / duplicate.
+    """
+    results = {}
+
+    # ---- replays: one lookup for the whole batch ----
+    op_ids = list({op['op_id'] for op in ops})
+    seen = {
+        s.op_id: s for s in SyncOperation.query.filter(
+            SyncOperation.user_id == user.id,
+            SyncOperation.op_id.in_(op_ids)
+        )
+    } if op_ids else {}
+
+    for op_id, s in seen.items():
+        results[op_id] = {'op_id': op_id, 'status': 'duplicate', 'original': s.status}
+
+    unique = {}
+    for op in ops:
+        if op['op_id'] not in seen:
+            unique.setdefault(op['op_id'], op)   # same op id twice → first one
+    fresh = list(unique.values())
+
+    # ---- validate against the site (set-based) ----
+    labours = {
+        l.id: l for l in Labour.query.filter(
+            Labour.id.in_({op['labour_id'] for op in fresh}),
+            Labour.site_id == site_id,
+            Labour.is_active == True
+        )
+    } if fresh else {}
+    closed = _closed_months(site_id, {op['date'].strftime('%Y-%m') for op in fresh})
+    today = date.today()
+
+    def reject(op, reason):
+        results[op['op_id']] = {'op_id': op['op_id'], 'status': 'rejected', 'reason': reason}
+
+    # latest op per (labour, date) wins inside the batch
+    latest = {}
+    for op in fresh:
+        if op['labour_id'] not in labours:
+            reject(op, 'Unknown labour for this site.')
+        elif op['date'] > today:
+            reject(op, 'Future date.')
+        elif op['date'].strftime('%Y-%m') in closed:
+            reject(op, 'Payroll for this month is closed.')
+        else:
+            key = (op['labour_id'], op['date'])
+            prev = latest.get(key)
+            if prev and prev['updated_at'] > op['updated_at']:
+                results[op['op_id']] = {'op_id': op['op_id'], 'status': 'stale',
+                                        'reason': 'Superseded in the same batch.'}
+                continue
+            if prev:
+                results[prev['op_id']] = {'op_id': prev['op_id'], 'status': 'stale',
+                                          'reason': 'Superseded in the same batch.'}
+            latest[key] = op
+
+    # ---- server state for every touched (labour, date): one query ----
+    by_date = defaultdict(list)
+    for (labour_id, day), op in latest.items():
+        by_date[day].append(op)
+
+    server = {}
+    if latest:
+        # serialise with other writers of these site-days (same order everywhere)
+        for day in sorted(by_date):
+            lock_site_day(site_id, day)
+        for a in db.session.query(
+            Attendance.labour_id, Attendance.date, Attendance.day_shift_flag,
+            Attendance.night_shift_flag, Attendance.edited_at, Attendance.updated_at
+        ).filter(
+            Attendance.labour_id.in_({lid for lid, _ in latest}),
+            Attendance.date.in_(list(by_date))
+        ).with_for_update():
+            server[(a.labour_id, a.date)] = a
+
+    try:
+        for day, day_ops in sorted(by_date.items()):
+            new_flags, existing = {}, {}
+            for op in day_ops:
+                current = server.get((op['labour_id'], day))
+                if current is not None:
+                    existing[op['labour_id']] = (bool(current.day_shift_flag), bool(current.night_shift_flag))
+
+                # conflict: the server value was edited after the client edit
+                # (rows from before edited_at existed fall back to updated_at)
+                server_edit = current and (current.edited_at or current.updated_at)
+                if server_edit and server_edit > op['updated_at']:
+                    results[op['op_id']] = {'op_id': op['op_id'], 'status': 'stale',
+                                            'reason': 'Server has a newer value.'}
+                    continue
+
+                new_flags[op['labour_id']] = (op['day'], op['night'])
+                results[op['op_id']] = {'op_id': op['op_id'], 'status': 'applied'}
+
+            day_labours = [labours[lid] for lid in new_flags]
+            rows, deltas, changes = diff_flags(site_id, day, day_labours, new_flags, existing)
+            edit_times = {op['labour_id']: op['updated_at'] for op in day_ops}
+            for r in rows:
+                r['edited_at'] = edit_times[r['labour_id']]
+            if rows:
+                stage_changes(site_id, day, rows, deltas, changes, user, ip_address,
+                              extra={"sync": True})
+
+        # remember every new op id so replays are no-ops
+        new_records = [
+            {
+                'user_id': user.id,
+                'op_id': r['op_id'],
+                'site_id': site_id,
+                'status': r['status'],
+                'reason': r.get('reason'),
+                'received_at': datetime.utcnow()
+            }
+            for r in results.values() if r['status'] != 'duplicate'
+        ]
+        if new_records:
+            db.session.execute(SyncOperation.__table__.insert().values(new_records))
+
+        if by_date:
+            bump_data_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return [results[op_id] for op_id in dict.fromkeys(op['op_id'] for op in ops)]
+
+
+# =========================
+# PULL
+# =========================
+def changes_since(site_id, cursor=None, limit=MAX_PULL_ROWS, lag=None):
+    """
+    Attendance rows of the site changed after `cursor`, oldest first,
+    keyset-paginated on (updated_at, id). Returns (rows, next_cursor, has_more).
+
+    updated_at is stamped when the row is written, not when the transaction
+    commits (and MySQL DATETIME rounds it to the second), so a row can become
+    visible with a timestamp behind a cursor already handed out. Only rows
+    older than `lag` seconds are returned, which keeps every cursor below the
+    point where such late commits can still land.
+    """
+    since, since_id = decode_cursor(cursor)
+    if lag is None:
+        lag = current_app.config.get('SYNC_PULL_LAG_SECONDS', 10)
+    settled_before = datetime.utcnow() - timedelta(seconds=lag)
+
+    q = db.session.query(
+        Attendance.id, Attendance.labour_id, Attendance.date,
+        Attendance.day_shift_flag, Attendance.night_shift_flag,
+        Attendance.edited_at, Attendance.updated_at
+    ).filter(
+        Attendance.site_id == site_id,
+        Attendance.updated_at < settled_before
+    )
+
+    if since:
+        q = q.filter(
+            (Attendance.updated_at > since) |
+            ((Attendance.updated_at == since) & (Attendance.id > since_id))
+        )
+
+    rows = q.order_by(Attendance.updated_at.asc(), Attendance.id.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id) if rows else cursor
+
+    return [
+        {
+            'labour_id': r.labour_id,
+            'date': r.date.isoformat(),
+            'day_shift': int(bool(r.day_shift_flag)),
+            'night_shift': int(bool(r.night_shift_flag)),
+            'edited_at': r.edited_at.isoformat() if r.edited_at else None,
+            'updated_at': r.updated_at.isoformat() if r.updated_at else None
+        }
+        for r in rows
+    ], next_cursor, has_more
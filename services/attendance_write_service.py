@@ -0,0 +1,284 @@
+# services/attendance_write_service.py
+#
+# Write path of the mark-attendance grid: one prefetch of the day's rows,
+# one bulk upsert (ON DUPLICATE KEY UPDATE / ON CONFLICT) and batched ledger
+# deltas, so saving a whole site is a handful of statements. Writers of a
+# site-day first take its rollup row lock (lock_site_day), so concurrent
+# saves of the same day are serialised and diff against committed state.
+
+import json
+from datetime import datetime
+
+from sqlalchemy.dialects import mysql, sqlite, postgresql
+
+from models import db, Attendance, AuditLog
+from services.attendance_rollup_service import refresh_site_day, lock_site_day, get_site_day
+from services.cache_service import bump_data_version
+from services.ledger_service import apply_ledger_shift_deltas
+
+
+UPSERT_BATCH_SIZE = 500
+
+
+def _status(flag):
+    return "Present" if flag else "Absent"
+
+
+def _upsert_statement(rows):
+    """INSERT ... that updates the shift flags when (labour_id, date) exists."""
+    table = Attendance.__table__
+    dialect = db.session.get_bind().dialect.name
+    now = datetime.utcnow()
+
+    for r in rows:
+        r.setdefault('created_at', now)
+        r.setdefault('edited_at', now)
+        r['updated_at'] = now
+
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(rows)
+        return stmt.on_duplicate_key_update(
+            day_shift_flag=stmt.inserted.day_shift_flag,
+            night_shift_flag=stmt.inserted.night_shift_flag,
+            edited_at=stmt.inserted.edited_at,
+            updated_at=stmt.inserted.updated_at
+        )
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=['labour_id', 'date'],
+            set_={
+                'day_shift_flag': stmt.excluded.day_shift_flag,
+                'night_shift_flag': stmt.excluded.night_shift_flag,
+                'edited_at': stmt.excluded.edited_at,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+
+    return None
+
+
+def upsert_attendance(rows):
+    """
+    rows: dicts with labour_id, site_id, date, day_shift_flag,
+    night_shift_flag and optionally edited_at (default: now). Existing (labour_id, date) rows keep their site and
+    note; only the flags change. Does NOT commit.
+    """
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i:i + UPSERT_BATCH_SIZE]
+        stmt = _upsert_statement(batch)
+
+        if stmt is not None:
+            db.session.execute(stmt)
+            continue
+
+        # other dialects: ORM merge on the unique key
+        for r in batch:
+            existing = Attendance.query.filter_by(labour_id=r['labour_id'], date=r['date']).first()
+            if existing:
+                existing.day_shift_flag = r['day_shift_flag']
+                existing.night_shift_flag = r['night_shift_flag']
+                existing.edited_at = r['edited_at']
+            else:
+                db.session.add(Attendance(**r))
+        db.session.flush()
+
+
+def prefetch_flags(labour_ids, day):
+    """
+    {labour_id: (day, night)} for existing rows, locked FOR UPDATE on MySQL.
+    Call with the site-day lock held (lock_site_day).
+    """
+    if not labour_ids:
+        return {}
+    return {
+        a.labour_id: (bool(a.day_shift_flag), bool(a.night_shift_flag))
+        for a in db.session.query(
+            Attendance.labour_id, Attendance.day_shift_flag, Attendance.night_shift_flag
+        )
+        .filter(Attendance.labour_id.in_(labour_ids), Attendance.date == day)
+        .with_for_update()
+        .all()
+    }
+
+
+def diff_flags(site_id, day, labours, new_flags, existing):
+    """Upsert rows, ledger deltas and audit changes for labours whose flags change."""
+    rows, deltas, changes = [], {}, []
+
+    for labour in labours:
+        if labour.id not in new_flags:
+            continue
+
+        new_day, new_night = (bool(f) for f in new_flags[labour.id])
+        old = existing.get(labour.id)
+
+        if old == (new_day, new_night):
+            continue
+
+        old_day, old_night = old or (False, False)
+
+        rows.append({
+            'labour_id': labour.id,
+            'site_id': site_id,
+            'date': day,
+            'day_shift_flag': new_day,
+            'night_shift_flag': new_night
+        })
+        deltas[labour.id] = (int(new_day) - int(old_day), int(new_night) - int(old_night))
+
+        changes.append({
+            "labour_id": labour.id,
+            "labour_name": labour.name,
+            "before": {"day": _status(old_day), "night": _status(old_night)},
+            "after": {"day": _status(new_day), "night": _status(new_night)},
+            "note": "updated" if old else "created"
+        })
+
+    return rows, deltas, changes
+
+
+def stage_changes(site_id, day, rows, deltas, changes, user, ip_address, extra=None):
+    """
+    Apply a diff for one site-day and add its audit entry, without
+    committing. Returns the refreshed rollup row.
+    """
+    if rows:
+        upsert_attendance(rows)
+        apply_ledger_shift_deltas(site_id, day, deltas)
+
+    # keep the per-site daily rollup in the same transaction
+    rollup = refresh_site_day(site_id, day)
+
+    #  STRUCTURED AUDIT LOG
+    db.session.add(AuditLog(
+        user_id=user.id,
+        username=user.username,
+        role=user.role,
+        site_id=site_id,
+        action='mark_attendance',
+        details=json.dumps({
+            "date": day.isoformat(),
+            "changed_count": len(changes),
+            **(extra or {}),
+            "changes": changes
+        }, ensure_ascii=False),
+        ip_address=ip_address,
+        created_at=datetime.utcnow()
+    ))
+
+    return rollup
+
+
+def _commit_changes(site_id, day, rows, deltas, changes, user, ip_address, extra=None):
+    """Apply a diff and its audit entry in one transaction. Returns the rollup row."""
+    try:
+        rollup = stage_changes(site_id, day, rows, deltas, changes, user, ip_address, extra)
+        bump_data_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return rollup
+
+
+def save_attendance_grid(site_id, day, labours, flags, user, ip_address=None):
+    """
+    Save the grid for one site-day in a single transaction: attendance
+    upsert, ledger deltas, daily rollup, dashboard version and the audit
+    entry. flags = {labour_id: (day_flag, night_flag)}.
+    Returns the list of per-labour changes that were audited.
+    """
+    flags = {l.id: flags.get(l.id, (0, 0)) for l in labours}
+
+    # serialise with other saves of this site-day before reading its state
+    lock_site_day(site_id, day)
+    existing = prefetch_flags([l.id for l in labours], day)
+
+    rows, deltas, changes = diff_flags(site_id, day, labours, flags, existing)
+    _commit_changes(site_id, day, rows, deltas, changes, user, ip_address)
+
+    return changes
+
+
+# =========================
+# AUTOSAVE (CELL DELTAS)
+# =========================
+SHIFTS = ('day', 'night')
+
+
+class AttendanceVersionConflict(ValueError):
+    """The (site, date) changed since the client loaded it."""
+
+    def __init__(self, version, cells):
+        super().__init__('Attendance was changed by someone else. Reload to continue.')
+        self.version = version
+        self.cells = cells
+
+
+def get_day_cells(site_id, day):
+    """{labour_id: [day, night]} for the site-day (what the grid shows)."""
+    return {
+        a.labour_id: [int(bool(a.day_shift_flag)), int(bool(a.night_shift_flag))]
+        for a in db.session.query(
+            Attendance.labour_id, Attendance.day_shift_flag, Attendance.night_shift_flag
+        ).filter(Attendance.site_id == site_id, Attendance.date == day)
+    }
+
+
+def parse_cell_deltas(raw):
+    """[{labour_id, shift, value}] → {labour_id: {'day': bool, 'night': bool}}."""
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('changes must be a non-empty list.')
+
+    parsed = {}
+    for item in raw:
+        try:
+            labour_id = int(item['labour_id'])
+            shift = item['shift']
+            value = bool(int(item['value']))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each change needs labour_id, shift and value.')
+        if shift not in SHIFTS:
+            raise ValueError(f"shift must be one of {', '.join(SHIFTS)}.")
+        parsed.setdefault(labour_id, {})[shift] = value
+    return parsed
+
+
+def apply_cell_deltas(site_id, day, labours, deltas, expected_version,
+                      user, ip_address=None):
+    """
+    Apply only the changed cells. `labours` are the site's active labours
+    named in `deltas`; `expected_version` is the token the client loaded.
+    Raises AttendanceVersionConflict if the site-day moved on meanwhile.
+    Returns (new_version, rollup row, number of changed labours); the rollup
+    row is None only when nothing is marked for the site-day.
+    """
+    # lock the rollup row: concurrent autosaves of one site-day serialise here
+    current = lock_site_day(site_id, day)
+    if current != expected_version:
+        db.session.rollback()
+        raise AttendanceVersionConflict(current, get_day_cells(site_id, day))
+
+    existing = prefetch_flags([l.id for l in labours], day)
+
+    new_flags = {}
+    for labour in labours:
+        old_day, old_night = existing.get(labour.id, (False, False))
+        cell = deltas.get(labour.id, {})
+        new_flags[labour.id] = (cell.get('day', old_day), cell.get('night', old_night))
+
+    rows, ledger_deltas, changes = diff_flags(site_id, day, labours, new_flags, existing)
+    if not rows:
+        # nothing changed: release the lock and report the day as it stands
+        db.session.rollback()
+        return current, get_site_day(site_id, day), 0
+
+    rollup = _commit_changes(
+        site_id, day, rows, ledger_deltas, changes, user, ip_address,
+        extra={"autosave": True}
+    )
+    return rollup.version if rollup else 0, rollup, len(changes)
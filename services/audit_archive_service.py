@@ -0,0 +1,259 @@
+# services/audit_archive_service.py
+#
+# Moves old audit_log rows into audit_log_archive in bounded id-range chunks:
+# each chunk is one INSERT ... SELECT plus one DELETE over [lo, hi) and is
+# committed together with the run's progress, so a run that dies half-way
+# resumes from the last committed chunk and never copies a row twice.
+# When audit_log is partitioned (MySQL), whole months older than the cutoff
+# are swapped out by partition exchange first (see partition_service).
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import func, select
+
+from models import db, AuditLog, AuditLogArchive, AuditArchiveRun
+from services.partition_service import archive_audit_partitions
+
+
+# queued/running runs without a heartbeat for this long are treated as lost
+# (worker restarted)
+STALE_AFTER = timedelta(minutes=30)
+
+ARCHIVE_COLUMNS = (
+    'user_id', 'username', 'role', 'site_id', 'action',
+    'details', 'ip_address', 'created_at'
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # one worker: archive runs never overlap inside a process
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audit-archive')
+        return _executor
+
+
+def archive_cutoff(months=None, now=None):
+    """
+    Start of the retention window: the current month plus the previous
+    `months - 1` months are kept (AUDIT_RETENTION_MONTHS by default).
+    """
+    months = months or current_app.config.get('AUDIT_RETENTION_MONTHS', 3)
+    if months < 1:
+        raise ValueError('Retention must be at least one month.')
+
+    now = now or datetime.utcnow()
+    first_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return first_of_month - relativedelta(months=months - 1)
+
+
+# =========================
+# RUNS
+# =========================
+def _last_seen():
+    return func.coalesce(AuditArchiveRun.heartbeat_at, AuditArchiveRun.created_at)
+
+
+def _in_flight():
+    return (
+        AuditArchiveRun.query
+        .filter(
+            AuditArchiveRun.status.in_(('queued', 'running')),
+            _last_seen() >= datetime.utcnow() - STALE_AFTER
+        )
+        .order_by(AuditArchiveRun.id.desc())
+        .first()
+    )
+
+
+def _claim(run_id):
+    """
+    Mark the run as running for this worker. Compare-and-set in one UPDATE,
+    so of two workers handed the same run only one gets it; a running run
+    is only taken over once its heartbeat is stale. Returns True when claimed.
+    """
+    now = datetime.utcnow()
+    claimed = (
+        AuditArchiveRun.query
+        .filter(
+            AuditArchiveRun.id == run_id,
+            (AuditArchiveRun.status.in_(('queued', 'failed'))) |
+            ((AuditArchiveRun.status == 'running') & (_last_seen() < now - STALE_AFTER))
+        )
+        .update({'status': 'running', 'heartbeat_at': now}, synchronize_session=False)
+    )
+    db.session.commit()
+    return bool(claimed)
+
+
+def _resumable(cutoff):
+    """Latest unfinished run for the same cutoff (failed or lost)."""
+    return (
+        AuditArchiveRun.query
+        .filter(
+            AuditArchiveRun.cutoff == cutoff,
+            AuditArchiveRun.status.in_(('queued', 'running', 'failed'))
+        )
+        .order_by(AuditArchiveRun.id.desc())
+        .first()
+    )
+
+
+def prepare_archive_run(months=None, user=None):
+    """
+    Return the run to execute: the one already in flight, an interrupted
+    run for the same cutoff (resumed where it stopped) or a new one.
+    """
+    in_flight = _in_flight()
+    if in_flight:
+        return in_flight, False
+
+    cutoff = archive_cutoff(months)
+    run = _resumable(cutoff)
+
+    # the id range is fixed when the run is created; rows written later
+    # with an older created_at (none in practice) wait for the next run
+    first_id, max_id = db.session.query(
+        func.min(AuditLog.id), func.max(AuditLog.id)
+    ).filter(AuditLog.created_at < cutoff).one()
+
+    try:
+        if run is None:
+            run = AuditArchiveRun(
+                cutoff=cutoff,
+                first_id=first_id or 0,
+                max_id=max_id or 0,
+                last_id=(first_id or 1) - 1,
+                created_by_id=user.id if user else None,
+                created_at=datetime.utcnow()
+            )
+            db.session.add(run)
+        else:
+            run.max_id = max(run.max_id, max_id or 0)
+            run.error = None
+
+        run.status = 'queued'
+        run.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return run, True
+
+
+def start_archive_run(months=None, user=None):
+    """Prepare a run and execute it on the background worker."""
+    run, fresh = prepare_archive_run(months, user)
+    if fresh:
+        app = current_app._get_current_object()
+        _get_executor().submit(_run_in_app, app, run.id)
+    return run
+
+
+def get_archive_run(run_id):
+    return AuditArchiveRun.query.get(run_id)
+
+
+def get_latest_archive_run():
+    return AuditArchiveRun.query.order_by(AuditArchiveRun.id.desc()).first()
+
+
+def run_to_dict(run):
+    return {
+        'id': run.id,
+        'status': run.status,
+        'progress': run.progress,
+        'moved': run.moved,
+        'cutoff': run.cutoff.isoformat(),
+        'last_id': run.last_id,
+        'max_id': run.max_id,
+        'error': run.error
+    }
+
+
+# =========================
+# WORKER
+# =========================
+def _move_chunk(cutoff, lo, hi):
+    """Copy + delete audit_log rows with lo <= id < hi older than cutoff."""
+    src = AuditLog.__table__
+    dst = AuditLogArchive.__table__
+    where = (src.c.id >= lo, src.c.id < hi, src.c.created_at < cutoff)
+
+    db.session.execute(
+        dst.insert().from_select(
+            list(ARCHIVE_COLUMNS),
+            select(*[src.c[name] for name in ARCHIVE_COLUMNS]).where(*where).order_by(src.c.id)
+        )
+    )
+    return db.session.execute(src.delete().where(*where)).rowcount or 0
+
+
+def run_archive(run_id, chunk_size=None, progress=None):
+    """
+    Walk the run's id range chunk by chunk. Each chunk and the run's
+    last_id/moved/heartbeat_at are committed together. `progress(run)` is
+    called after every chunk. Returns the run; ValueError when another
+    worker is already executing it.
+    """
+    chunk_size = chunk_size or current_app.config.get('AUDIT_ARCHIVE_CHUNK', 5000)
+
+    if not _claim(run_id):
+        raise ValueError(f'Archive run #{run_id} is already running.')
+
+    run = AuditArchiveRun.query.get(run_id)
+    run.started_at = run.started_at or datetime.utcnow()
+    db.session.commit()
+
+    try:
+        # partitioned audit_log (MySQL): whole months go by partition exchange
+        swapped = archive_audit_partitions(run.cutoff, chunk_size)
+        if swapped:
+            run.moved += swapped
+            remaining = db.session.query(func.max(AuditLog.id)).filter(
+                AuditLog.created_at < run.cutoff
+            ).scalar()
+            run.last_id = run.max_id if remaining is None else run.last_id
+            run.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+        while run.last_id < run.max_id:
+            lo = run.last_id + 1
+            hi = min(lo + chunk_size, run.max_id + 1)
+
+            run.moved += _move_chunk(run.cutoff, lo, hi)
+            run.last_id = hi - 1
+            run.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            if progress:
+                progress(run)
+    except Exception as e:
+        db.session.rollback()
+        run = AuditArchiveRun.query.get(run_id)
+        run.status = 'failed'
+        run.error = str(e)[:1000]
+        db.session.commit()
+        raise
+
+    run.status = 'done'
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+
+def _run_in_app(app, run_id):
+    with app.app_context():
+        try:
+            run_archive(run_id)
+        except Exception:
+            app.logger.exception('Audit archive run %s failed', run_id)
@@ -0,0 +1,241 @@
+# services/audit_log_service.py
+#
+# Audit log viewer queries: keyset pagination on (created_at, id) backed by
+# the composite indexes on audit_log, plus full-text search over `details`
+# (MySQL FULLTEXT, SQLite FTS5 for local runs, LIKE when neither exists).
+# A FULLTEXT index and monthly partitions of audit_log exclude each other on
+# MySQL; see services/partition_service.py.
+
+import re
+from datetime import datetime, time, timedelta
+
+import pytz
+from flask import current_app
+from sqlalchemy import inspect, text
+
+from models import db, AuditLog
+from services.partition_service import is_partitioned
+
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+FTS_TABLE = 'audit_log_fts'
+FULLTEXT_INDEX = 'ft_audit_details'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# per-process: which search backend the database has ('mysql', 'sqlite' or None)
+_backend = {}
+
+
+# =========================
+# FILTERS / CURSOR
+# =========================
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}')
+
+
+def parse_audit_filters(args):
+    """Request args → normalised filter dict (dates are local calendar days)."""
+    filters = {
+        'role': args.get('role') or None,
+        'site_id': _int(args.get('site_id')),
+        'user_id': _int(args.get('user_id')),
+        'action': (args.get('action') or '').strip() or None,
+        'start_date': _date(args.get('start_date')),
+        'end_date': _date(args.get('end_date')),
+        'q': (args.get('q') or '').strip() or None
+    }
+    if filters['start_date'] and filters['end_date'] and filters['start_date'] > filters['end_date']:
+        raise ValueError('Start date must be before end date.')
+    return filters
+
+
+def _utc_bound(day):
+    """Start of a local calendar day as a naive UTC datetime (what audit_log stores)."""
+    tz = pytz.timezone(current_app.config.get('APP_TIMEZONE', 'Asia/Kolkata'))
+    local = tz.localize(datetime.combine(day, time.min))
+    return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def encode_cursor(created_at, row_id):
+    return f"{created_at.isoformat()}|{row_id}"
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None, None
+    try:
+        ts, row_id = cursor.split('|')
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise ValueError('Invalid page cursor.')
+
+
+# =========================
+# FULL-TEXT SEARCH
+# =========================
+def _search_backend():
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _backend:
+        insp = inspect(engine)
+        dialect = engine.dialect.name
+        if dialect in ('mysql', 'mariadb'):
+            found = any(ix['name'] == FULLTEXT_INDEX for ix in insp.get_indexes(AuditLog.__tablename__))
+            _backend[key] = 'mysql' if found else None
+        elif dialect == 'sqlite':
+            _backend[key] = 'sqlite' if insp.has_table(FTS_TABLE) else None
+        else:
+            _backend[key] = None
+    return _backend[key]
+
+
+def _apply_search(query, q):
+    words = _WORD_RE.findall(q)[:10]
+    if not words:
+        return query
+
+    backend = _search_backend()
+
+    if backend == 'mysql':
+        # every word required, prefix match
+        terms = ' '.join(f'+{w}*' for w in words)
+        return query.filter(
+            text('MATCH (audit_log.details) AGAINST (:terms IN BOOLEAN MODE)')
+            .bindparams(terms=terms)
+        )
+
+    if backend == 'sqlite':
+        terms = ' '.join(f'"{w}"*' for w in words)
+        return query.filter(
+            text(f'audit_log.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :terms)')
+            .bindparams(terms=terms)
+        )
+
+    for w in words:
+        query = query.filter(AuditLog.details.like(f'%{w}%'))
+    return query
+
+
+def ensure_audit_search_index():
+    """
+    Create the full-text index over audit_log.details if it is missing and
+    (on SQLite) back-fill it. Returns a short description of what exists.
+    Raises ValueError on MySQL when audit_log is partitioned.
+    """
+    engine = db.engine
+    dialect = engine.dialect.name
+    _backend.pop(str(engine.url), None)
+
+    if dialect in ('mysql', 'mariadb'):
+        if _search_backend() != 'mysql':
+            if is_partitioned(AuditLog.__tablename__):
+                raise ValueError(
+                    'audit_log is partitioned, and MySQL does not support FULLTEXT indexes on '
+                    'partitioned tables. Search keeps using LIKE.'
+                )
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f'ALTER TABLE audit_log ADD FULLTEXT INDEX {FULLTEXT_INDEX} (details)'
+                ))
+            _backend.pop(str(engine.url), None)
+        return f'MySQL FULLTEXT index {FULLTEXT_INDEX}'
+
+    if dialect == 'sqlite':
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(details, content='audit_log', content_rowid='id')"
+            ))
+            # external-content FTS: triggers keep it in step with audit_log
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS audit_log_fts_ai AFTER INSERT ON audit_log BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, details) VALUES (new.id, new.details); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS audit_log_fts_ad AFTER DELETE ON audit_log BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, details) "
+                f"VALUES ('delete', old.id, old.details); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS audit_log_fts_au AFTER UPDATE ON audit_log BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, details) "
+                f"VALUES ('delete', old.id, old.details); "
+                f"INSERT INTO {FTS_TABLE}(rowid, details) VALUES (new.id, new.details); END"
+            ))
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        _backend.pop(str(engine.url), None)
+        return f'SQLite FTS5 table {FTS_TABLE}'
+
+    return 'No full-text support for this database; search uses LIKE'
+
+
+# =========================
+# PAGE QUERY
+# =========================
+def search_audit_logs(filters, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of audit logs, newest first. Returns (logs, next_cursor);
+    next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit or PAGE_SIZE, MAX_PAGE_SIZE))
+    query = AuditLog.query
+
+    if filters.get('role'):
+        query = query.filter(AuditLog.role == filters['role'])
+    if filters.get('site_id'):
+        query = query.filter(AuditLog.site_id == filters['site_id'])
+    if filters.get('user_id'):
+        query = query.filter(AuditLog.user_id == filters['user_id'])
+    if filters.get('action'):
+        query = query.filter(AuditLog.action == filters['action'])
+    if filters.get('start_date'):
+        query = query.filter(AuditLog.created_at >= _utc_bound(filters['start_date']))
+    if filters.get('end_date'):
+        query = query.filter(AuditLog.created_at < _utc_bound(filters['end_date'] + timedelta(days=1)))
+    if filters.get('q'):
+        query = _apply_search(query, filters['q'])
+
+    before, before_id = decode_cursor(cursor)
+    if before:
+        query = query.filter(
+            (AuditLog.created_at < before) |
+            ((AuditLog.created_at == before) & (AuditLog.id < before_id))
+        )
+
+    logs = (
+        query
+        .order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        last = logs[-1]
+        if last.created_at:
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+    return logs, next_cursor
+
+
+def list_audit_actions():
+    """Distinct action names for the filter dropdown (index-only scan)."""
+    return [
+        a for (a,) in db.session.query(AuditLog.action).distinct().order_by(AuditLog.action)
+    ]
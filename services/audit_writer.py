@@ -0,0 +1,187 @@
+# services/audit_writer.py
+#
+# Buffered audit log writer. Request handlers enqueue plain row dicts; a
+# daemon thread drains the queue with multi-row INSERTs on its own
+# connection, whenever AUDIT_BATCH_SIZE entries are waiting or every
+# AUDIT_FLUSH_INTERVAL seconds, and once more at interpreter shutdown.
+# A batch the database rejects is retried row by row, so one bad entry is
+# logged and dropped instead of holding back everything queued behind it;
+# when no row gets in (database down) the batch is re-queued and dropped
+# after AUDIT_MAX_ATTEMPTS failed flushes in a row.
+# With AUDIT_ASYNC = False (or outside an initialised app) every entry is
+# written synchronously through the request session, as before.
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from flask import has_app_context
+
+from models import db, AuditLog
+
+
+log = logging.getLogger(__name__)
+
+
+class AuditWriter:
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.batch_size = 200
+        self.flush_interval = 2.0
+        self.max_queue = 10000
+        self.max_attempts = 5
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._failures = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('AUDIT_ASYNC', True) and not app.config.get('TESTING')
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+        self.max_queue = app.config.get('AUDIT_MAX_QUEUE', self.max_queue)
+        self.max_attempts = app.config.get('AUDIT_MAX_ATTEMPTS', self.max_attempts)
+
+        app.extensions['audit_writer'] = self
+        atexit.register(self.shutdown)
+
+    # =========================
+    # PRODUCER
+    # =========================
+    def write(self, row):
+        """Queue one audit row (dict of AuditLog columns)."""
+        if not self.enabled:
+            self._write_sync(row)
+            return
+
+        self._ensure_thread()
+
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                # never block a request on audit I/O; keep the newest entries
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(row)
+            size = len(self._queue)
+
+        if size >= self.batch_size:
+            self._wake.set()
+
+    def _write_sync(self, row):
+        db.session.add(AuditLog(**row))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    # =========================
+    # CONSUMER
+    # =========================
+    def _ensure_thread(self):
+        # gunicorn forks after import: each worker needs its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue.clear()   # parent's queue was flushed by the parent
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='audit-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _drain(self):
+        with self._lock:
+            n = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of rows written."""
+        written = 0
+        while True:
+            rows = self._drain()
+            if not rows:
+                return written
+            try:
+                self._insert(rows)
+            except Exception:
+                log.exception('Audit batch of %d entries failed; retrying one by one', len(rows))
+                count, failed = self._insert_each(rows)
+                written += count
+                if failed and not count:
+                    # nothing got in: most likely the database, not the rows
+                    self._requeue(failed)
+                    return written
+                for row in failed:
+                    log.error('Dropping audit entry the database rejects: %r', row)
+                self.dropped += len(failed)
+            else:
+                written += len(rows)
+            self._failures = 0
+
+    def _insert_each(self, rows):
+        """Insert rows one per transaction. Returns (written, failed rows)."""
+        written, failed = 0, []
+        for row in rows:
+            try:
+                self._insert([row])
+                written += 1
+            except Exception:
+                failed.append(row)
+        return written, failed
+
+    def _requeue(self, rows):
+        self._failures += 1
+        if self._failures >= self.max_attempts:
+            log.error('Audit flush failed %d times in a row; dropping %d entries',
+                      self._failures, len(rows))
+            self.dropped += len(rows)
+            self._failures = 0
+            return
+        with self._lock:
+            self._queue.extendleft(reversed(rows))
+
+    def _insert(self, rows):
+        def run():
+            with db.engine.begin() as conn:
+                conn.execute(AuditLog.__table__.insert().values(rows))
+
+        if has_app_context():
+            run()
+        else:
+            with self.app.app_context():
+                run()
+
+    def shutdown(self):
+        """Stop the thread and flush what is left (registered with atexit)."""
+        if not self.enabled or self.app is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+audit_writer = AuditWriter()
@@ -0,0 +1,97 @@
+# services/cache_service.py
+
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+
+from models import db, DataVersion
+from services.upsert_service import insert_ignore
+
+
+DASHBOARD = 'dashboard'
+
+
+# =========================
+# DATA VERSIONS (SHARED VIA DB)
+# =========================
+def get_data_version(name=DASHBOARD):
+    return db.session.query(DataVersion.version).filter(
+        DataVersion.name == name
+    ).scalar() or 0
+
+
+def bump_data_version(name=DASHBOARD):
+    """
+    Increment the version inside the current transaction.
+    Does NOT commit — call it right before the write's own commit.
+    """
+    # first use: concurrent writers may both create the row
+    insert_ignore(DataVersion.__table__, [{'name': name, 'version': 0}], ['name'])
+    db.session.execute(
+        update(DataVersion)
+        .where(DataVersion.name == name)
+        .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+# =========================
+# IN-PROCESS CACHE
+# =========================
+class VersionedCache:
+    """
+    Per-process cache of one payload per key, tagged with a data version.
+
+    Stale-while-revalidate: when the version moves (or max_age passes) one
+    caller recomputes while concurrent callers get the previous payload.
+    Only a cold key makes callers wait.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._entries = {}          # key -> (version, payload, stored_at)
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _is_fresh(self, entry, version):
+        return (
+            entry[0] == version
+            and (time.monotonic() - entry[2]) < self.max_age
+        )
+
+    def get_or_compute(self, key, version, compute):
+        entry = self._entries.get(key)
+        if entry and self._is_fresh(entry, version):
+            return entry[1]
+
+        lock = self._lock_for(key)
+        if entry:
+            # someone is already refreshing → serve the stale payload
+            if not lock.acquire(blocking=False):
+                return entry[1]
+        else:
+            lock.acquire()
+
+        try:
+            entry = self._entries.get(key)
+            if entry and self._is_fresh(entry, version):
+                return entry[1]
+
+            payload = compute()
+
+            with self._guard:
+                # one payload per cache: older keys (e.g. yesterday) are dead
+                self._entries = {key: (version, payload, time.monotonic())}
+                self._locks = {key: lock}
+            return payload
+        finally:
+            lock.release()
+
+    def clear(self):
+        with self._guard:
+            self._entries = {}
@@ -0,0 +1,209 @@
+# services/compression_service.py
+#
+# Response compression for rendered pages and JSON. An after_request hook
+# negotiates brotli (when the module is installed) or gzip from
+# Accept-Encoding and compresses responses whose mimetype is in
+# COMPRESS_MIMETYPES and whose body is at least COMPRESS_MIN_SIZE bytes.
+# Left alone:
+#   - responses that already carry a Content-Encoding, including the
+#     precompressed /assets/ files;
+#   - send_file() passthrough responses such as XLSX/CSV downloads and
+#     documents. Those are either compressed formats or should keep
+#     sendfile;
+#   - partial content, no-transform, HEAD requests and bodiless statuses.
+# Streamed responses (e.g. the attendance CSV export) are compressed chunk
+# by chunk with a sync flush, so rows still reach the client as they are
+# produced.
+#
+# Counters are per process (each gunicorn worker keeps its own) and are
+# exposed through compressor.stats() / GET /admin/api/compression-stats.
+
+import gzip
+import threading
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+
+DEFAULT_MIMETYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+class _GzipStream:
+    def __init__(self, level):
+        # wbits 16 + 15: gzip header/trailer around the deflate stream
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, chunk):
+        return self._z.compress(chunk) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._c = brotli.Compressor(quality=quality)
+
+    def process(self, chunk):
+        return self._c.process(chunk) + self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+class Compressor:
+
+    def __init__(self):
+        self.app = None
+        self.enabled = True
+        self.min_size = 1024
+        self.mimetypes = frozenset(DEFAULT_MIMETYPES)
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self.streams = True
+
+        self._lock = threading.Lock()
+        self._counters = {}
+        self.reset_stats()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.mimetypes = frozenset(app.config.get('COMPRESS_MIMETYPES') or DEFAULT_MIMETYPES)
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', self.gzip_level)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', self.brotli_quality)
+        self.streams = app.config.get('COMPRESS_STREAMS', self.streams)
+
+        if self.enabled:
+            app.after_request(self.after_request)
+        app.extensions['compressor'] = self
+
+    # =========================
+    # METRICS
+    # =========================
+    def reset_stats(self):
+        with self._lock:
+            self._counters = {
+                'compressed': 0,
+                'streamed': 0,
+                'skipped_small': 0,
+                'bytes_in': 0,
+                'bytes_out': 0,
+                'br': 0,
+                'gzip': 0,
+            }
+
+    def _count(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                self._counters[name] += value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+        return stats
+
+    # =========================
+    # NEGOTIATION
+    # =========================
+    def _encoding(self):
+        # highest q-value wins; on a tie brotli (smaller) is preferred
+        offered = ['br', 'gzip'] if brotli else ['gzip']
+        return request.accept_encodings.best_match(offered)
+
+    def _compressible(self, response):
+        if request.method == 'HEAD':
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if 'Content-Range' in response.headers or response.cache_control.no_transform:
+            return False
+        return response.mimetype in self.mimetypes
+
+    def _compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def _stream(self, iterable, encoder, encoding):
+        bytes_in = bytes_out = 0
+        try:
+            for chunk in iterable:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                if not chunk:
+                    continue
+                bytes_in += len(chunk)
+                out = encoder.process(chunk)
+                bytes_out += len(out)
+                if out:
+                    yield out
+            tail = encoder.finish()
+            bytes_out += len(tail)
+            yield tail
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+            self._count(streamed=1, bytes_in=bytes_in, bytes_out=bytes_out, **{encoding: 1})
+
+    def _mark(self, response, encoding):
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # the compressed body is a different representation
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+
+    def after_request(self, response):
+        if not self._compressible(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._encoding()
+        if not encoding:
+            return response
+
+        if response.is_streamed:
+            if not self.streams:
+                return response
+            encoder = _BrotliStream(self.brotli_quality) if encoding == 'br' else _GzipStream(self.gzip_level)
+            response.response = self._stream(response.response, encoder, encoding)
+            response.headers.pop('Content-Length', None)
+            self._mark(response, encoding)
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            self._count(skipped_small=1)
+            return response
+
+        compressed = self._compress(data, encoding)
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        self._mark(response, encoding)
+        self._count(compressed=1, bytes_in=len(data), bytes_out=len(compressed), **{encoding: 1})
+        return response
+
+
+compressor = Compressor()
@@ -1,13 +1,31 @@
 from datetime import date, datetime, time
-from sqlalchemy import func, case, or_, extract
+from sqlalchemy import func, case, extract
 from decimal import Decimal
 
 from models import db, Site, Labour, Attendance, Payment, User
 from sqlalchemy.orm import joinedload
 
+from services.attendance_rollup_service import get_day_map
+from services.cache_service import VersionedCache, get_data_version
+from services.payroll_service import get_payroll_state
+
 
 ATTENDANCE_CUTOFF = time(22, 00)  # 9:30 AM IST
 
+_dashboard_cache = VersionedCache(max_age=300)
+
+
+def get_admin_dashboard_data_cached():
+    """
+    Cached get_admin_dashboard_data(), keyed by (today, data version).
+    Writes that affect the dashboard call bump_data_version().
+    """
+    return _dashboard_cache.get_or_compute(
+        date.today(),
+        get_data_version(),
+        get_admin_dashboard_data
+    )
+
 def get_admin_dashboard_data():
     today = date.today()
     year = today.year
@@ -22,30 +40,13 @@ def get_admin_dashboard_data():
     # =========================
     # ATTENDANCE TODAY (SITE-WISE)
     # =========================
-    attendance_today = (
-        db.session.query(
-            Attendance.site_id,
-            func.count(func.distinct(Attendance.labour_id)).label("present"),
-            func.max(Attendance.created_at).label("last_marked")
-        )
-        .filter(
-            Attendance.date == today,
-            or_(
-                Attendance.day_shift_flag == True,
-                Attendance.night_shift_flag == True
-            )
-        )
-        .group_by(Attendance.site_id)
-        .all()
-    )
-
     attendance_map = {}
-    for row in attendance_today:
+    for site_id, row in get_day_map(today).items():
         delayed = False
         if row.last_marked:
             delayed = row.last_marked.time() > ATTENDANCE_CUTOFF
 
-        attendance_map[row.site_id] = {
+        attendance_map[site_id] = {
             "present": row.present,
             "last_time": row.last_marked,
             "delayed": delayed
@@ -184,7 +185,7 @@ def get_admin_dashboard_data():
         "total_sites": total_sites,
 
         "alerts": total_alerts,
-        "payroll_state": "Draft"
+        "payroll_state": get_payroll_state(today.strftime("%Y-%m"))
     }
 
     # =========================
@@ -0,0 +1,147 @@
+# services/document_store.py
+#
+# Content-addressed storage for labour documents (photos, Aadhaar and gate
+# pass scans). Documents are written by services/image_worker.py under the
+# sha256 of their bytes, so a stored file never changes: the key doubles as
+# the ETag and responses can be cached by the browser as immutable - a
+# repeat roster view costs no image requests at all. Replacing a document
+# stores a new key; files no longer referenced by any labour are removed by
+# `flask prune-documents`.
+#
+# The store lives outside static/ so every request goes through login; with
+# DOCUMENT_ACCEL_PREFIX (nginx X-Accel-Redirect) or USE_X_SENDFILE the file
+# itself is sent by the front-end server.
+
+import os
+import re
+import time
+
+from flask import current_app, url_for
+from PIL import features
+
+from models import db, Labour
+from services.image_worker import (
+    MAX_WIDTH,
+    RENDITION_SIZES,
+    rendition_path,
+    manifest_path,
+    document_file
+)
+
+
+DOCUMENT_FIELDS = (
+    'photo_path',
+    'aadhaar_front_path',
+    'aadhaar_back_path',
+    'gate_pass_front_path',
+    'gate_pass_back_path',
+)
+
+_KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# "<key>.jpg" or "<key>.<size>.<jpg|webp>"
+_NAME_RE = re.compile(r'^([0-9a-f]{64})(?:\.(\d+))?\.(jpg|webp)$')
+
+MIMETYPES = {'jpg': 'image/jpeg', 'webp': 'image/webp'}
+
+# unreferenced files younger than this may belong to an upload whose job
+# has not set the labour column yet
+PRUNE_GRACE_SECONDS = 3600
+
+_webp = None
+
+
+def is_document_key(value):
+    return bool(value) and bool(_KEY_RE.match(value))
+
+
+def store_root():
+    path = current_app.config.get('DOCUMENT_STORE_DIR') or os.path.join(current_app.instance_path, 'documents')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _webp_supported():
+    global _webp
+    if _webp is None:
+        _webp = features.check('webp')
+    return _webp
+
+
+# =========================
+# NAMES / URLS
+# =========================
+def document_name(key, size=MAX_WIDTH, fmt='jpeg'):
+    """URL file name of a rendition: "<key>.jpg", "<key>.240.webp", ..."""
+    return os.path.basename(rendition_path(document_file(key), size, fmt))
+
+
+def parse_document_name(name):
+    """(key, mimetype) for a valid document file name, else None."""
+    match = _NAME_RE.match(name or '')
+    if not match:
+        return None
+    key, size, ext = match.groups()
+    if size is not None and int(size) not in RENDITION_SIZES:
+        return None
+    return key, MIMETYPES[ext]
+
+
+def document_disk_path(name):
+    return os.path.join(store_root(), name[:2], name)
+
+
+def document_url(key, size=MAX_WIDTH, fmt='jpeg'):
+    """URL of a stored document / rendition (no filesystem access)."""
+    if fmt == 'webp' and not _webp_supported():
+        return None
+    return url_for('documents.document', name=document_name(key, size, fmt))
+
+
+def has_manifest(key):
+    return os.path.isfile(os.path.join(store_root(), manifest_path(document_file(key))))
+
+
+# =========================
+# PRUNING
+# =========================
+def referenced_keys():
+    keys = set()
+    columns = [getattr(Labour, f) for f in DOCUMENT_FIELDS]
+    for row in db.session.query(*columns).yield_per(1000):
+        keys.update(v for v in row if is_document_key(v))
+    return keys
+
+
+def prune_documents(dry_run=False):
+    """
+    Delete stored files whose key no labour references any more.
+    Returns (keys_removed, bytes_freed).
+    """
+    root = store_root()
+    keep = referenced_keys()
+    cutoff = time.time() - PRUNE_GRACE_SECONDS
+
+    removed = freed = 0
+    for prefix in os.listdir(root):
+        folder = os.path.join(root, prefix)
+        if not os.path.isdir(folder):
+            continue
+
+        files = {}
+        for name in os.listdir(folder):
+            files.setdefault(name.split('.', 1)[0], []).append(os.path.join(folder, name))
+
+        for key, paths in files.items():
+            if key in keep or not _KEY_RE.match(key):
+                continue
+            # a dedupe hit touches the manifest, so "newest file" covers it
+            if max(os.path.getmtime(p) for p in paths) > cutoff:
+                continue
+            removed += 1
+            for path in paths:
+                freed += os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+
+    return removed, freed
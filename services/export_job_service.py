@@ -0,0 +1,381 @@
+# services/export_job_service.py
+#
+# Background report exports. A job row stores the normalised parameters and,
+# once done, the artifact path; the work runs in a small per-process thread
+# pool so the request worker returns immediately. Exports of closed payroll
+# months are immutable, so a finished artifact is reused for identical
+# requests (the cache key includes the close timestamp, so reopen + re-close
+# produces a fresh file).
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from models import db, ExportJob, PayrollRun, Site, Attendance
+from services.payroll_service import get_site_payroll, get_payroll_run
+from services.payroll_bulk_service import load_all_sites_payroll, all_sites_sheets
+from services.xlsx_export_service import (
+    write_workbook,
+    XLSX_MIMETYPE,
+    MONTHLY_PAYROLL_COLUMNS,
+    SALARY_SHEET_COLUMNS
+)
+from services.attendance_export_service import build_export_query, iter_attendance_csv
+
+
+CSV_MIMETYPE = 'text/csv'
+
+# seconds between progress writes to the job row
+PROGRESS_INTERVAL = 1.0
+
+# queued/running jobs older than this are treated as lost (worker restarted)
+STALE_AFTER = timedelta(minutes=30)
+
+_MONTH_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('EXPORT_WORKERS', 2),
+                thread_name_prefix='export'
+            )
+        return _executor
+
+
+def _export_dir():
+    path = current_app.config.get('EXPORT_DIR') or os.path.join(current_app.instance_path, 'exports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# =========================
+# PARAMETERS
+# =========================
+def _month(value):
+    if not value or not _MONTH_RE.match(value):
+        raise ValueError('A valid month (YYYY-MM) is required.')
+    return value
+
+
+def _site(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError('A site is required.')
+
+
+def _iso_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}')
+
+
+def _normalise(kind, raw):
+    """Whitelist + validate the parameters of each export kind."""
+    if kind in ('monthly_report', 'salary_sheet'):
+        return {'site_id': _site(raw.get('site_id')), 'month': _month(raw.get('month'))}
+
+    if kind == 'all_sites':
+        return {'month': _month(raw.get('month'))}
+
+    if kind == 'attendance_csv':
+        return {
+            'site_id': int(raw['site_id']) if str(raw.get('site_id') or '').isdigit() else None,
+            'start_date': _iso_date(raw.get('start_date')),
+            'end_date': _iso_date(raw.get('end_date')),
+            'day_shift': raw.get('day_shift') or None,
+            'ot': raw.get('ot') or None
+        }
+
+    raise ValueError(f'Unknown export type: {kind}')
+
+
+def _months_between(start, end):
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        yield f'{y:04d}-{m:02d}'
+        y, m = y + (m == 12), (m % 12) + 1
+
+
+def _closed_version(kind, params):
+    """
+    A string identifying the frozen data behind the export, or None when
+    the data can still change (export must not be cached).
+    """
+    if kind in ('monthly_report', 'salary_sheet'):
+        run = get_payroll_run(params['site_id'], params['month'])
+        return run.closed_at.isoformat() if run and run.closed_at else None
+
+    if kind == 'all_sites':
+        active = Site.query.filter_by(is_active=True).count()
+        closed, last_closed = db.session.query(
+            func.count(PayrollRun.id), func.max(PayrollRun.closed_at)
+        ).filter(PayrollRun.month == params['month']).one()
+        if not active or closed < active or not last_closed:
+            return None
+        return f'{closed}:{last_closed.isoformat()}'
+
+    if kind == 'attendance_csv':
+        if not (params['site_id'] and params['start_date'] and params['end_date']):
+            return None
+        start = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+        end = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
+        months = list(_months_between(start, end))
+        runs = PayrollRun.query.filter(
+            PayrollRun.site_id == params['site_id'],
+            PayrollRun.month.in_(months)
+        ).all()
+        if len(runs) != len(months):
+            return None
+        return max(r.closed_at for r in runs).isoformat()
+
+    return None
+
+
+def _hash(kind, params, version):
+    payload = json.dumps([kind, params, version], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# =========================
+# SUBMIT / LOOKUP
+# =========================
+def submit_export(kind, raw_params, user=None):
+    """
+    Return an ExportJob for the request: a finished cached artifact, an
+    identical job already in flight, or a newly queued job.
+    Raises ValueError for bad parameters.
+    """
+    params = _normalise(kind, raw_params)
+    version = _closed_version(kind, params)
+    params_hash = _hash(kind, params, version)
+
+    if version:
+        cached = (
+            ExportJob.query
+            .filter_by(params_hash=params_hash, status='done')
+            .order_by(ExportJob.id.desc())
+            .first()
+        )
+        if cached and cached.artifact_path and os.path.exists(cached.artifact_path):
+            return cached
+
+    in_flight = (
+        ExportJob.query
+        .filter(
+            ExportJob.params_hash == params_hash,
+            ExportJob.status.in_(('queued', 'running')),
+            ExportJob.created_at >= datetime.utcnow() - STALE_AFTER
+        )
+        .order_by(ExportJob.id.desc())
+        .first()
+    )
+    if in_flight:
+        return in_flight
+
+    job = ExportJob(
+        kind=kind,
+        params=json.dumps(params, sort_keys=True),
+        params_hash=params_hash,
+        status='queued',
+        cacheable=bool(version),
+        created_by_id=user.id if user else None,
+        created_at=datetime.utcnow()
+    )
+    try:
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_job, app, job.id)
+    return job
+
+
+def get_export_job(job_id):
+    return ExportJob.query.get(job_id)
+
+
+def job_to_dict(job, download_url=None):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_written': job.rows_written,
+        'cached': job.cacheable and job.status == 'done',
+        'error': job.error,
+        'filename': job.filename,
+        'download_url': download_url if job.status == 'done' else None
+    }
+
+
+# =========================
+# WORKER
+# =========================
+class _Progress:
+    """Counts rows and writes progress to the job row at most once a second.
+
+    Uses its own short connection so it never interleaves with a streaming
+    cursor held by the export's session.
+    """
+
+    def __init__(self, job_id, total):
+        self.job_id = job_id
+        self.total = max(int(total or 0), 1)
+        self.done = 0
+        self._last = 0.0
+
+    def __call__(self, n):
+        self.done += n
+        now = time.monotonic()
+        if now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self.flush(min(99, self.done * 100 // self.total))
+
+    def flush(self, percent):
+        table = ExportJob.__table__
+        with db.engine.begin() as conn:
+            conn.execute(
+                table.update()
+                .where(table.c.id == self.job_id)
+                .values(progress=percent, rows_written=self.done)
+            )
+
+
+def _write_monthly_report(params, path, progress):
+    rows, _ = get_site_payroll(params['site_id'], params['month'])
+    progress.total = max(len(rows), 1)
+    write_workbook(path, [('Monthly Payroll', MONTHLY_PAYROLL_COLUMNS, rows)], progress=progress)
+    return f"Monthly_Payroll_Report_{params['month']}.xlsx"
+
+
+def _write_salary_sheet(params, path, progress):
+    rows, _ = get_site_payroll(params['site_id'], params['month'])
+    progress.total = max(len(rows), 1)
+    write_workbook(path, [('Salary Sheet', SALARY_SHEET_COLUMNS, rows)], progress=progress)
+    return f"Labour_Salary_Sheet_{params['month']}.xlsx"
+
+
+def _write_all_sites(params, path, progress):
+    df = load_all_sites_payroll(params['month'])
+    progress.total = max(len(df) * 2, 1)   # consolidated + per-site sheets
+    write_workbook(path, all_sites_sheets(df), progress=progress)
+    return f"All_Sites_Payroll_{params['month']}.xlsx"
+
+
+def _write_attendance_csv(params, path, progress):
+    def to_date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+    query = build_export_query(
+        site_id=params['site_id'],
+        start_date=to_date(params['start_date']),
+        end_date=to_date(params['end_date']),
+        day_shift=params['day_shift'],
+        ot=params['ot']
+    )
+    progress.total = query.order_by(None).with_entities(func.count(Attendance.id)).scalar() or 1
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in iter_attendance_csv(query):
+            f.write(chunk)
+            progress(chunk.count('\n'))
+
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    return f'attendance_{stamp}.csv'
+
+
+WRITERS = {
+    'monthly_report': (_write_monthly_report, 'xlsx', XLSX_MIMETYPE),
+    'salary_sheet': (_write_salary_sheet, 'xlsx', XLSX_MIMETYPE),
+    'all_sites': (_write_all_sites, 'xlsx', XLSX_MIMETYPE),
+    'attendance_csv': (_write_attendance_csv, 'csv', CSV_MIMETYPE),
+}
+
+
+def _run_job(app, job_id):
+    with app.app_context():
+        job = ExportJob.query.get(job_id)
+        if not job or job.status != 'queued':
+            return
+
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        writer, ext, mimetype = WRITERS[job.kind]
+        final_path = os.path.join(_export_dir(), f'{job.id}_{job.params_hash[:12]}.{ext}')
+        tmp_path = final_path + '.part'
+        progress = _Progress(job.id, 0)
+
+        try:
+            filename = writer(json.loads(job.params), tmp_path, progress)
+            os.replace(tmp_path, final_path)
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            app.logger.exception('Export job %s failed', job_id)
+
+            job = ExportJob.query.get(job_id)
+            job.status = 'failed'
+            job.error = str(e)[:1000]
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        job = ExportJob.query.get(job_id)
+        job.status = 'done'
+        job.progress = 100
+        job.rows_written = progress.done
+        job.artifact_path = final_path
+        job.filename = filename
+        job.mimetype = mimetype
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+# =========================
+# HOUSEKEEPING
+# =========================
+def prune_export_jobs(days=7):
+    """
+    Delete jobs (and their files) older than `days`. Cached closed-month
+    artifacts are kept unless they are older than 10x the window.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    cached_cutoff = now - timedelta(days=days * 10)
+
+    old = ExportJob.query.filter(
+        ExportJob.created_at < cutoff,
+        db.or_(ExportJob.cacheable == False, ExportJob.created_at < cached_cutoff)
+    ).all()
+
+    for job in old:
+        if job.artifact_path and os.path.exists(job.artifact_path):
+            os.remove(job.artifact_path)
+        db.session.delete(job)
+
+    db.session.commit()
+    return len(old)
@@ -0,0 +1,269 @@
+# services/image_queue_service.py
+#
+# Labour document uploads processed outside the request. The request only
+# validates the upload (size + header sniff), writes the raw bytes to the
+# staging directory and submits the decode/resize/encode work to a small
+# process pool; when a job finishes its Labour.*_path column is set to the
+# document's content key (services/document_store.py).
+# Decoding a phone photo and writing six renditions is CPU-bound, so worker
+# processes (not threads) keep it off the request workers and the GIL.
+#
+# The pool is bounded: with IMAGE_QUEUE_MAX jobs in flight a new upload is
+# processed inline, so a burst of uploads slows those requests down instead
+# of queueing unbounded work. Staged files are named
+# "<labour_id>-<field>-<uuid>.upload" so `flask process-staged-images` can
+# finish jobs lost to a restart. Back-fill / re-encode jobs share the pool.
+
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from flask import current_app
+
+from models import db, Labour
+from services.image_service import check_upload, store_upload
+from services.image_worker import render_document, store_document, document_file
+from services.document_store import DOCUMENT_FIELDS, is_document_key, has_manifest, store_root
+
+
+# Labour column -> form field
+FORM_FIELDS = {
+    'photo_path': 'photo',
+    'aadhaar_front_path': 'aadhaar_front',
+    'aadhaar_back_path': 'aadhaar_back',
+    'gate_pass_front_path': 'gate_pass_front',
+    'gate_pass_back_path': 'gate_pass_back',
+}
+
+STAGED_SUFFIX = '.upload'
+
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Per-process pool; recreated after a fork (gunicorn --preload)."""
+    global _executor, _executor_pid, _slots
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # spawn: never fork a process holding DB connections / threads
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config.get('IMAGE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _executor_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(current_app.config.get('IMAGE_QUEUE_MAX', 32))
+        return _executor
+
+
+def shutdown_pool(wait=True):
+    """Wait for queued jobs (and their completion updates) and stop the pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def _staging_dir():
+    path = current_app.config.get('UPLOAD_STAGING_DIR') or os.path.join(current_app.instance_path, 'uploads_incoming')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# =========================
+# STAGING
+# =========================
+def stage_upload(file, labour_id, field):
+    """Validate and write the raw upload to the staging dir. Raises ValueError."""
+    check_upload(file)
+
+    src = os.path.join(_staging_dir(), f"{labour_id}-{field}-{uuid.uuid4().hex}{STAGED_SUFFIX}")
+    file.save(src)
+    return src
+
+
+def _parse_staged(name):
+    """"7-photo_path-<hex>.upload" -> (7, 'photo_path'), or None."""
+    if not name.endswith(STAGED_SUFFIX):
+        return None
+    labour_id, _, rest = name.partition('-')
+    field = rest.rsplit('-', 1)[0]
+    if not labour_id.isdigit() or field not in FORM_FIELDS:
+        return None
+    return int(labour_id), field
+
+
+# =========================
+# COMPLETION
+# =========================
+def _set_document(app, labour_id, field, key):
+    """Point the labour at the stored document (own short transaction)."""
+    table = Labour.__table__
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(
+                table.update()
+                .where(table.c.id == labour_id)
+                .values({field: key})
+            )
+
+
+def _on_done(app, labour_id, field, src):
+    def callback(future):
+        _slots.release()
+        try:
+            _set_document(app, labour_id, field, future.result())
+        except Exception:
+            app.logger.exception('Image job for labour %s (%s) failed', labour_id, field)
+            _remove(src)
+    return callback
+
+
+def _submit(app, labour_id, field, src):
+    future = _get_executor().submit(store_document, src, store_root(), True)
+    future.add_done_callback(_on_done(app, labour_id, field, src))
+
+
+# =========================
+# UPLOADS
+# =========================
+def enqueue_labour_documents(labour, files):
+    """
+    Process the document uploads in `files` (request.files) for a saved
+    labour. Every upload is validated before anything is queued, so a
+    ValueError leaves the labour untouched. Queued documents appear once
+    their job finishes; when the pool is full they are processed inline
+    and set on `labour` directly (caller commits). Returns the number of
+    documents queued.
+    """
+    uploads = [
+        (field, files.get(form_name))
+        for field, form_name in FORM_FIELDS.items()
+        if files.get(form_name) and files.get(form_name).filename
+    ]
+    if not uploads:
+        return 0
+
+    app = current_app._get_current_object()
+    _get_executor()
+
+    staged = []
+    try:
+        for field, file in uploads:
+            if _slots.acquire(blocking=False):
+                try:
+                    staged.append((field, stage_upload(file, labour.id, field)))
+                except Exception:
+                    _slots.release()
+                    raise
+            else:
+                setattr(labour, field, store_upload(file))
+    except Exception:
+        for _, src in staged:
+            _remove(src)
+            _slots.release()
+        raise
+
+    for field, src in staged:
+        _submit(app, labour.id, field, src)
+
+    return len(staged)
+
+
+def requeue_staged():
+    """Submit staged uploads left by a restart. Returns (queued, skipped)."""
+    app = current_app._get_current_object()
+    staging = _staging_dir()
+    _get_executor()
+
+    queued = skipped = 0
+    for name in sorted(os.listdir(staging)):
+        parsed = _parse_staged(name)
+        if not parsed or not db.session.get(Labour, parsed[0]):
+            skipped += 1
+            continue
+        _slots.acquire()
+        _submit(app, parsed[0], parsed[1], os.path.join(staging, name))
+        queued += 1
+
+    return queued, skipped
+
+
+# =========================
+# BACK-FILL / RE-ENCODE
+# =========================
+def backfill_renditions(labour_id=None, force=False, reencode=False, progress=None):
+    """
+    Bring stored documents up to date on the image pool:
+    - legacy static uploads ("uploads/labours/7/photo.jpg") are moved into
+      the document store and the column is switched to the new key;
+    - store documents missing renditions (or all, with force) get them
+      regenerated; reencode re-stores them with the current settings,
+      which produces a new key.
+    Commits the column changes. Returns (processed, missing_files).
+    """
+    static_root = current_app.static_folder
+    root = store_root()
+    columns = [getattr(Labour, f) for f in DOCUMENT_FIELDS]
+    query = db.session.query(Labour.id, *columns)
+    if labour_id:
+        query = query.filter(Labour.id == labour_id)
+    rows = query.order_by(Labour.id).all()
+
+    table = Labour.__table__
+    executor = _get_executor()
+    processed = missing = 0
+    pending = {}
+
+    def drain(limit):
+        nonlocal processed
+        while len(pending) > limit:
+            done = next(as_completed(pending))
+            row_id, field, rekey = pending.pop(done)
+            result = done.result()
+            if rekey:
+                # store_document(): the document now lives under this key
+                db.session.execute(table.update().where(table.c.id == row_id).values({field: result}))
+            processed += 1
+
+    for row in rows:
+        for field, value in zip(DOCUMENT_FIELDS, row[1:]):
+            if not value:
+                continue
+            if not is_document_key(value):
+                full, rekey = os.path.join(static_root, value), True
+            elif reencode:
+                full, rekey = os.path.join(root, document_file(value)), True
+            elif force or not has_manifest(value):
+                full, rekey = os.path.join(root, document_file(value)), False
+            else:
+                continue
+
+            if not os.path.isfile(full):
+                missing += 1
+                continue
+
+            if rekey:
+                future = executor.submit(store_document, full, root)
+            else:
+                future = executor.submit(render_document, full, root, document_file(value), True)
+            pending[future] = (row.id, field, rekey)
+            drain(current_app.config.get('IMAGE_QUEUE_MAX', 32))
+        if progress:
+            progress(row.id)
+
+    drain(0)
+    db.session.commit()
+    return processed, missing
@@ -1,18 +1,54 @@
+import json
 import os
 from PIL import Image
-from werkzeug.utils import secure_filename
-from flask import current_app
+from flask import current_app, url_for
+
+from services.image_worker import (
+    rendition_path,
+    manifest_path,
+    store_document
+)
+from services.document_store import is_document_key, document_url, store_root
 
 MAX_FILE_SIZE = 1 * 1024 * 1024  # 1 MB
-MAX_WIDTH = 1200
-JPEG_QUALITY = 85
 
 
-def save_and_compress_image(file, labour_id, filename):
-    if not file or not file.filename:
+def _static_file(path):
+    return os.path.join(current_app.static_folder, path)
+
+
+def rendition_url(path, size, fmt='jpeg'):
+    """
+    URL of a rendition for templates / APIs. `path` is a document store
+    key, or a legacy static path (falls back to the stored image when the
+    rendition has not been generated yet).
+    """
+    if not path:
+        return None
+    if is_document_key(path):
+        return document_url(path, size, fmt)
+    candidate = rendition_path(path, size, fmt)
+    if candidate != path and not os.path.isfile(_static_file(candidate)):
+        return url_for('static', filename=path) if fmt == 'jpeg' else None
+    return url_for('static', filename=candidate)
+
+
+def read_manifest(path):
+    try:
+        with open(_static_file(manifest_path(path))) as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return None
 
-    # ---- HARD SIZE CHECK ----
+
+# =========================
+# VALIDATION
+# =========================
+def check_upload(file):
+    """
+    Size limit + header sniff, cheap enough to run in the request so a bad
+    upload is still reported to the user. Raises ValueError.
+    """
     file.seek(0, os.SEEK_END)
     size = file.tell()
     file.seek(0)
@@ -20,34 +56,27 @@ def save_and_compress_image(file, labour_id, filename):
     if size > MAX_FILE_SIZE:
         raise ValueError("File size must be less than 1 MB")
 
-    # ---- Upload directory ----
-    upload_dir = os.path.join(
-        current_app.root_path,
-        'static', 'uploads', 'labours', str(labour_id)
-    )
-    os.makedirs(upload_dir, exist_ok=True)
-
-    safe_name = secure_filename(filename)
-    full_path = os.path.join(upload_dir, safe_name)
-
-    # ---- Image processing ----
-    img = Image.open(file)
-
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
-
-    if img.width > MAX_WIDTH:
-        ratio = MAX_WIDTH / img.width
-        img = img.resize(
-            (MAX_WIDTH, int(img.height * ratio)),
-            Image.LANCZOS
-        )
-
-    img.save(
-        full_path,
-        format="JPEG",
-        quality=JPEG_QUALITY,
-        optimize=True
-    )
-
-    return f"uploads/labours/{labour_id}/{safe_name}"
+    try:
+        with Image.open(file) as img:
+            img.verify()
+    except Exception:
+        raise ValueError("Uploaded file is not a valid image")
+    finally:
+        file.seek(0)
+
+
+# =========================
+# INLINE PROCESSING
+# =========================
+def store_upload(file):
+    """
+    Validate and store an upload inside the request; returns the document
+    key. Uploads normally go through services/image_queue_service.py; this
+    is its inline fallback.
+    """
+    check_upload(file)
+
+    try:
+        return store_document(file, store_root())
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError("Uploaded file is not a valid image")
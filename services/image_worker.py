@@ -0,0 +1,177 @@
+# services/image_worker.py
+#
+# Image decoding / encoding for labour documents. Pure Pillow + filesystem,
+# no Flask app or database, so it runs unchanged inside the worker processes
+# of services/image_queue_service.py as well as inline.
+
+import hashlib
+import io
+import json
+import os
+
+from PIL import Image, features
+
+
+MAX_WIDTH = 1200
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# widths generated for every document: roster avatar, cards/modals, full view
+RENDITION_SIZES = (64, 240, MAX_WIDTH)
+
+
+# =========================
+# NAMING
+# =========================
+# "uploads/labours/7/photo.jpg" is the 1200px JPEG (what Labour.*_path
+# stores); the others sit next to it:
+#   photo.64.jpg  photo.64.webp  photo.240.jpg  photo.240.webp
+#   photo.1200.webp  photo.json (manifest)
+def rendition_path(path, size, fmt='jpeg'):
+    stem, _ = os.path.splitext(path)
+    if size == MAX_WIDTH and fmt == 'jpeg':
+        return path
+    return f"{stem}.{size}.{'webp' if fmt == 'webp' else 'jpg'}"
+
+
+def manifest_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+# =========================
+# DECODE
+# =========================
+def _resize(img, width):
+    if img.width <= width:
+        return img
+    ratio = width / img.width
+    return img.resize((width, max(1, int(img.height * ratio))), Image.LANCZOS)
+
+
+def open_image(src, max_width=MAX_WIDTH):
+    """
+    Decode `src` (path or file object) as RGB, at most `max_width` wide.
+    Big JPEGs are decoded with draft(): libjpeg scales by 1/2..1/8 while
+    decoding, so a 4000px phone photo never exists in memory full size.
+    """
+    img = Image.open(src)
+
+    if img.format == 'JPEG' and img.width > max_width:
+        height = max(1, img.height * max_width // img.width)
+        img.draft('RGB', (max_width, height))
+
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    img = _resize(img, max_width)
+    img.load()
+    return img
+
+
+# =========================
+# ENCODE
+# =========================
+def write_renditions(img, static_root, path, keep_source=False):
+    """
+    Write every rendition of `img` (RGB, at most MAX_WIDTH wide) for the
+    document stored at `path` under `static_root`, plus its manifest.
+    keep_source leaves an existing `path` file as is (no re-encode).
+    Returns the manifest dict.
+    """
+    webp = features.check('webp')
+    renditions = []
+
+    os.makedirs(os.path.dirname(os.path.join(static_root, path)), exist_ok=True)
+
+    # largest first: each smaller size is resampled from the previous one
+    current = img
+    for size in sorted(RENDITION_SIZES, reverse=True):
+        current = _resize(current, size)
+
+        for fmt in (('webp', 'jpeg') if webp else ('jpeg',)):
+            rel = rendition_path(path, size, fmt)
+            full = os.path.join(static_root, rel)
+            if keep_source and rel == path and os.path.isfile(full):
+                pass
+            elif fmt == 'webp':
+                current.save(full, format="WEBP", quality=WEBP_QUALITY, method=4)
+            else:
+                current.save(full, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=size > 240)
+            renditions.append({
+                'size': size,
+                'format': fmt,
+                'path': rel,
+                'width': current.width,
+                'height': current.height,
+                'bytes': os.path.getsize(full)
+            })
+
+    manifest = {
+        'source': path,
+        'width': img.width,
+        'height': img.height,
+        'renditions': renditions
+    }
+    with open(os.path.join(static_root, manifest_path(path)), 'w') as f:
+        json.dump(manifest, f)
+
+    return manifest
+
+
+def render_document(src, static_root, path, keep_source=False, remove_src=False):
+    """
+    Pool entry point: decode `src` and write all renditions of `path`.
+    `remove_src` deletes the staged upload once the renditions exist.
+    """
+    img = open_image(src)
+    manifest = write_renditions(img, static_root, path, keep_source=keep_source)
+
+    if remove_src and os.path.abspath(src) != os.path.abspath(os.path.join(static_root, path)):
+        os.remove(src)
+
+    return manifest
+
+
+# =========================
+# CONTENT-ADDRESSED STORE
+# =========================
+# A stored document is named by the sha256 of its 1200px JPEG bytes; the
+# key is what Labour.*_path holds. Files live under the store root as
+# "ab/<key>.jpg" with renditions next to it ("ab/<key>.240.webp", ...).
+# Identical uploads map to the same key and are written once. The
+# manifest is written last and marks a complete document.
+def document_file(key):
+    return f"{key[:2]}/{key}.jpg"
+
+
+def store_document(src, store_root, remove_src=False):
+    """
+    Pool entry point: decode `src`, encode it once and store it under its
+    content hash (skipped when already stored). Returns the key.
+    """
+    img = open_image(src)
+
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    data = buf.getvalue()
+
+    key = hashlib.sha256(data).hexdigest()
+    path = document_file(key)
+    full = os.path.join(store_root, path)
+
+    manifest = os.path.join(store_root, manifest_path(path))
+    if os.path.isfile(manifest):
+        # already stored: refresh mtime so pruning leaves it alone
+        os.utime(manifest)
+    else:
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.{os.getpid()}.part"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, full)
+        write_renditions(img, store_root, path, keep_source=True)
+
+    if remove_src and isinstance(src, str):
+        os.remove(src)
+
+    return key
@@ -0,0 +1,275 @@
+# services/labour_import_service.py
+#
+# Bulk onboarding of labours from a CSV / XLSX sheet. Rows are read one at a
+# time, validated with the same rules as the labour edit forms, checked for
+# phone+site conflicts with a single lookup and inserted in multi-row
+# INSERT statements inside one transaction.
+
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from models import db, Site, Labour
+from services.cache_service import bump_data_version
+from services.labour_search_service import index_labours_by_phone
+
+
+PHONE_RE = re.compile(r"\d{10}")
+BANK_RE = re.compile(r"\d+")
+
+MAX_IMPORT_ROWS = 5000
+INSERT_BATCH_SIZE = 200
+
+# header (lower-case, spaces → _) → Labour field
+HEADER_ALIASES = {
+    'name': 'name',
+    'labour_name': 'name',
+    'phone': 'phone',
+    'mobile': 'phone',
+    'gate_pass_id': 'gate_pass_id',
+    'gate_pass': 'gate_pass_id',
+    'bank_account': 'bank_account',
+    'account_number': 'bank_account',
+    'ifsc_code': 'ifsc_code',
+    'ifsc': 'ifsc_code',
+    'daily_wage': 'daily_wage',
+    'wage': 'daily_wage',
+    'site_id': 'site_id',
+    'site': 'site',
+    'site_name': 'site',
+    'is_active': 'is_active',
+    'active': 'is_active',
+}
+
+_FALSE = {'0', 'no', 'n', 'false', 'inactive'}
+
+
+# =========================
+# PARSING (STREAMING)
+# =========================
+def _text(value):
+    """Cell → stripped string ('9876543210.0' from Excel → '9876543210')."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _header_map(headers):
+    return [
+        HEADER_ALIASES.get(_text(h).lower().replace(' ', '_').replace('.', ''))
+        for h in headers
+    ]
+
+
+def _iter_csv(stream):
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    yield from reader
+
+
+def _iter_xlsx(stream):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_sheet_rows(file_storage):
+    """
+    Yield (row_number, {field: text}) for every non-empty data row of an
+    uploaded .csv / .xlsx. Row numbers match the spreadsheet (header = 1).
+    """
+    filename = (file_storage.filename or '').lower()
+    if filename.endswith('.xlsx'):
+        rows = _iter_xlsx(file_storage.stream)
+    elif filename.endswith('.csv'):
+        rows = _iter_csv(file_storage.stream)
+    else:
+        raise ValueError('Upload a .csv or .xlsx file.')
+
+    fields = None
+    for number, row in enumerate(rows, start=1):
+        if fields is None:
+            fields = _header_map(row)
+            if 'name' not in fields or 'phone' not in fields:
+                raise ValueError('The sheet needs at least "name" and "phone" columns.')
+            continue
+
+        values = {
+            field: _text(cell)
+            for field, cell in zip(fields, row)
+            if field
+        }
+        if any(values.values()):
+            yield number, values
+
+
+# =========================
+# VALIDATION
+# =========================
+def _validate(values, sites_by_id, sites_by_name, default_site_id):
+    """(clean row dict, [errors]) using the labour edit form rules."""
+    errors = []
+
+    name = values.get('name', '')
+    phone = values.get('phone', '')
+    bank_account = values.get('bank_account', '')
+
+    if not name:
+        errors.append('Name is required.')
+
+    if not phone:
+        errors.append('Phone is required.')
+    elif not PHONE_RE.fullmatch(phone):
+        errors.append('Phone number must be exactly 10 digits.')
+
+    if bank_account and not BANK_RE.fullmatch(bank_account):
+        errors.append('Bank account must contain digits only.')
+
+    site_id = None
+    if values.get('site_id'):
+        site_id = int(values['site_id']) if values['site_id'].isdigit() else None
+        if site_id not in sites_by_id:
+            errors.append(f"Unknown site id '{values['site_id']}'.")
+            site_id = None
+    elif values.get('site'):
+        site_id = sites_by_name.get(values['site'].lower())
+        if not site_id:
+            errors.append(f"Unknown site '{values['site']}'.")
+    elif default_site_id:
+        site_id = default_site_id
+    else:
+        errors.append('Site is required.')
+
+    daily_wage = None
+    if values.get('daily_wage'):
+        try:
+            daily_wage = Decimal(values['daily_wage'])
+            if daily_wage < 0:
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append('Daily wage must be a positive number.')
+            daily_wage = None
+
+    row = {
+        'name': name,
+        'phone': phone,
+        'gate_pass_id': values.get('gate_pass_id') or None,
+        'bank_account': bank_account or None,
+        'ifsc_code': values.get('ifsc_code', '').upper() or None,
+        'daily_wage': daily_wage,
+        'site_id': site_id,
+        'is_active': values.get('is_active', '').lower() not in _FALSE
+    }
+    return row, errors
+
+
+def _existing_pairs(pairs):
+    """(phone, site_id) pairs already in labours — one query for the batch."""
+    if not pairs:
+        return set()
+
+    phones = {p for p, _ in pairs}
+    site_ids = {s for _, s in pairs}
+    found = db.session.query(Labour.phone, Labour.site_id).filter(
+        Labour.phone.in_(phones),
+        Labour.site_id.in_(site_ids)
+    ).all()
+    return {(p, s) for p, s in found} & pairs
+
+
+# =========================
+# IMPORT
+# =========================
+def import_labours(file_storage, default_site_id=None, dry_run=False):
+    """
+    Validate and insert every row of the sheet. Valid rows are inserted
+    even if others fail; the report lists each rejected row.
+
+    Returns {'total', 'valid', 'inserted', 'dry_run', 'site_ids', 'errors': [
+        {'row', 'name', 'phone', 'errors': [...]}
+    ]}. Raises ValueError if the file itself cannot be read.
+    """
+    sites = Site.query.with_entities(Site.id, Site.site_name).all()
+    sites_by_id = {s.id for s in sites}
+    sites_by_name = {(s.site_name or '').strip().lower(): s.id for s in sites}
+
+    errors = []
+    valid = []          # (row_number, row)
+    seen = {}           # (phone, site_id) → first row number in the sheet
+    total = 0
+
+    for number, values in iter_sheet_rows(file_storage):
+        total += 1
+        if total > MAX_IMPORT_ROWS:
+            raise ValueError(f'A sheet can have at most {MAX_IMPORT_ROWS} rows.')
+
+        row, row_errors = _validate(values, sites_by_id, sites_by_name, default_site_id)
+
+        key = (row['phone'], row['site_id'])
+        if not row_errors:
+            if key in seen:
+                row_errors.append(f'Duplicate of row {seen[key]} (same phone & site).')
+            else:
+                seen[key] = number
+
+        if row_errors:
+            errors.append({
+                'row': number,
+                'name': row['name'],
+                'phone': row['phone'],
+                'errors': row_errors
+            })
+        else:
+            valid.append((number, row))
+
+    # ---- conflicts with uq_labour_phone_site (one lookup) ----
+    conflicts = _existing_pairs(set(seen))
+    if conflicts:
+        kept = []
+        for number, row in valid:
+            if (row['phone'], row['site_id']) in conflicts:
+                errors.append({
+                    'row': number,
+                    'name': row['name'],
+                    'phone': row['phone'],
+                    'errors': ['Labour with this phone number already exists for this site.']
+                })
+            else:
+                kept.append((number, row))
+        valid = kept
+
+    errors.sort(key=lambda e: e['row'])
+
+    report = {
+        'total': total,
+        'valid': len(valid),
+        'inserted': 0,
+        'dry_run': dry_run,
+        'site_ids': sorted({row['site_id'] for _, row in valid}),
+        'errors': errors
+    }
+
+    if dry_run or not valid:
+        return report
+
+    # ---- batched multi-row INSERTs, one transaction ----
+    table = Labour.__table__
+    rows = [row for _, row in valid]
+    try:
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            db.session.execute(table.insert().values(rows[i:i + INSERT_BATCH_SIZE]))
+        index_labours_by_phone((row['phone'], row['site_id']) for row in rows)
+        bump_data_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report['inserted'] = len(rows)
+    return report
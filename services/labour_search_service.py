@@ -0,0 +1,265 @@
+# services/labour_search_service.py
+#
+# Labour search backed by labour_search_tokens instead of ilike('%term%')
+# over the labours table. Each name word, phone, gate pass and bank account
+# is normalised (lowercase, letters/digits only) and stored with all of its
+# suffixes of MIN_SUFFIX+ chars, so a prefix match on token - an index range
+# scan on (site_id, token) - finds the term anywhere inside the value.
+#
+# The prefix match is written as "token >= 'term' AND token < 'term\uffff'"
+# rather than LIKE 'term%': SQLite's LIKE is case-insensitive and so cannot
+# use the (case-sensitive) index, while the range is indexable everywhere.
+# Tokens are lowercase already, so nothing is lost.
+#
+# Writers call index_labours() / remove_labours() in the same transaction
+# as the labour change; `flask rebuild-labour-search` back-fills everything.
+
+import re
+
+from sqlalchemy import and_, func, select, text
+
+from models import db, Labour, LabourSearchToken
+
+
+MIN_SUFFIX = 3
+MIN_TERM = 2
+MAX_TERMS = 4
+TYPEAHEAD_LIMIT = 10
+MAX_TYPEAHEAD_LIMIT = 50
+
+INSERT_BATCH_SIZE = 1000
+ID_BATCH_SIZE = 500
+
+_WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+_NON_ALNUM_RE = re.compile(r'[\W_]+', re.UNICODE)
+_NON_DIGIT_RE = re.compile(r'\D+')
+
+
+# =========================
+# TOKENISING
+# =========================
+def _suffixes(value):
+    """(suffix, position) for value and each inner suffix of MIN_SUFFIX+ chars."""
+    value = value[:64]
+    yield value, 0
+    for i in range(1, len(value) - MIN_SUFFIX + 1):
+        yield value[i:], i
+
+
+def labour_tokens(labour):
+    """{token: position} for one labour (lowest position wins)."""
+    values = []
+
+    values += _WORD_RE.findall((labour.name or '').lower())
+    values.append(_NON_DIGIT_RE.sub('', labour.phone or ''))
+    values.append(_NON_ALNUM_RE.sub('', (labour.gate_pass_id or '').lower()))
+    values.append(_NON_DIGIT_RE.sub('', labour.bank_account or ''))
+
+    tokens = {}
+    for value in values:
+        if not value:
+            continue
+        for token, pos in _suffixes(value):
+            if token not in tokens or pos < tokens[token]:
+                tokens[token] = pos
+
+    # IFSC codes are shared per branch: whole-code match only
+    ifsc = _NON_ALNUM_RE.sub('', (labour.ifsc_code or '').lower())
+    if ifsc:
+        tokens.setdefault(ifsc[:64], 0)
+
+    return tokens
+
+
+def query_terms(q):
+    """Search box text → normalised terms ("GP-12 ram" → ['gp12', 'ram'])."""
+    terms = [_NON_ALNUM_RE.sub('', part.lower()) for part in (q or '').split()]
+    terms = [t[:64] for t in terms if len(t) >= MIN_TERM]
+    # longest first: it is the most selective one to drive the lookup
+    return sorted(terms, key=len, reverse=True)[:MAX_TERMS]
+
+
+# =========================
+# MAINTENANCE
+# =========================
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _token_rows(labours):
+    return [
+        {'labour_id': l.id, 'site_id': l.site_id, 'token': token, 'position': pos}
+        for l in labours
+        for token, pos in labour_tokens(l).items()
+    ]
+
+
+def _insert_tokens(rows):
+    # executemany: one prepared INSERT for the batch instead of compiling a
+    # VALUES list with thousands of parameters
+    table = LabourSearchToken.__table__
+    for batch in _chunks(rows, INSERT_BATCH_SIZE):
+        db.session.execute(table.insert(), batch)
+
+
+def remove_labours(labour_ids):
+    """Drop index rows for these labours. Does NOT commit."""
+    table = LabourSearchToken.__table__
+    for batch in _chunks(list(labour_ids), ID_BATCH_SIZE):
+        db.session.execute(table.delete().where(table.c.labour_id.in_(batch)))
+
+
+def index_labours(labours):
+    """
+    (Re)build index rows for labours (objects or rows with id, site_id and
+    the searchable columns). Flush new labours first so they have ids.
+    Does NOT commit. Returns the number of tokens written.
+    """
+    labours = list(labours)
+    if not labours:
+        return 0
+
+    remove_labours([l.id for l in labours])
+
+    rows = _token_rows(labours)
+    _insert_tokens(rows)
+    return len(rows)
+
+
+def index_labours_by_phone(pairs):
+    """Index labours identified by (phone, site_id) - used after bulk inserts."""
+    pairs = set(pairs)
+    count = 0
+    for batch in _chunks(sorted({phone for phone, _ in pairs}), ID_BATCH_SIZE):
+        found = [
+            l for l in Labour.query.filter(Labour.phone.in_(batch))
+            if (l.phone, l.site_id) in pairs
+        ]
+        count += index_labours(found)
+    return count
+
+
+def rebuild_labour_search(site_id=None, batch_size=2000):
+    """
+    Rebuild the whole index (or one site's) in id batches. Commits per batch.
+    A full rebuild loads the emptied table without its indexes and creates
+    them once at the end (searches are incomplete until it finishes anyway).
+    """
+    table = LabourSearchToken.__table__
+    columns = (
+        Labour.id, Labour.site_id, Labour.name, Labour.phone,
+        Labour.gate_pass_id, Labour.bank_account, Labour.ifsc_code
+    )
+    indexes = [] if site_id else list(table.indexes)
+
+    try:
+        if site_id:
+            db.session.execute(table.delete().where(table.c.site_id == site_id))
+        elif db.engine.dialect.name in ('mysql', 'mariadb'):
+            db.session.execute(text(f'TRUNCATE TABLE {table.name}'))
+        else:
+            db.session.execute(table.delete())
+        db.session.commit()
+
+        for index in indexes:
+            index.drop(bind=db.engine, checkfirst=True)
+
+        last_id, total = 0, 0
+        while True:
+            q = db.session.query(*columns).filter(Labour.id > last_id)
+            if site_id:
+                q = q.filter(Labour.site_id == site_id)
+            rows = q.order_by(Labour.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            # the rows were deleted above: insert only, no per-batch delete
+            _insert_tokens(_token_rows(rows))
+            db.session.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        for index in indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+    return total
+
+
+# =========================
+# QUERIES
+# =========================
+def _prefix_match(term):
+    """token starts with `term`, as an index range (see module comment)."""
+    token = LabourSearchToken.token
+    return and_(token >= term, token < term + '\uffff')
+
+
+def _term_ids(term, site_id=None):
+    stmt = select(LabourSearchToken.labour_id).where(_prefix_match(term))
+    if site_id:
+        stmt = stmt.where(LabourSearchToken.site_id == site_id)
+    return stmt
+
+
+def labour_search_filter(q, site_id=None):
+    """
+    SQL condition "labour matches every term" for Labour queries, or None
+    when the text has no usable term.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return None
+    return and_(*[Labour.id.in_(_term_ids(t, site_id)) for t in terms])
+
+
+def typeahead(q, site_id=None, limit=TYPEAHEAD_LIMIT, active_only=True):
+    """
+    Top matches for a search box, best first: matches at the start of a
+    word/number rank above inner matches, then by name.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return []
+
+    limit = max(1, min(limit or TYPEAHEAD_LIMIT, MAX_TYPEAHEAD_LIMIT))
+    T = LabourSearchToken
+    lead, rest = terms[0], terms[1:]
+
+    query = (
+        db.session.query(
+            Labour.id, Labour.name, Labour.phone, Labour.gate_pass_id, Labour.site_id,
+            func.min(T.position).label('rank')
+        )
+        .select_from(T)
+        .join(Labour, Labour.id == T.labour_id)
+        .filter(_prefix_match(lead))
+    )
+    if site_id:
+        query = query.filter(T.site_id == site_id)
+    if active_only:
+        query = query.filter(Labour.is_active == True)
+    for term in rest:
+        query = query.filter(T.labour_id.in_(_term_ids(term, site_id)))
+
+    rows = (
+        query
+        .group_by(Labour.id, Labour.name, Labour.phone, Labour.gate_pass_id, Labour.site_id)
+        .order_by(func.min(T.position), Labour.name)
+        .limit(limit)
+        .all()
+    )
+
+    return [
+        {
+            'id': r.id,
+            'name': r.name,
+            'phone': r.phone,
+            'gate_pass_id': r.gate_pass_id,
+            'site_id': r.site_id
+        }
+        for r in rows
+    ]
@@ -1,27 +1,41 @@
 # services/labour_summary_service.py
 
-from datetime import date
-from sqlalchemy import func
-from models import (
-    db,
-    Attendance,
-    Payment,
-    LabourMonthlyExpenses
-)
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 
-def build_monthly_summary(labour, month, site_id=None):
-    """
-    Builds labour monthly summary.
-    If site_id is provided → site-restricted (manager)
-    """
 
+from models import Attendance
+from services.payroll_service import get_payroll_lines_for
+from services.ledger_service import get_ledger_positions
+from services.image_service import rendition_url
+from services.image_worker import MAX_WIDTH
+
+
+MAX_BATCH_LABOURS = 500
+
+
+def parse_month(month):
+    """'YYYY-MM' → the same string; ValueError when missing or malformed."""
+    if not month:
+        raise ValueError("Month is required")
+    try:
+        datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        raise ValueError("Month must be YYYY-MM")
+    return month
+
+
+def _month_range(month):
     year, mon = map(int, month.split('-'))
     start_date = date(year, mon, 1)
     end_date = date(year + (mon == 12), (mon % 12) + 1, 1)
+    return start_date, end_date
+
 
-    # ---------- Attendance ----------
+def _attendance_by_labour(labour_ids, start_date, end_date, site_id=None):
+    """{labour_id: [Attendance rows ordered by date]} in one query."""
     attendance_query = Attendance.query.filter(
-        Attendance.labour_id == labour.id,
+        Attendance.labour_id.in_(labour_ids),
         Attendance.date >= start_date,
         Attendance.date < end_date
     )
@@ -31,8 +45,13 @@ def build_monthly_summary(labour, month, site_id=None):
             Attendance.site_id == site_id
         )
 
-    attendance_rows = attendance_query.order_by(Attendance.date).all()
+    grouped = defaultdict(list)
+    for r in attendance_query.order_by(Attendance.date).all():
+        grouped[r.labour_id].append(r)
+    return grouped
+
 
+def _live_attendance(attendance_rows):
     day_shifts = night_shifts = absent_days = 0
     calendar = []
 
@@ -55,54 +74,165 @@ def build_monthly_summary(labour, month, site_id=None):
             "status": "PRESENT" if worked else "ABSENT"
         })
 
-    total_shifts = day_shifts + night_shifts
+    return day_shifts, night_shifts, absent_days, calendar
+
+
+def _snapshot_attendance(line, start_date):
+    marks = (line.day_marks or '') if line else ''
+    calendar = [
+        {
+            "date": (start_date + timedelta(days=i)).isoformat(),
+            "status": "PRESENT" if m == 'P' else "ABSENT"
+        }
+        for i, m in enumerate(marks)
+        if m != '.'
+    ]
+    return (
+        line.day_shifts if line else 0,
+        line.night_shifts if line else 0,
+        marks.count('A'),
+        calendar
+    )
+
+
+def build_monthly_summaries(labours, month, site_id=None):
+    """
+    {labour_id: summary} for many labours with set-based queries:
+    payroll runs + lines, attendance rows and ledger rows (one each).
+    If site_id is provided → site-restricted (manager)
+    """
+    if not labours:
+        return {}
+
+    start_date, end_date = _month_range(month)
+    labour_ids = [l.id for l in labours]
 
-    # ---------- Earnings ----------
-    daily_wage = float(labour.daily_wage or 0)
-    earned_pay = daily_wage * total_shifts
+    def home_site(labour):
+        return site_id if site_id else labour.site_id
 
-    # ---------- Advances ----------
-    advance_query = db.session.query(
-        func.coalesce(func.sum(Payment.advance), 0)
-    ).filter(
-        Payment.labour_id == labour.id,
-        Payment.date < end_date
+    # ---------- Frozen payroll (closed months) ----------
+    runs, lines = get_payroll_lines_for(
+        [(l.id, home_site(l)) for l in labours], month
     )
 
-    if site_id:
-        advance_query = advance_query.filter(
-            Payment.site_id == site_id
-        )
+    # ---------- Attendance (only for labours in open months) ----------
+    live_ids = [l.id for l in labours if home_site(l) not in runs]
+    attendance = (
+        _attendance_by_labour(live_ids, start_date, end_date, site_id)
+        if live_ids else {}
+    )
+
+    # ---------- Advances + Expenses (running ledger) ----------
+    positions = get_ledger_positions(labour_ids, month, site_id=site_id)
+
+    summaries = {}
+    for labour in labours:
+        closed = home_site(labour) in runs
+        line = lines.get((labour.id, home_site(labour))) if closed else None
+
+        if closed:
+            # closed month → shifts, wage and calendar come from the snapshot
+            day_shifts, night_shifts, absent_days, calendar = _snapshot_attendance(line, start_date)
+            daily_wage = float(line.daily_wage) if line else 0.0
+        else:
+            day_shifts, night_shifts, absent_days, calendar = _live_attendance(
+                attendance.get(labour.id, [])
+            )
+            daily_wage = float(labour.daily_wage or 0)
+
+        total_shifts = day_shifts + night_shifts
+        earned_pay = daily_wage * total_shifts
+
+        position = positions[labour.id]
+
+        # advance balance carried forward to the end of this month
+        advance_paid = float(position['closing_balance'])
+
+        if closed:
+            total_expense = float(line.expenses) if line else 0
+        else:
+            total_expense = float(
+                position['expenses_by_site'].get(home_site(labour), 0)
+            )
+
+        net_payable = earned_pay - advance_paid - total_expense
+
+        summaries[labour.id] = {
+            "attendance_summary": {
+                "day_shifts": day_shifts,
+                "night_shifts": night_shifts,
+                "total_shifts": total_shifts,
+                "absent_days": absent_days
+            },
+            "payment_summary": {
+                "daily_wage": daily_wage,
+                "earned_pay": earned_pay,
+                "advance_opening": float(position['opening_balance']),
+                "advance_month": float(position['advances']),
+                "advance_paid": advance_paid,
+                "mess_canteen": total_expense,
+                "net_payable": net_payable
+            },
+            "calendar": calendar
+        }
+
+    return summaries
 
-    advance_paid = advance_query.scalar() or 0
 
-    # ---------- Monthly Expenses ----------
-    expense = LabourMonthlyExpenses.query.filter_by(
-        labour_id=labour.id,
-        site_id=site_id if site_id else labour.site_id,
-        month=month
-    ).first()
+def build_monthly_summary(labour, month, site_id=None):
+    """
+    Builds labour monthly summary.
+    If site_id is provided → site-restricted (manager)
+    """
+    return build_monthly_summaries([labour], month, site_id=site_id)[labour.id]
 
-    mess = float(expense.mess_amount) if expense else 0
-    canteen = float(expense.canteen_amount) if expense else 0
-    total_expense = mess + canteen
 
-    # ---------- Net Payable ----------
-    net_payable = earned_pay - advance_paid - total_expense
+def serialize_labour(labour):
+    """Labour header block shared by the single and batch summary APIs."""
+    def file_url(path):
+        return rendition_url(path, MAX_WIDTH)
+
+    return {
+        "id": labour.id,
+        "name": labour.name,
+        "phone": labour.phone,
+        "site": labour.site.site_name if labour.site else "-",
+        "gate_pass_id": labour.gate_pass_id,
+        "photo_url": rendition_url(labour.photo_path, 240),
+        "photo_webp_url": rendition_url(labour.photo_path, 240, 'webp'),
+        "photo_full_url": file_url(labour.photo_path),
+        "aadhaar_front_url": file_url(labour.aadhaar_front_path),
+        "aadhaar_back_url": file_url(labour.aadhaar_back_path),
+        "gate_pass_front_url": file_url(labour.gate_pass_front_path),
+        "gate_pass_back_url": file_url(labour.gate_pass_back_path)
+    }
+
+
+def parse_labour_ids(raw):
+    """'1,2,3' → [1, 2, 3] (invalid entries and duplicates dropped)."""
+    ids = []
+    for part in (raw or '').split(','):
+        part = part.strip()
+        if part.isdigit():
+            ids.append(int(part))
+    return list(dict.fromkeys(ids))
+
+
+def batch_summaries_payload(query, month, site_id=None):
+    """
+    JSON body for the batch endpoints. At most MAX_BATCH_LABOURS labours are
+    summarised; `total` / `truncated` tell the caller when rows were left out.
+    """
+    total = query.order_by(None).count()
+    labours = query.limit(MAX_BATCH_LABOURS).all()
+    summaries = build_monthly_summaries(labours, month, site_id=site_id)
 
     return {
-        "attendance_summary": {
-            "day_shifts": day_shifts,
-            "night_shifts": night_shifts,
-            "total_shifts": total_shifts,
-            "absent_days": absent_days
-        },
-        "payment_summary": {
-            "daily_wage": daily_wage,
-            "earned_pay": earned_pay,
-            "advance_paid": advance_paid,
-            "mess_canteen": total_expense,
-            "net_payable": net_payable
-        },
-        "calendar": calendar
+        "month": month,
+        "total": total,
+        "truncated": total > len(labours),
+        "summaries": {
+            str(l.id): {"labour": serialize_labour(l), **summaries[l.id]}
+            for l in labours
+        }
     }
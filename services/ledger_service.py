@@ -0,0 +1,306 @@
+# services/ledger_service.py
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import func, case, extract
+
+from models import db, Attendance, Payment, LabourMonthlyExpenses, LabourLedgerMonth
+from services.upsert_service import insert_ignore
+
+
+def _dec(val):
+    try:
+        return Decimal(str(val)) if val is not None else Decimal('0.00')
+    except Exception:
+        return Decimal('0.00')
+
+
+def month_key(value):
+    """date / datetime / 'YYYY-MM-DD' / 'YYYY-MM' → 'YYYY-MM'."""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m')
+    return str(value)[:7]
+
+
+# =========================
+# WRITE PATH (INCREMENTAL)
+# =========================
+def _ensure_rows(labour_ids, site_id, month):
+    """
+    Create missing labour-month rows, opening at each previous close.
+    Rows another transaction creates meanwhile are left as they are.
+    """
+    L = LabourLedgerMonth
+
+    existing = {
+        lid for (lid,) in db.session.query(L.labour_id).filter(
+            L.labour_id.in_(labour_ids), L.site_id == site_id, L.month == month
+        )
+    }
+    missing = [lid for lid in labour_ids if lid not in existing]
+    if not missing:
+        return
+
+    # opens at the previous month's close (carry-forward)
+    prev = (
+        db.session.query(L.labour_id, func.max(L.month).label('month'))
+        .filter(L.labour_id.in_(missing), L.site_id == site_id, L.month < month)
+        .group_by(L.labour_id)
+        .subquery()
+    )
+    prev_closing = dict(
+        db.session.query(L.labour_id, L.closing_balance)
+        .join(prev, (L.labour_id == prev.c.labour_id) & (L.month == prev.c.month))
+        .filter(L.site_id == site_id)
+        .all()
+    )
+
+    now = datetime.utcnow()
+    insert_ignore(L.__table__, [
+        {
+            'labour_id': lid,
+            'site_id': site_id,
+            'month': month,
+            'opening_balance': _dec(prev_closing.get(lid)),
+            'day_shifts': 0,
+            'night_shifts': 0,
+            'advances': Decimal('0.00'),
+            'expenses': Decimal('0.00'),
+            'closing_balance': _dec(prev_closing.get(lid)),
+            'updated_at': now
+        }
+        for lid in missing
+    ], index_elements=['labour_id', 'site_id', 'month'])
+
+
+def _ensure_row(labour_id, site_id, month):
+    _ensure_rows([labour_id], site_id, month)
+
+
+def apply_ledger_delta(labour_id, site_id, month,
+                       day_shifts=0, night_shifts=0, advances=0, expenses=0):
+    """
+    Move one labour-month by the given deltas (negative to undo).
+    Advance deltas are carried into every later month of the same
+    labour/site. Does NOT commit — runs in the caller's transaction.
+    """
+    advances = _dec(advances)
+    expenses = _dec(expenses)
+
+    if not (day_shifts or night_shifts or advances or expenses):
+        return
+    if not (labour_id and site_id and month):
+        return
+
+    month = month_key(month)
+    _ensure_row(labour_id, site_id, month)
+
+    L = LabourLedgerMonth
+    L.query.filter_by(
+        labour_id=labour_id, site_id=site_id, month=month
+    ).update({
+        L.day_shifts: L.day_shifts + day_shifts,
+        L.night_shifts: L.night_shifts + night_shifts,
+        L.advances: L.advances + advances,
+        L.expenses: L.expenses + expenses,
+        L.closing_balance: L.closing_balance + advances,
+        L.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+
+    if advances:
+        L.query.filter(
+            L.labour_id == labour_id,
+            L.site_id == site_id,
+            L.month > month
+        ).update({
+            L.opening_balance: L.opening_balance + advances,
+            L.closing_balance: L.closing_balance + advances,
+            L.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+
+
+def apply_ledger_shift_deltas(site_id, month, deltas):
+    """
+    Batch form of apply_ledger_delta for shift counts only:
+    deltas = {labour_id: (day_delta, night_delta)} for one site-month.
+    A fixed number of statements however many labours. Does NOT commit.
+    """
+    deltas = {lid: d for lid, d in deltas.items() if d[0] or d[1]}
+    if not (deltas and site_id and month):
+        return
+
+    month = month_key(month)
+    labour_ids = list(deltas)
+    _ensure_rows(labour_ids, site_id, month)
+
+    L = LabourLedgerMonth
+    day = case({lid: d[0] for lid, d in deltas.items()}, value=L.labour_id, else_=0)
+    night = case({lid: d[1] for lid, d in deltas.items()}, value=L.labour_id, else_=0)
+
+    L.query.filter(
+        L.labour_id.in_(labour_ids), L.site_id == site_id, L.month == month
+    ).update({
+        L.day_shifts: L.day_shifts + day,
+        L.night_shifts: L.night_shifts + night,
+        L.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+
+
+# =========================
+# READ PATH
+# =========================
+def _empty_position():
+    return {
+        'opening_balance': Decimal('0.00'),
+        'advances': Decimal('0.00'),
+        'closing_balance': Decimal('0.00'),
+        'expenses_by_site': {}
+    }
+
+
+def get_ledger_positions(labour_ids, month, site_id=None):
+    """
+    {labour_id: position} — advance balance and expenses for many
+    labour-months, from the latest ledger row per (labour, site) at or
+    before `month`. One query regardless of how many labours.
+    """
+    L = LabourLedgerMonth
+    positions = {lid: _empty_position() for lid in labour_ids}
+    if not labour_ids:
+        return positions
+
+    latest = (
+        db.session.query(L.labour_id, L.site_id, func.max(L.month).label('month'))
+        .filter(L.labour_id.in_(labour_ids), L.month <= month)
+    )
+    if site_id:
+        latest = latest.filter(L.site_id == site_id)
+    latest = latest.group_by(L.labour_id, L.site_id).subquery()
+
+    rows = (
+        L.query
+        .join(
+            latest,
+            (L.labour_id == latest.c.labour_id) &
+            (L.site_id == latest.c.site_id) &
+            (L.month == latest.c.month)
+        )
+        .all()
+    )
+
+    for r in rows:
+        position = positions[r.labour_id]
+        in_month = r.month == month
+        position['opening_balance'] += _dec(r.opening_balance if in_month else r.closing_balance)
+        position['advances'] += _dec(r.advances) if in_month else Decimal('0.00')
+        position['closing_balance'] += _dec(r.closing_balance)
+        position['expenses_by_site'][r.site_id] = _dec(r.expenses) if in_month else Decimal('0.00')
+
+    return positions
+
+
+def get_ledger_position(labour_id, month, site_id=None):
+    return get_ledger_positions([labour_id], month, site_id=site_id)[labour_id]
+
+
+# =========================
+# BACK-FILL
+# =========================
+def _ym(year, month):
+    return f"{int(year):04d}-{int(month):02d}"
+
+
+def rebuild_labour_ledger(labour_id=None, batch_size=1000):
+    """Recompute the whole ledger (or one labour's) from raw tables."""
+    LabourLedgerMonth.__table__.create(bind=db.engine, checkfirst=True)
+
+    buckets = defaultdict(lambda: defaultdict(lambda: {
+        'day_shifts': 0, 'night_shifts': 0,
+        'advances': Decimal('0.00'), 'expenses': Decimal('0.00')
+    }))
+
+    # ---------- shifts ----------
+    att_y = extract('year', Attendance.date)
+    att_m = extract('month', Attendance.date)
+    att_q = db.session.query(
+        Attendance.labour_id, Attendance.site_id, att_y, att_m,
+        func.sum(case((Attendance.day_shift_flag == True, 1), else_=0)),
+        func.sum(case((Attendance.night_shift_flag == True, 1), else_=0))
+    )
+    if labour_id:
+        att_q = att_q.filter(Attendance.labour_id == labour_id)
+    for lid, sid, y, m, day, night in att_q.group_by(
+        Attendance.labour_id, Attendance.site_id, att_y, att_m
+    ):
+        b = buckets[(lid, sid)][_ym(y, m)]
+        b['day_shifts'] = int(day or 0)
+        b['night_shifts'] = int(night or 0)
+
+    # ---------- advances ----------
+    pay_y = extract('year', Payment.date)
+    pay_m = extract('month', Payment.date)
+    pay_q = db.session.query(
+        Payment.labour_id, Payment.site_id, pay_y, pay_m,
+        func.sum(Payment.advance)
+    ).filter(Payment.date.isnot(None))
+    if labour_id:
+        pay_q = pay_q.filter(Payment.labour_id == labour_id)
+    for lid, sid, y, m, total in pay_q.group_by(
+        Payment.labour_id, Payment.site_id, pay_y, pay_m
+    ):
+        buckets[(lid, sid)][_ym(y, m)]['advances'] = _dec(total)
+
+    # ---------- expenses ----------
+    exp_q = db.session.query(
+        LabourMonthlyExpenses.labour_id,
+        LabourMonthlyExpenses.site_id,
+        LabourMonthlyExpenses.month,
+        func.sum(LabourMonthlyExpenses.mess_amount + LabourMonthlyExpenses.canteen_amount)
+    )
+    if labour_id:
+        exp_q = exp_q.filter(LabourMonthlyExpenses.labour_id == labour_id)
+    for lid, sid, month, total in exp_q.group_by(
+        LabourMonthlyExpenses.labour_id,
+        LabourMonthlyExpenses.site_id,
+        LabourMonthlyExpenses.month
+    ):
+        buckets[(lid, sid)][month]['expenses'] = _dec(total)
+
+    # ---------- running balances ----------
+    rows = []
+    now = datetime.utcnow()
+    for (lid, sid), months in buckets.items():
+        balance = Decimal('0.00')
+        for month in sorted(months):
+            b = months[month]
+            rows.append({
+                'labour_id': lid,
+                'site_id': sid,
+                'month': month,
+                'opening_balance': balance,
+                'day_shifts': b['day_shifts'],
+                'night_shifts': b['night_shifts'],
+                'advances': b['advances'],
+                'expenses': b['expenses'],
+                'closing_balance': balance + b['advances'],
+                'updated_at': now
+            })
+            balance += b['advances']
+
+    try:
+        delete_q = LabourLedgerMonth.query
+        if labour_id:
+            delete_q = delete_q.filter(LabourLedgerMonth.labour_id == labour_id)
+        delete_q.delete(synchronize_session=False)
+
+        for i in range(0, len(rows), batch_size):
+            db.session.execute(LabourLedgerMonth.__table__.insert(), rows[i:i + batch_size])
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(rows)
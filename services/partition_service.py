@@ -0,0 +1,307 @@
+# services/partition_service.py
+#
+# Monthly RANGE partitioning of audit_log (on created_at) and attendance (on
+# date) for MySQL. One partition per month, named pYYYYMM, plus a pmax
+# catch-all; future months are split off pmax ahead of time. Retention is
+# then a metadata operation: a month is dropped, or exchanged into a
+# standalone table and archived from there without touching the live table.
+#
+# MySQL requires the partition column in every unique key and does not allow
+# foreign keys on partitioned tables, so `partition_table` (a one-off table
+# rebuild) widens the primary key to (id, <column>) and drops the FKs.
+#
+# InnoDB also cannot partition a table with a FULLTEXT index. audit_log is
+# therefore either searchable (`flask build-audit-search`: MATCH ... AGAINST
+# on details) or partitioned (retention by DROP/EXCHANGE PARTITION), not
+# both: `partition_table` refuses while ft_audit_details exists, and
+# ensure_audit_search_index() refuses on a partitioned audit_log. Without
+# the index, audit search falls back to LIKE '%word%' scans; without
+# partitions, `flask archive-audit-logs` moves old rows in chunks.
+# On SQLite (local runs) every function is a no-op: the tables stay plain.
+
+from datetime import date, datetime
+
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import text
+
+from models import db, AuditLogArchive
+
+
+# table -> partition column
+PARTITIONED_TABLES = {
+    'audit_log': 'created_at',
+    'attendance': 'date',
+}
+
+MAXVALUE_PARTITION = 'pmax'
+STAGING_PREFIX = 'xchg_'
+
+
+def _is_mysql():
+    return db.engine.dialect.name in ('mysql', 'mariadb')
+
+
+def _check_table(table):
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"Table must be one of: {', '.join(PARTITIONED_TABLES)}.")
+    return PARTITIONED_TABLES[table]
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month_start):
+    return f'p{month_start:%Y%m}'
+
+
+def _partition_month(name):
+    return datetime.strptime(name[1:], '%Y%m').date()
+
+
+def _partition_def(month_start):
+    upper = month_start + relativedelta(months=1)
+    return f"PARTITION {partition_name(month_start)} VALUES LESS THAN ('{upper.isoformat()}')"
+
+
+# =========================
+# INSPECTION
+# =========================
+def list_partitions(table):
+    """[{name, month, rows}] for a partitioned table, [] for a plain one."""
+    _check_table(table)
+    if not _is_mysql():
+        return []
+
+    rows = db.session.execute(text(
+        "SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+        "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {'table': table}).all()
+
+    return [
+        {
+            'name': name,
+            'month': None if name == MAXVALUE_PARTITION else _partition_month(name),
+            'rows': table_rows
+        }
+        for name, table_rows in rows
+    ]
+
+
+def is_partitioned(table):
+    return bool(list_partitions(table))
+
+
+# =========================
+# CONVERSION (ONE-OFF)
+# =========================
+def _foreign_keys(conn, table):
+    return [
+        name for (name,) in conn.execute(text(
+            "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ), {'table': table})
+    ]
+
+
+def fulltext_indexes(table):
+    """Names of the FULLTEXT indexes on `table` (MySQL only, else [])."""
+    if not _is_mysql():
+        return []
+    return [
+        name for (name,) in db.session.execute(text(
+            "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+            "AND INDEX_TYPE = 'FULLTEXT'"
+        ), {'table': table})
+    ]
+
+
+def partition_table(table, months_ahead=None):
+    """
+    Rebuild a plain table as monthly partitions covering its oldest row up
+    to `months_ahead` months from now. Returns the number of partitions, or
+    0 when nothing was done (SQLite, or already partitioned). Raises
+    ValueError if the table has a FULLTEXT index (InnoDB cannot partition it).
+    """
+    column = _check_table(table)
+    if not _is_mysql() or is_partitioned(table):
+        return 0
+
+    fulltext = fulltext_indexes(table)
+    if fulltext:
+        raise ValueError(
+            f"{table} has FULLTEXT index {', '.join(fulltext)}, and MySQL cannot partition "
+            f"a table with FULLTEXT indexes. Keep it unpartitioned (search), or drop the "
+            f"index first (search falls back to LIKE)."
+        )
+
+    months_ahead = months_ahead if months_ahead is not None else \
+        current_app.config.get('PARTITION_MONTHS_AHEAD', 3)
+
+    with db.engine.begin() as conn:
+        # the first partition also takes anything older (and NULL created_at)
+        oldest = conn.execute(text(f"SELECT MIN({column}) FROM {table}")).scalar()
+        first = _month_start(oldest or date.today())
+        last = _month_start(date.today()) + relativedelta(months=months_ahead)
+
+        for fk in _foreign_keys(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {fk}"))
+
+        if column == 'created_at':
+            # partition columns cannot be NULL-able in a unique key
+            conn.execute(text(f"UPDATE {table} SET created_at = '1970-01-01' WHERE created_at IS NULL"))
+            conn.execute(text(f"ALTER TABLE {table} MODIFY created_at DATETIME NOT NULL"))
+
+        conn.execute(text(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, {column})"))
+
+        parts, month = [], first
+        while month <= last:
+            parts.append(_partition_def(month))
+            month += relativedelta(months=1)
+        parts.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+
+        conn.execute(text(
+            f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS({column}) ({', '.join(parts)})"
+        ))
+
+    return len(parts)
+
+
+# =========================
+# MAINTENANCE
+# =========================
+def ensure_future_partitions(table, months_ahead=None):
+    """
+    Split pmax so that partitions exist up to `months_ahead` months from
+    now (run monthly from cron). Returns the names of new partitions.
+    """
+    _check_table(table)
+    existing = [p for p in list_partitions(table) if p['month']]
+    if not existing:
+        return []
+
+    months_ahead = months_ahead if months_ahead is not None else \
+        current_app.config.get('PARTITION_MONTHS_AHEAD', 3)
+
+    target = _month_start(date.today()) + relativedelta(months=months_ahead)
+    month = existing[-1]['month'] + relativedelta(months=1)
+
+    new = []
+    while month <= target:
+        new.append(month)
+        month += relativedelta(months=1)
+    if not new:
+        return []
+
+    defs = [_partition_def(m) for m in new]
+    defs.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {table} REORGANIZE PARTITION {MAXVALUE_PARTITION} "
+            f"INTO ({', '.join(defs)})"
+        ))
+
+    return [partition_name(m) for m in new]
+
+
+def partitions_before(table, cutoff):
+    """Monthly partitions holding only rows older than `cutoff` (a date/datetime)."""
+    limit = _month_start(cutoff)   # a partly-retained month keeps its partition
+    return [
+        p['name'] for p in list_partitions(table)
+        if p['month'] and p['month'] + relativedelta(months=1) <= limit
+    ]
+
+
+def drop_partitions(table, names):
+    """Discard whole months. Instant; the rows are gone."""
+    _check_table(table)
+    if not names or not _is_mysql():
+        return []
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {', '.join(names)}"))
+    return names
+
+
+def exchange_partition(table, name):
+    """
+    Swap a month out into a standalone table (`xchg_<table>_<pYYYYMM>`),
+    leaving an empty partition behind, then drop that partition.
+    Returns the staging table name; its rows are untouched.
+    """
+    _check_table(table)
+    if not _is_mysql():
+        return None
+
+    staging = f'{STAGING_PREFIX}{table}_{name}'
+    with db.engine.begin() as conn:
+        # fails if a previous exchange of this month was never cleaned up
+        conn.execute(text(f"CREATE TABLE {staging} LIKE {table}"))
+        conn.execute(text(f"ALTER TABLE {staging} REMOVE PARTITIONING"))
+        conn.execute(text(f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {staging}"))
+        conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {name}"))
+    return staging
+
+
+# =========================
+# AUDIT LOG RETENTION
+# =========================
+def _staging_tables(table):
+    return [
+        name for (name,) in db.session.execute(text(
+            "SELECT TABLE_NAME FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE :pattern "
+            "ORDER BY TABLE_NAME"
+        ), {'pattern': f'{STAGING_PREFIX}{table}_p%'})
+    ]
+
+
+def _drain_staging_into_archive(staging, chunk_size):
+    """Copy a swapped-out audit month into audit_log_archive in id chunks."""
+    columns = 'user_id, username, role, site_id, action, details, ip_address, created_at'
+    archive = AuditLogArchive.__tablename__
+    moved = 0
+
+    while True:
+        bounds = db.session.execute(text(f"SELECT MIN(id) FROM {staging}")).scalar()
+        if bounds is None:
+            break
+        hi = bounds + chunk_size
+        db.session.execute(text(
+            f"INSERT INTO {archive} ({columns}) "
+            f"SELECT {columns} FROM {staging} WHERE id >= :lo AND id < :hi ORDER BY id"
+        ), {'lo': bounds, 'hi': hi})
+        moved += db.session.execute(text(
+            f"DELETE FROM {staging} WHERE id >= :lo AND id < :hi"
+        ), {'lo': bounds, 'hi': hi}).rowcount or 0
+        db.session.commit()
+
+    db.session.execute(text(f"DROP TABLE {staging}"))
+    db.session.commit()
+    return moved
+
+
+def archive_audit_partitions(cutoff, chunk_size=None):
+    """
+    Archive whole audit_log months older than `cutoff` via partition
+    exchange. Staging tables left by an interrupted run are finished first.
+    Returns the number of rows moved (0 on plain tables).
+    """
+    if not _is_mysql() or not is_partitioned('audit_log'):
+        return 0
+
+    chunk_size = chunk_size or current_app.config.get('AUDIT_ARCHIVE_CHUNK', 5000)
+    moved = 0
+
+    for staging in _staging_tables('audit_log'):
+        moved += _drain_staging_into_archive(staging, chunk_size)
+
+    for name in partitions_before('audit_log', cutoff):
+        staging = exchange_partition('audit_log', name)
+        moved += _drain_staging_into_archive(staging, chunk_size)
+
+    return moved
@@ -0,0 +1,261 @@
+# services/payroll_bulk_service.py
+#
+# All-sites payroll for one month: three grouped queries (shifts, advances,
+# expenses) + the frozen lines of already-closed sites, merged and computed
+# column-wise with pandas instead of a per-row Decimal loop.
+
+import re
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, case
+
+from models import (
+    db,
+    Site,
+    Labour,
+    Attendance,
+    Payment,
+    LabourMonthlyExpenses,
+    PayrollRun,
+    PayrollLine
+)
+from services.payroll_service import month_bounds
+from services.xlsx_export_service import ALL_SITES_COLUMNS
+
+
+PAYROLL_COLUMNS = [
+    'site_id', 'site_name', 'labour_id', 'labour_name',
+    'bank_account', 'ifsc_code', 'daily_wage',
+    'day_shift', 'night_shift', 'total_shifts',
+    'total_pay', 'advance_paid', 'expenses', 'net_payable', 'closed'
+]
+
+
+# =========================
+# PURE COMPUTATION (BENCHMARKED)
+# =========================
+def _to_float(column):
+    return pd.to_numeric(column, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+
+def compute_payroll_frame(shifts, advances, expenses):
+    """
+    shifts:   site_id, labour_id, labour_name, bank_account, ifsc_code,
+              daily_wage, day_shift, night_shift
+    advances: site_id, labour_id, advance_paid
+    expenses: site_id, labour_id, expenses
+
+    Returns one row per (site, labour) in `shifts` with gross/net computed
+    as vectorised float64 columns rounded to paise.
+    """
+    if shifts.empty:
+        return shifts.reindex(columns=[c for c in PAYROLL_COLUMNS if c not in ('site_name', 'closed')])
+
+    df = shifts.merge(advances, on=['site_id', 'labour_id'], how='left')
+    df = df.merge(expenses, on=['site_id', 'labour_id'], how='left')
+
+    day = df['day_shift'].fillna(0).to_numpy(dtype=np.int64)
+    night = df['night_shift'].fillna(0).to_numpy(dtype=np.int64)
+    # Numeric columns arrive as Decimal objects: convert before filling gaps
+    wage = _to_float(df['daily_wage'])
+    advance = _to_float(df['advance_paid'])
+    expense = _to_float(df['expenses'])
+
+    total_shifts = day + night
+    total_pay = np.round(wage * total_shifts, 2)
+
+    df['day_shift'] = day
+    df['night_shift'] = night
+    df['daily_wage'] = wage
+    df['total_shifts'] = total_shifts
+    df['total_pay'] = total_pay
+    df['advance_paid'] = np.round(advance, 2)
+    df['expenses'] = np.round(expense, 2)
+    df['net_payable'] = np.round(total_pay - advance - expense, 2)
+
+    return df
+
+
+# =========================
+# LOADING
+# =========================
+def _closed_site_ids(month):
+    return [
+        r.site_id for r in
+        db.session.query(PayrollRun.site_id).filter(PayrollRun.month == month).all()
+    ]
+
+
+def _frame(query, columns):
+    return pd.DataFrame(query.all(), columns=columns)
+
+
+def _load_live(month, exclude_site_ids):
+    start_date, end_date = month_bounds(month)
+
+    # 1) shift counts per (site, labour) + labour details
+    shifts_q = (
+        db.session.query(
+            Attendance.site_id,
+            Attendance.labour_id,
+            Labour.name,
+            Labour.bank_account,
+            Labour.ifsc_code,
+            Labour.daily_wage,
+            func.sum(case((Attendance.day_shift_flag == 1, 1), else_=0)),
+            func.sum(case((Attendance.night_shift_flag == 1, 1), else_=0))
+        )
+        .join(Labour, Labour.id == Attendance.labour_id)
+        .filter(
+            Attendance.date >= start_date,
+            Attendance.date < end_date,
+            Labour.is_active == True
+        )
+        .group_by(
+            Attendance.site_id, Attendance.labour_id, Labour.name,
+            Labour.bank_account, Labour.ifsc_code, Labour.daily_wage
+        )
+    )
+
+    # 2) advances per (site, labour)
+    advances_q = (
+        db.session.query(
+            Payment.site_id,
+            Payment.labour_id,
+            func.coalesce(func.sum(Payment.advance), 0)
+        )
+        .filter(Payment.date >= start_date, Payment.date < end_date)
+        .group_by(Payment.site_id, Payment.labour_id)
+    )
+
+    # 3) expenses per (site, labour)
+    expenses_q = (
+        db.session.query(
+            LabourMonthlyExpenses.site_id,
+            LabourMonthlyExpenses.labour_id,
+            func.sum(LabourMonthlyExpenses.mess_amount + LabourMonthlyExpenses.canteen_amount)
+        )
+        .filter(LabourMonthlyExpenses.month == month)
+        .group_by(LabourMonthlyExpenses.site_id, LabourMonthlyExpenses.labour_id)
+    )
+
+    if exclude_site_ids:
+        shifts_q = shifts_q.filter(~Attendance.site_id.in_(exclude_site_ids))
+        advances_q = advances_q.filter(~Payment.site_id.in_(exclude_site_ids))
+        expenses_q = expenses_q.filter(~LabourMonthlyExpenses.site_id.in_(exclude_site_ids))
+
+    shifts = _frame(shifts_q, [
+        'site_id', 'labour_id', 'labour_name', 'bank_account', 'ifsc_code',
+        'daily_wage', 'day_shift', 'night_shift'
+    ])
+    advances = _frame(advances_q, ['site_id', 'labour_id', 'advance_paid'])
+    expenses = _frame(expenses_q, ['site_id', 'labour_id', 'expenses'])
+
+    df = compute_payroll_frame(shifts, advances, expenses)
+    df['closed'] = False
+    return df
+
+
+def _load_closed(month):
+    q = db.session.query(
+        PayrollLine.site_id,
+        PayrollLine.labour_id,
+        PayrollLine.labour_name,
+        PayrollLine.bank_account,
+        PayrollLine.ifsc_code,
+        PayrollLine.daily_wage,
+        PayrollLine.day_shifts,
+        PayrollLine.night_shifts,
+        PayrollLine.total_shifts,
+        PayrollLine.gross,
+        PayrollLine.advance,
+        PayrollLine.expenses,
+        PayrollLine.net
+    ).filter(PayrollLine.month == month)
+
+    df = _frame(q, [
+        'site_id', 'labour_id', 'labour_name', 'bank_account', 'ifsc_code',
+        'daily_wage', 'day_shift', 'night_shift', 'total_shifts',
+        'total_pay', 'advance_paid', 'expenses', 'net_payable'
+    ])
+    for col in ('daily_wage', 'total_pay', 'advance_paid', 'expenses', 'net_payable'):
+        df[col] = df[col].astype(np.float64)
+    df['closed'] = True
+    return df
+
+
+def load_all_sites_payroll(month):
+    """
+    One DataFrame (PAYROLL_COLUMNS) with every site's payroll for `month`,
+    closed sites from their snapshot, the rest computed live.
+    """
+    closed_ids = _closed_site_ids(month)
+
+    frames = [_load_live(month, closed_ids)]
+    if closed_ids:
+        frames.append(_load_closed(month))
+    frames = [f for f in frames if not f.empty]
+
+    if not frames:
+        return pd.DataFrame(columns=PAYROLL_COLUMNS)
+
+    df = pd.concat(frames, ignore_index=True)
+
+    site_names = dict(db.session.query(Site.id, Site.site_name).all())
+    df['site_name'] = df['site_id'].map(site_names).fillna('-')
+
+    return (
+        df[PAYROLL_COLUMNS]
+        .sort_values(['site_name', 'labour_name'])
+        .reset_index(drop=True)
+    )
+
+
+def summarize_by_site(df):
+    """Per-site totals for the on-screen summary."""
+    if df.empty:
+        return []
+
+    totals = (
+        df.groupby(['site_id', 'site_name'], sort=True)
+        .agg(
+            labours=('labour_id', 'count'),
+            total_shifts=('total_shifts', 'sum'),
+            total_pay=('total_pay', 'sum'),
+            advance_paid=('advance_paid', 'sum'),
+            expenses=('expenses', 'sum'),
+            net_payable=('net_payable', 'sum'),
+            closed=('closed', 'all')
+        )
+        .reset_index()
+    )
+    return totals.to_dict('records')
+
+
+# =========================
+# WORKBOOK
+# =========================
+def _sheet_name(name, used):
+    base = re.sub(r'[\[\]\:\*\?\/\\]', ' ', str(name)).strip()[:31] or 'Site'
+    candidate, n = base, 2
+    while candidate.lower() in used:
+        suffix = f' ({n})'
+        candidate = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def all_sites_sheets(df):
+    """
+    Consolidated sheet + one sheet per site, as (name, columns, rows)
+    for xlsx_export_service. Rows are yielded lazily from the frame.
+    """
+    used = {'consolidated'}
+
+    yield 'Consolidated', ALL_SITES_COLUMNS, df.itertuples(index=False)
+
+    site_columns = [c for c in ALL_SITES_COLUMNS if c.key != 'site_name']
+    for site_name, site_df in df.groupby('site_name', sort=True):
+        yield _sheet_name(site_name, used), site_columns, site_df.itertuples(index=False)
@@ -0,0 +1,354 @@
+# services/payroll_service.py
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, case, and_
+
+from models import (
+    db,
+    Site,
+    Labour,
+    Attendance,
+    Payment,
+    LabourMonthlyExpenses,
+    PayrollRun,
+    PayrollLine
+)
+from services.cache_service import bump_data_version
+from services.ledger_service import month_key
+
+
+def month_bounds(month):
+    """'YYYY-MM' → (first day, first day of next month)."""
+    start_date = datetime.strptime(month + '-01', '%Y-%m-%d').date()
+    end_date = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start_date, end_date
+
+
+# =========================
+# LIVE COMPUTATION
+# =========================
+def compute_site_payroll(site_id, month):
+    """
+    Payroll rows for a site-month straight from attendance, payments and
+    expenses (active labours with attendance in the month).
+    """
+    start_date, end_date = month_bounds(month)
+
+    attendance_subq = (
+        db.session.query(
+            Attendance.labour_id.label('labour_id'),
+
+            func.sum(
+                case((Attendance.day_shift_flag == 1, 1), else_=0)
+            ).label('day_shift'),
+
+            func.sum(
+                case((Attendance.night_shift_flag == 1, 1), else_=0)
+            ).label('night_shift'),
+        )
+        .filter(
+            Attendance.site_id == site_id,
+            Attendance.date >= start_date,
+            Attendance.date < end_date
+        )
+        .group_by(Attendance.labour_id)
+        .subquery()
+    )
+
+    data = (
+        db.session.query(
+            Labour.id,
+            Labour.name.label('labour_name'),
+            Site.site_name,
+            Labour.bank_account,
+            Labour.ifsc_code,
+            Labour.daily_wage,
+
+            func.coalesce(attendance_subq.c.day_shift, 0).label('day_shift'),
+            func.coalesce(attendance_subq.c.night_shift, 0).label('night_shift'),
+
+            func.coalesce(func.sum(Payment.advance), Decimal('0.00')).label('advance_paid'),
+            func.coalesce(
+                LabourMonthlyExpenses.mess_amount +
+                LabourMonthlyExpenses.canteen_amount,
+                Decimal('0.00')
+            ).label('expenses')
+        )
+        .join(attendance_subq, attendance_subq.c.labour_id == Labour.id)
+        .join(Site, Site.id == Labour.site_id)
+        .outerjoin(
+            Payment,
+            and_(
+                Payment.labour_id == Labour.id,
+                Payment.site_id == site_id,
+                Payment.date >= start_date,
+                Payment.date < end_date
+            )
+        )
+        .outerjoin(
+            LabourMonthlyExpenses,
+            and_(
+                LabourMonthlyExpenses.labour_id == Labour.id,
+                LabourMonthlyExpenses.site_id == site_id,
+                LabourMonthlyExpenses.month == month
+            )
+        )
+        .filter(Labour.is_active == True)
+        .group_by(
+            Labour.id,
+            Labour.name,
+            Site.site_name,
+            Labour.bank_account,
+            Labour.ifsc_code,
+            Labour.daily_wage,
+            LabourMonthlyExpenses.mess_amount,
+            LabourMonthlyExpenses.canteen_amount
+        )
+        .order_by(Labour.name.asc())
+        .all()
+    )
+
+    rows = []
+    for r in data:
+        day = int(r.day_shift or 0)
+        night = int(r.night_shift or 0)
+
+        total_shifts = day + night
+        wage = Decimal(r.daily_wage or 0)
+        total_pay = wage * total_shifts
+
+        advance = Decimal(r.advance_paid or 0)
+        expenses = Decimal(r.expenses or 0)
+
+        rows.append({
+            'labour_id': r.id,
+            'labour_name': r.labour_name,
+            'site_name': r.site_name,
+            'bank_account': r.bank_account,
+            'ifsc_code': r.ifsc_code,
+            'daily_wage': wage,
+            'total_shifts': total_shifts,
+            'day_shift': day,
+            'night_shift': night,
+            'total_pay': total_pay,
+            'advance_paid': advance,
+            'expenses': expenses,
+            'net_payable': total_pay - advance - expenses
+        })
+
+    return rows
+
+
+def _day_marks(site_id, month):
+    """{labour_id: 'PA..'} — one char per day of the month."""
+    start_date, end_date = month_bounds(month)
+    days = (end_date - start_date).days
+
+    rows = (
+        db.session.query(
+            Attendance.labour_id,
+            Attendance.date,
+            Attendance.day_shift_flag,
+            Attendance.night_shift_flag
+        )
+        .filter(
+            Attendance.site_id == site_id,
+            Attendance.date >= start_date,
+            Attendance.date < end_date
+        )
+        .all()
+    )
+
+    marks = {}
+    for r in rows:
+        chars = marks.setdefault(r.labour_id, ['.'] * days)
+        chars[(r.date - start_date).days] = (
+            'P' if (r.day_shift_flag or r.night_shift_flag) else 'A'
+        )
+
+    return {labour_id: ''.join(chars) for labour_id, chars in marks.items()}
+
+
+# =========================
+# SNAPSHOTS
+# =========================
+def get_payroll_run(site_id, month):
+    return PayrollRun.query.filter_by(site_id=site_id, month=month).first()
+
+
+def is_month_closed(site_id, day):
+    """day: date / datetime / 'YYYY-MM-DD' / 'YYYY-MM'."""
+    return db.session.query(PayrollRun.id).filter_by(
+        site_id=site_id,
+        month=month_key(day)
+    ).first() is not None
+
+
+def _line_to_row(line, site_name):
+    return {
+        'labour_id': line.labour_id,
+        'labour_name': line.labour_name,
+        'site_name': site_name,
+        'bank_account': line.bank_account,
+        'ifsc_code': line.ifsc_code,
+        'daily_wage': Decimal(line.daily_wage or 0),
+        'total_shifts': line.total_shifts,
+        'day_shift': line.day_shifts,
+        'night_shift': line.night_shifts,
+        'total_pay': Decimal(line.gross or 0),
+        'advance_paid': Decimal(line.advance or 0),
+        'expenses': Decimal(line.expenses or 0),
+        'net_payable': Decimal(line.net or 0)
+    }
+
+
+def get_site_payroll(site_id, month):
+    """
+    (rows, run) for a site-month. Closed months are read from the frozen
+    snapshot; open months are computed live (run is None).
+    """
+    run = get_payroll_run(site_id, month)
+    if not run:
+        return compute_site_payroll(site_id, month), None
+
+    site_name = run.site.site_name if run.site else '-'
+    lines = run.lines.order_by(PayrollLine.labour_name.asc()).all()
+    return [_line_to_row(l, site_name) for l in lines], run
+
+
+def get_labour_payroll_line(labour_id, site_id, month):
+    """
+    (run, line) if the site-month is closed, else (None, None).
+    line is None when the labour had no attendance in a closed month.
+    """
+    run = get_payroll_run(site_id, month)
+    if not run:
+        return None, None
+
+    line = PayrollLine.query.filter_by(run_id=run.id, labour_id=labour_id).first()
+    return run, line
+
+
+def get_payroll_lines_for(labour_site_pairs, month):
+    """
+    Batch form of get_labour_payroll_line for (labour_id, site_id) pairs.
+    Returns ({site_id: run} for closed sites, {(labour_id, site_id): line}).
+    """
+    site_ids = {sid for _, sid in labour_site_pairs}
+    if not site_ids:
+        return {}, {}
+
+    runs = {
+        r.site_id: r for r in
+        PayrollRun.query.filter(
+            PayrollRun.month == month,
+            PayrollRun.site_id.in_(site_ids)
+        ).all()
+    }
+    if not runs:
+        return {}, {}
+
+    labour_ids = {lid for lid, sid in labour_site_pairs if sid in runs}
+    lines = PayrollLine.query.filter(
+        PayrollLine.run_id.in_([r.id for r in runs.values()]),
+        PayrollLine.labour_id.in_(labour_ids)
+    ).all()
+
+    return runs, {(l.labour_id, l.site_id): l for l in lines}
+
+
+def close_payroll_month(site_id, month, user=None):
+    """Compute and freeze a site-month. Raises ValueError if not closable."""
+    start_date, _ = month_bounds(month)
+    if start_date > date.today():
+        raise ValueError('Cannot close a future month.')
+
+    if get_payroll_run(site_id, month):
+        raise ValueError(f'Payroll for {month} is already closed.')
+
+    rows = compute_site_payroll(site_id, month)
+    marks = _day_marks(site_id, month)
+
+    run = PayrollRun(
+        site_id=site_id,
+        month=month,
+        status='closed',
+        total_shifts=sum(r['total_shifts'] for r in rows),
+        total_gross=sum((r['total_pay'] for r in rows), Decimal('0.00')),
+        total_advance=sum((r['advance_paid'] for r in rows), Decimal('0.00')),
+        total_expenses=sum((r['expenses'] for r in rows), Decimal('0.00')),
+        total_net=sum((r['net_payable'] for r in rows), Decimal('0.00')),
+        closed_by_id=user.id if user else None,
+        closed_at=datetime.utcnow()
+    )
+
+    try:
+        db.session.add(run)
+        db.session.flush()  # need run.id for the lines
+
+        if rows:
+            db.session.execute(
+                PayrollLine.__table__.insert(),
+                [
+                    {
+                        'run_id': run.id,
+                        'labour_id': r['labour_id'],
+                        'site_id': site_id,
+                        'month': month,
+                        'labour_name': r['labour_name'],
+                        'bank_account': r['bank_account'],
+                        'ifsc_code': r['ifsc_code'],
+                        'day_shifts': r['day_shift'],
+                        'night_shifts': r['night_shift'],
+                        'total_shifts': r['total_shifts'],
+                        'daily_wage': r['daily_wage'],
+                        'gross': r['total_pay'],
+                        'advance': r['advance_paid'],
+                        'expenses': r['expenses'],
+                        'net': r['net_payable'],
+                        'day_marks': marks.get(r['labour_id'])
+                    }
+                    for r in rows
+                ]
+            )
+
+        bump_data_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return run
+
+
+def reopen_payroll_month(site_id, month):
+    """Discard the snapshot so the month is computed live again."""
+    run = get_payroll_run(site_id, month)
+    if not run:
+        raise ValueError(f'Payroll for {month} is not closed.')
+
+    try:
+        PayrollLine.query.filter_by(run_id=run.id).delete(synchronize_session=False)
+        db.session.delete(run)
+        bump_data_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def get_payroll_state(month):
+    """Dashboard badge: Draft / Partially Closed (x/y) / Closed."""
+    closed = db.session.query(func.count(PayrollRun.id)).filter(
+        PayrollRun.month == month
+    ).scalar() or 0
+
+    if not closed:
+        return "Draft"
+
+    active_sites = Site.query.filter_by(is_active=True).count()
+    if closed >= active_sites:
+        return "Closed"
+    return f"Partially Closed ({closed}/{active_sites})"
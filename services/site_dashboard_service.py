@@ -1,8 +1,16 @@
 from datetime import date, timedelta
 from decimal import Decimal
-from sqlalchemy import func, case, or_
+from sqlalchemy.orm import joinedload
 
-from models import db, Site, User, Labour, Attendance, Payment
+from models import Site
+from services.site_metrics_service import (
+    COMPARE_MODES,
+    DateWindow,
+    get_site_roster_today,
+    get_site_window_metrics,
+    resolve_windows,
+    window_days,
+)
 
 
 def D(val):
@@ -12,183 +20,61 @@ def D(val):
         return Decimal("0.00")
 
 
-def get_admin_site_dashboard(site_id: int) -> dict:
+def _attendance_pct(present, total_labours, days):
+    return (
+        round((present / (total_labours * days)) * 100, 1)
+        if total_labours > 0 else 0.0
+    )
+
+
+def get_admin_site_dashboard(site_id: int, compare: str = "yesterday") -> dict:
     today = date.today()
     yesterday = today - timedelta(days=1)
 
+    if compare not in COMPARE_MODES:
+        compare = "yesterday"
+    current, previous = resolve_windows(compare, today)
+    mtd = DateWindow(today.replace(day=1), today)
+
     # -----------------------------
-    # SITE & MANAGER
+    # SITE & MANAGER (ONE QUERY)
     # -----------------------------
-    site = Site.query.get(site_id)
+    site = Site.query.options(joinedload(Site.users)).get(site_id)
     if not site:
         return None
 
-    manager = (
-        User.query
-        .filter(User.site_id == site_id, User.role == "manager")
-        .first()
-    )
+    manager = next((u for u in site.users if u.role == "manager"), None)
 
     # -----------------------------
-    # TOTAL LABOURS (BASE METRIC)
+    # ROSTER: TOTAL + ABSENT TODAY
     # -----------------------------
-    total_labours = (
-        Labour.query
-        .filter(
-            Labour.site_id == site_id,
-            Labour.is_active.is_(True)
-        )
-        .count()
-    )
+    total_labours, absent_today = get_site_roster_today(site_id, today)
 
     # -----------------------------
-    # PRESENT TODAY
+    # ALL WINDOWED METRICS (2 QUERIES)
     # -----------------------------
-    present_today = (
-        db.session.query(func.count(func.distinct(Attendance.labour_id)))
-        .filter(
-            Attendance.site_id == site_id,
-            Attendance.date == today,
-            or_(
-                Attendance.day_shift_flag.is_(True),
-                Attendance.night_shift_flag.is_(True)
-            )
-        )
-        .scalar()
-    ) or 0
+    metrics = get_site_window_metrics(site_id, {
+        "current": current,
+        "previous": previous,
+        "mtd": mtd,
+    })
+    cur = metrics["current"]
+    prev = metrics["previous"]
 
-    # -----------------------------
-    # SHIFTS TODAY (DAY + NIGHT)
-    # -----------------------------
-    total_shifts_today = (
-        db.session.query(
-            func.coalesce(
-                func.sum(case((Attendance.day_shift_flag.is_(True), 1), else_=0)),
-                0
-            ) +
-            func.coalesce(
-                func.sum(case((Attendance.night_shift_flag.is_(True), 1), else_=0)),
-                0
-            )
-        )
-        .filter(
-            Attendance.site_id == site_id,
-            Attendance.date == today
-        )
-        .scalar()
-    ) or 0
-
-    attendance_percent = (
-        round((present_today / total_labours) * 100, 1)
-        if total_labours > 0 else 0.0
-    )
-
-    # -----------------------------
-    # ABSENT TODAY
-    # -----------------------------
-    absent_today = (
-        Labour.query
-        .filter(
-            Labour.site_id == site_id,
-            Labour.is_active.is_(True),
-            ~Labour.id.in_(
-                db.session.query(Attendance.labour_id)
-                .filter(
-                    Attendance.site_id == site_id,
-                    Attendance.date == today,
-                    or_(
-                        Attendance.day_shift_flag.is_(True),
-                        Attendance.night_shift_flag.is_(True)
-                    )
-                )
-            )
-        )
-        .all()
-    )
+    attendance_percent = _attendance_pct(cur["present"], total_labours, window_days(current))
+    previous_attendance_pct = _attendance_pct(prev["present"], total_labours, window_days(previous))
 
     # -----------------------------
     # FINANCIAL (MONTH TO DATE)
     # -----------------------------
-    month_start = today.replace(day=1)
-
-    payroll_mtd = D(
-        db.session.query(
-            func.sum(
-                case((Attendance.day_shift_flag.is_(True), Labour.daily_wage), else_=0) +
-                case((Attendance.night_shift_flag.is_(True), Labour.daily_wage), else_=0)
-            )
-        )
-        .select_from(Attendance)
-        .join(Labour, Labour.id == Attendance.labour_id)
-        .filter(
-            Attendance.site_id == site_id,
-            Attendance.date >= month_start,
-            Attendance.date <= today
-        )
-        .scalar()
-    )
-
-    advances_mtd = D(
-        db.session.query(func.sum(Payment.advance))
-        .filter(
-            Payment.site_id == site_id,
-            Payment.date >= month_start,
-            Payment.date <= today
-        )
-        .scalar()
-    )
+    payroll_mtd = D(metrics["mtd"]["payroll"])
+    advances_mtd = D(metrics["mtd"]["advances"])
 
     advance_ratio = (
         round((advances_mtd / payroll_mtd) * Decimal("100"), 1)
         if payroll_mtd > 0 else Decimal("0.0")
     )
 
-    # -----------------------------
-    # YESTERDAY METRICS
-    # -----------------------------
-    yesterday_present = (
-        db.session.query(func.count(func.distinct(Attendance.labour_id)))
-        .filter(
-            Attendance.site_id == site_id,
-            Attendance.date == yesterday,
-            or_(
-                Attendance.day_shift_flag.is_(True),
-                Attendance.night_shift_flag.is_(True)
-            )
-        )
-        .scalar()
-    ) or 0
-
-    yesterday_shifts = (
-        db.session.query(
-            func.coalesce(
-                func.sum(case((Attendance.day_shift_flag.is_(True), 1), else_=0)),
-                0
-            ) +
-            func.coalesce(
-                func.sum(case((Attendance.night_shift_flag.is_(True), 1), else_=0)),
-                0
-            )
-        )
-        .filter(
-            Attendance.site_id == site_id,
-            Attendance.date == yesterday
-        )
-        .scalar()
-    ) or 0
-
-    yesterday_attendance_pct = (
-        round((yesterday_present / total_labours) * 100, 1)
-        if total_labours > 0 else 0.0
-    )
-
-    # -----------------------------
-    # DELTAS (SAFE)
-    # -----------------------------
-    present_diff = present_today - yesterday_present
-    shift_diff = total_shifts_today - yesterday_shifts
-    attendance_diff = round(attendance_percent - yesterday_attendance_pct, 1)
-
     # -----------------------------
     # FINAL RESPONSE
     # -----------------------------
@@ -200,27 +86,31 @@ def get_admin_site_dashboard(site_id: int) -> dict:
         "manager_name": manager.username if manager else "—",
 
         "total_labours": total_labours,
-        "present_today": present_today,
-        "total_shifts_today": int(total_shifts_today),
+        "present_today": cur["present"],
+        "total_shifts_today": cur["shifts"],
         "attendance_percent": attendance_percent,
 
         "payroll_mtd": float(payroll_mtd),
         "advances_mtd": float(advances_mtd),
         "advance_ratio": float(advance_ratio),
 
-        "absent_today": [
-            {"id": l.id, "name": l.name} for l in absent_today
-        ],
+        "absent_today": absent_today,
 
         "yesterday_date": yesterday,
 
-
-        "yesterday": {
-            "present": yesterday_present,
-            "shifts": yesterday_shifts,
-            "attendance_percent": yesterday_attendance_pct,
-            "present_diff": present_diff,
-            "shift_diff": shift_diff,
-            "attendance_diff": attendance_diff
+        "compare": compare,
+        "compare_modes": COMPARE_MODES,
+        "current_window": current,
+        "comparison": {
+            "label": COMPARE_MODES[compare],
+            "window": previous,
+            "present": prev["present"],
+            "shifts": prev["shifts"],
+            "attendance_percent": previous_attendance_pct,
+            "present_diff": cur["present"] - prev["present"],
+            "shift_diff": cur["shifts"] - prev["shifts"],
+            "attendance_diff": round(attendance_percent - previous_attendance_pct, 1),
+            "payroll_diff": float(D(cur["payroll"]) - D(prev["payroll"])),
+            "advance_diff": float(D(cur["advances"]) - D(prev["advances"]))
         }
     }
@@ -0,0 +1,162 @@
+# services/site_metrics_service.py
+
+from collections import namedtuple
+from datetime import timedelta
+
+from sqlalchemy import func, case, and_, or_
+
+from models import db, Labour, Attendance, Payment
+
+
+# inclusive date range
+DateWindow = namedtuple("DateWindow", ["start", "end"])
+
+
+def window_days(window):
+    return (window.end - window.start).days + 1
+
+
+# =========================
+# COMPARISON MODES
+# =========================
+COMPARE_MODES = {
+    "yesterday": "Previous Day",
+    "last_week": "Same Day Last Week",
+    "7d": "Previous 7 Days",
+}
+
+
+def resolve_windows(compare, today):
+    """
+    Returns (current, previous) DateWindows for a comparison mode.
+    Unknown modes fall back to "yesterday".
+    """
+    if compare == "last_week":
+        return (
+            DateWindow(today, today),
+            DateWindow(today - timedelta(days=7), today - timedelta(days=7))
+        )
+
+    if compare == "7d":
+        return (
+            DateWindow(today - timedelta(days=6), today),
+            DateWindow(today - timedelta(days=13), today - timedelta(days=7))
+        )
+
+    yesterday = today - timedelta(days=1)
+    return DateWindow(today, today), DateWindow(yesterday, yesterday)
+
+
+# =========================
+# ENGINE
+# =========================
+def _in_window(col, window):
+    return and_(col >= window.start, col <= window.end)
+
+
+def get_site_window_metrics(site_id, windows):
+    """
+    One grouped pass over attendance and one over payments for a site.
+
+    `windows` is a dict {name: DateWindow}. For every name the result has
+    present (person-days), shifts, payroll and advances within that window.
+    """
+    lo = min(w.start for w in windows.values())
+    hi = max(w.end for w in windows.values())
+
+    present = or_(
+        Attendance.day_shift_flag.is_(True),
+        Attendance.night_shift_flag.is_(True)
+    )
+    shifts = (
+        case((Attendance.day_shift_flag.is_(True), 1), else_=0) +
+        case((Attendance.night_shift_flag.is_(True), 1), else_=0)
+    )
+
+    # ---------- ATTENDANCE + PAYROLL (ONE QUERY) ----------
+    att_cols = []
+    for name, w in windows.items():
+        in_w = _in_window(Attendance.date, w)
+        att_cols += [
+            func.coalesce(func.sum(case((and_(in_w, present), 1), else_=0)), 0)
+            .label(f"{name}_present"),
+            func.coalesce(func.sum(case((in_w, shifts), else_=0)), 0)
+            .label(f"{name}_shifts"),
+            func.coalesce(func.sum(case((in_w, shifts * Labour.daily_wage), else_=0)), 0)
+            .label(f"{name}_payroll"),
+        ]
+
+    att = (
+        db.session.query(*att_cols)
+        .select_from(Attendance)
+        .join(Labour, Labour.id == Attendance.labour_id)
+        .filter(
+            Attendance.site_id == site_id,
+            Attendance.date >= lo,
+            Attendance.date <= hi
+        )
+        .one()
+    )
+
+    # ---------- ADVANCES (ONE QUERY) ----------
+    pay_cols = [
+        func.coalesce(
+            func.sum(case((_in_window(Payment.date, w), Payment.advance), else_=0)), 0
+        ).label(f"{name}_advances")
+        for name, w in windows.items()
+    ]
+
+    pay = (
+        db.session.query(*pay_cols)
+        .filter(
+            Payment.site_id == site_id,
+            Payment.date >= lo,
+            Payment.date <= hi
+        )
+        .one()
+    )
+
+    metrics = {}
+    for name in windows:
+        metrics[name] = {
+            "present": int(getattr(att, f"{name}_present") or 0),
+            "shifts": int(getattr(att, f"{name}_shifts") or 0),
+            "payroll": getattr(att, f"{name}_payroll") or 0,
+            "advances": getattr(pay, f"{name}_advances") or 0,
+        }
+    return metrics
+
+
+def get_site_roster_today(site_id, today):
+    """
+    Active labours of a site with today's attendance in one outer join.
+    Returns (total_labours, absent_list).
+    """
+    rows = (
+        db.session.query(
+            Labour.id,
+            Labour.name,
+            Attendance.day_shift_flag,
+            Attendance.night_shift_flag
+        )
+        .outerjoin(
+            Attendance,
+            and_(
+                Attendance.labour_id == Labour.id,
+                Attendance.site_id == site_id,
+                Attendance.date == today
+            )
+        )
+        .filter(
+            Labour.site_id == site_id,
+            Labour.is_active.is_(True)
+        )
+        .all()
+    )
+
+    absent = [
+        {"id": r.id, "name": r.name}
+        for r in rows
+        if not (r.day_shift_flag or r.night_shift_flag)
+    ]
+    return len(rows), absent
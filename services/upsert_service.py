@@ -0,0 +1,36 @@
+# services/upsert_service.py
+#
+# Dialect-specific "create the row unless it exists" for tables that several
+# transactions may insert into at once (rollup and ledger rows). A plain
+# INSERT guarded by a prior SELECT loses that race with a unique-key error;
+# INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO NOTHING
+# (SQLite, PostgreSQL) waits for the other writer and then does nothing.
+
+from sqlalchemy.dialects import mysql, sqlite, postgresql
+
+from models import db
+
+
+def insert_ignore(table, rows, index_elements):
+    """
+    INSERT `rows` into `table`, skipping those that collide with the unique
+    key `index_elements`. Does NOT commit.
+    """
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(rows)
+        # no-op assignment: MySQL has no DO NOTHING (INSERT IGNORE would also
+        # swallow unrelated errors)
+        key = index_elements[0]
+        stmt = stmt.on_duplicate_key_update({key: table.c[key]})
+    elif dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+    else:
+        stmt = table.insert().values(rows)
+
+    db.session.execute(stmt)
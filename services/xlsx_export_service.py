@@ -0,0 +1,183 @@
+# services/xlsx_export_service.py
+#
+# Shared XLSX writer for the payroll exports. Rows are streamed straight
+# into xlsxwriter in constant_memory mode (each row is flushed to disk as
+# soon as the next one starts) and the workbook is written to a per-request
+# spooled temp file, so nothing is shared between concurrent exports.
+
+import tempfile
+from collections import namedtuple
+from decimal import Decimal
+
+import xlsxwriter
+from flask import send_file
+
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# spill to disk once the finished workbook is bigger than this
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# key:    dict key / attribute read from each row ('#' = serial number)
+# header: column heading
+# kind:   'text' | 'int' | 'money'  — int/money columns get a total
+Column = namedtuple('Column', 'key header kind width', defaults=('text', 14))
+
+SERIAL = Column('#', 'Sl. No.', 'text', 8)
+
+PROGRESS_EVERY = 500
+
+
+def _formats(workbook):
+    return {
+        'header': workbook.add_format({
+            'bold': True, 'bg_color': '#D9E1F2', 'border': 1
+        }),
+        'text': workbook.add_format({}),
+        'int': workbook.add_format({'num_format': '0'}),
+        'money': workbook.add_format({'num_format': '#,##0.00'}),
+        'total_text': workbook.add_format({'bold': True, 'top': 1}),
+        'total_int': workbook.add_format({'bold': True, 'top': 1, 'num_format': '0'}),
+        'total_money': workbook.add_format({'bold': True, 'top': 1, 'num_format': '#,##0.00'}),
+    }
+
+
+def _value(row, key):
+    if isinstance(row, dict):
+        return row.get(key)
+    return getattr(row, key, None)
+
+
+def _cell(value, kind):
+    if value is None:
+        return '' if kind == 'text' else 0
+    if kind == 'money':
+        return float(value)
+    if kind == 'int':
+        return int(value)
+    return value
+
+
+def write_sheet(workbook, formats, sheet_name, columns, rows,
+                total_label='TOTAL', progress=None):
+    """
+    Write one sheet: header, the rows in order, then a totals row summing
+    every int/money column. Returns the number of data rows written.
+    progress(n) is called after every PROGRESS_EVERY rows, if given.
+    """
+    ws = workbook.add_worksheet(sheet_name)
+
+    for c, col in enumerate(columns):
+        ws.set_column(c, c, col.width)
+        ws.write_string(0, c, col.header, formats['header'])
+
+    totals = [Decimal('0.00') if col.kind == 'money' else 0 for col in columns]
+    label_col = next((c for c, col in enumerate(columns) if col.kind == 'text' and col.key != '#'), 0)
+
+    r = 0
+    for r, row in enumerate(rows, start=1):
+        for c, col in enumerate(columns):
+            if col.key == '#':
+                ws.write_number(r, c, r)
+                continue
+
+            raw = _value(row, col.key)
+            value = _cell(raw, col.kind)
+
+            if col.kind == 'text':
+                ws.write(r, c, value, formats['text'])
+            else:
+                ws.write_number(r, c, value, formats[col.kind])
+                totals[c] += Decimal(str(raw or 0)) if col.kind == 'money' else value
+
+        if progress and r % PROGRESS_EVERY == 0:
+            progress(PROGRESS_EVERY)
+
+    if progress and r % PROGRESS_EVERY:
+        progress(r % PROGRESS_EVERY)
+
+    total_row = r + 1
+    for c, col in enumerate(columns):
+        if col.kind in ('int', 'money'):
+            ws.write_number(total_row, c, _cell(totals[c], col.kind), formats['total_' + col.kind])
+        elif c == label_col:
+            ws.write_string(total_row, c, total_label, formats['total_text'])
+        else:
+            ws.write_blank(total_row, c, None, formats['total_text'])
+
+    return r
+
+
+def write_workbook(target, sheets, progress=None):
+    """
+    sheets: iterable of (sheet_name, columns, rows). Rows may be any
+    iterable (generator, query, list of dicts / namedtuples).
+    target: a path or a writable binary file object.
+    """
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'tmpdir': tempfile.gettempdir()
+    })
+    try:
+        formats = _formats(workbook)
+        for sheet_name, columns, rows in sheets:
+            write_sheet(workbook, formats, sheet_name, columns, rows, progress=progress)
+    finally:
+        workbook.close()
+
+
+def build_workbook(sheets):
+    """The workbook in a rewound, per-request spooled temp file."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_workbook(spool, sheets)
+    spool.seek(0)
+    return spool
+
+
+def xlsx_response(sheets, filename):
+    """Build the workbook and send it as an attachment."""
+    return send_file(
+        build_workbook(sheets),
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=filename
+    )
+
+
+# =========================
+# REPORT LAYOUTS
+# =========================
+MONTHLY_PAYROLL_COLUMNS = [
+    SERIAL,
+    Column('labour_name', 'Name', 'text', 28),
+    Column('total_shifts', 'Total Shifts', 'int'),
+    Column('day_shift', 'Day Shift', 'int'),
+    Column('night_shift', 'Night Shift', 'int'),
+    Column('total_pay', 'Total Pay', 'money'),
+    Column('advance_paid', 'Advance Paid', 'money'),
+    Column('expenses', 'Expenses', 'money'),
+    Column('net_payable', 'Net Payable', 'money'),
+]
+
+SALARY_SHEET_COLUMNS = [
+    SERIAL,
+    Column('labour_name', 'Name', 'text', 28),
+    Column('bank_account', 'Bank Account', 'text', 22),
+    Column('ifsc_code', 'IFSC Code', 'text', 16),
+    Column('total_pay', 'Total Pay', 'money'),
+]
+
+ALL_SITES_COLUMNS = [
+    SERIAL,
+    Column('labour_name', 'Name', 'text', 28),
+    Column('site_name', 'Site', 'text', 20),
+    Column('bank_account', 'Bank Account', 'text', 22),
+    Column('ifsc_code', 'IFSC Code', 'text', 16),
+    Column('total_shifts', 'Total Shifts', 'int'),
+    Column('day_shift', 'Day Shift', 'int'),
+    Column('night_shift', 'Night Shift', 'int'),
+    Column('total_pay', 'Total Pay', 'money'),
+    Column('advance_paid', 'Advance Paid', 'money'),
+    Column('expenses', 'Expenses', 'money'),
+    Column('net_payable', 'Net Payable', 'money'),
+]
@@ -0,0 +1,109 @@
+/* =========================================================
+   Attendance grid autosave
+   Sends only the cells that changed as
+   {labour_id, shift, value} deltas with the (site, date)
+   version token; the full "Save Attendance" post still works.
+   ========================================================= */
+
+const AUTOSAVE_DELAY_MS = 600;
+const AUTOSAVE_RETRY_MS = 5000;
+
+document.addEventListener("DOMContentLoaded", function () {
+
+  const grid = document.getElementById("attendance-grid");
+  if (!grid || grid.dataset.readonly) return;
+
+  const status = document.getElementById("autosave-status");
+
+  let version = parseInt(grid.dataset.version || "0", 10);
+  let pending = {};      // "labourId:shift" -> change
+  let timer = null;
+  let inFlight = false;
+
+  function setStatus(text, cls) {
+    if (!status) return;
+    status.innerText = text;
+    status.className = "small " + (cls || "text-muted");
+  }
+
+  function schedule(delay) {
+    clearTimeout(timer);
+    timer = setTimeout(flush, delay);
+  }
+
+  grid.querySelectorAll("select[data-labour-id]").forEach(sel => {
+    sel.addEventListener("change", function () {
+      const key = `${this.dataset.labourId}:${this.dataset.shift}`;
+      pending[key] = {
+        labour_id: parseInt(this.dataset.labourId, 10),
+        shift: this.dataset.shift,
+        value: parseInt(this.value, 10)
+      };
+      setStatus("Unsaved changes…");
+      schedule(AUTOSAVE_DELAY_MS);
+    });
+  });
+
+  function flush() {
+    const changes = Object.values(pending);
+    if (!changes.length || inFlight) return;
+
+    const sent = pending;
+    pending = {};
+    inFlight = true;
+    setStatus("Saving…");
+
+    fetch(grid.dataset.autosaveUrl, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        date: grid.dataset.date,
+        version: version,
+        changes: changes
+      })
+    })
+      .then(res => res.json().then(data => ({ res, data })))
+      .then(({ res, data }) => {
+        inFlight = false;
+
+        if (res.ok) {
+          version = data.version;
+          grid.dataset.version = version;
+          setStatus(`Saved · ${data.present} present`, "text-success");
+          if (Object.keys(pending).length) schedule(0);
+          return;
+        }
+
+        if (res.status === 409) {
+          applyServerCells(data.cells);
+          setStatus(data.error || "Changed elsewhere — reloaded.", "text-danger");
+          if (data.version !== undefined) version = data.version;
+          return;
+        }
+
+        setStatus(data.error || "Autosave failed", "text-danger");
+      })
+      .catch(() => {
+        // offline / flaky network: keep the cells and retry
+        inFlight = false;
+        pending = Object.assign(sent, pending);
+        setStatus("Offline — will retry", "text-warning");
+        schedule(AUTOSAVE_RETRY_MS);
+      });
+  }
+
+  function applyServerCells(cells) {
+    if (!cells) return;
+    grid.querySelectorAll("select[data-labour-id]").forEach(sel => {
+      const cell = cells[sel.dataset.labourId];
+      const idx = sel.dataset.shift === "day" ? 0 : 1;
+      sel.value = cell ? String(cell[idx]) : "0";
+    });
+  }
+
+  // a full form post supersedes anything still queued
+  grid.addEventListener("submit", function () {
+    clearTimeout(timer);
+    pending = {};
+  });
+});
@@ -0,0 +1,77 @@
+/* =========================================================
+   Background export jobs
+   Any element with data-export-kind submits a job to
+   /admin/exports, shows progress on the button and downloads
+   the file when it is ready. The href stays as a fallback.
+   ========================================================= */
+
+const EXPORT_POLL_MS = 1000;
+
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("[data-export-kind]").forEach(el => {
+    el.addEventListener("click", function (e) {
+      e.preventDefault();
+      startExportJob(this);
+    });
+  });
+});
+
+function startExportJob(btn) {
+  if (btn.dataset.exportBusy) return;
+
+  const params = JSON.parse(btn.dataset.exportParams || "{}");
+  params.kind = btn.dataset.exportKind;
+
+  const label = btn.innerHTML;
+  btn.dataset.exportBusy = "1";
+  btn.classList.add("disabled");
+
+  const done = () => {
+    delete btn.dataset.exportBusy;
+    btn.classList.remove("disabled");
+    btn.innerHTML = label;
+  };
+
+  fetch("/admin/exports", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(params)
+  })
+    .then(res => res.json().then(data => {
+      if (!res.ok) throw new Error(data.error || "Export failed");
+      return data;
+    }))
+    .then(job => pollExportJob(job, btn, done))
+    .catch(err => {
+      done();
+      alert(err.message);
+    });
+}
+
+function pollExportJob(job, btn, done) {
+  if (job.status === "done") {
+    done();
+    window.location = job.download_url;
+    return;
+  }
+
+  if (job.status === "failed") {
+    done();
+    alert("Export failed: " + (job.error || "unknown error"));
+    return;
+  }
+
+  btn.innerText = job.status === "queued"
+    ? "Queued…"
+    : `Exporting ${job.progress}%`;
+
+  setTimeout(() => {
+    fetch(`/admin/exports/${job.id}`)
+      .then(res => res.json())
+      .then(next => pollExportJob(next, btn, done))
+      .catch(err => {
+        done();
+        alert(err.message);
+      });
+  }, EXPORT_POLL_MS);
+}
@@ -0,0 +1,54 @@
+/* =========================================================
+   Labour search typeahead
+   Fills the search box's <datalist> from the indexed
+   /api/labours/search endpoint as the user types.
+   ========================================================= */
+
+const TYPEAHEAD_DELAY_MS = 200;
+const TYPEAHEAD_MIN_CHARS = 2;
+
+document.addEventListener("DOMContentLoaded", function () {
+
+  document.querySelectorAll("input[data-typeahead-url]").forEach(input => {
+    const list = document.getElementById(input.getAttribute("list"));
+    if (!list) return;
+
+    const siteSelect = input.form ? input.form.querySelector("select[name='site_id']") : null;
+    let timer = null;
+    let lastQuery = "";
+    let controller = null;
+
+    function render(results) {
+      list.innerHTML = "";
+      results.forEach(r => {
+        const opt = document.createElement("option");
+        opt.value = r.name;
+        opt.label = [r.phone, r.gate_pass_id].filter(Boolean).join(" · ");
+        list.appendChild(opt);
+      });
+    }
+
+    function lookup() {
+      const q = input.value.trim();
+      if (q.length < TYPEAHEAD_MIN_CHARS || q === lastQuery) return;
+      lastQuery = q;
+
+      // only the latest keystroke matters
+      if (controller) controller.abort();
+      controller = new AbortController();
+
+      const params = new URLSearchParams({ q: q });
+      if (siteSelect && siteSelect.value) params.set("site_id", siteSelect.value);
+
+      fetch(`${input.dataset.typeaheadUrl}?${params}`, { signal: controller.signal })
+        .then(res => res.ok ? res.json() : { results: [] })
+        .then(data => render(data.results || []))
+        .catch(() => {});
+    }
+
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      timer = setTimeout(lookup, TYPEAHEAD_DELAY_MS);
+    });
+  });
+});
@@ -12,6 +12,13 @@ function getApiBase() {
 const API_BASE = getApiBase();
 let CURRENT_LABOUR_ID = null;
 
+/* month -> { labourId: summary } filled by the batch endpoint */
+const SUMMARY_CACHE = {};
+
+/* photo renditions come as JPEG + WebP; pick WebP where it decodes */
+const SUPPORTS_WEBP = document.createElement("canvas")
+  .toDataURL("image/webp").startsWith("data:image/webp");
+
 /* ---------- DOM READY ---------- */
 document.addEventListener("DOMContentLoaded", function () {
 
@@ -31,12 +38,56 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   }
 
+  const printBtn = document.getElementById("print-site-summaries");
+  if (printBtn) {
+    printBtn.addEventListener("click", function () {
+      printSiteSummaries(this.dataset.siteId, currentMonth());
+    });
+  }
+
+  /* warm the cache for the rows on this page (one request) */
+  prefetchSummaries(visibleLabourIds(), currentMonth());
+
 });
 
+/* ---------- HELPERS ---------- */
+function currentMonth() {
+  const today = new Date();
+  return `${today.getFullYear()}-${String(today.getMonth() + 1).padStart(2, "0")}`;
+}
+
+function visibleLabourIds() {
+  const ids = new Set();
+  document.querySelectorAll(".labour-link").forEach(el => {
+    if (el.dataset.labourId) ids.add(el.dataset.labourId);
+  });
+  return Array.from(ids);
+}
+
+function fetchSummaries(params) {
+  return fetch(`/${API_BASE}/api/labours/monthly-summary?${params}`)
+    .then(res => {
+      if (!res.ok) throw new Error("API error");
+      return res.json();
+    });
+}
+
+/* ---------- BATCH PREFETCH ---------- */
+function prefetchSummaries(labourIds, month) {
+  if (!API_BASE || !labourIds.length) return Promise.resolve();
+
+  const params = new URLSearchParams({ month: month, ids: labourIds.join(",") });
+
+  return fetchSummaries(params)
+    .then(data => {
+      SUMMARY_CACHE[month] = Object.assign(SUMMARY_CACHE[month] || {}, data.summaries);
+    })
+    .catch(err => console.error(err));
+}
+
 /* ---------- OPEN MODAL ---------- */
 function openModalWithCurrentMonth() {
-  const today = new Date();
-  const monthStr = `${today.getFullYear()}-${String(today.getMonth() + 1).padStart(2, "0")}`;
+  const monthStr = currentMonth();
 
   const monthInput = document.getElementById("month-selector");
   if (monthInput) monthInput.value = monthStr;
@@ -49,16 +100,31 @@ function openModalWithCurrentMonth() {
 }
 
 /* ---------- LOAD DATA ---------- */
+function showSummary(data, month) {
+  fillModal(data);
+  renderCalendar(data.calendar, month);
+}
+
 function loadLabourSummary(labourId, month) {
 
+  const cached = (SUMMARY_CACHE[month] || {})[labourId];
+  if (cached) {
+    showSummary(cached, month);
+    return;
+  }
+
   fetch(`/${API_BASE}/api/labour/${labourId}/monthly-summary?month=${month}`)
     .then(res => {
       if (!res.ok) throw new Error("API error");
       return res.json();
     })
     .then(data => {
-      fillModal(data);
-      renderCalendar(data.calendar, month);
+      showSummary(data, month);
+
+      /* other months: fetch the rest of the page in the background */
+      if (!SUMMARY_CACHE[month]) {
+        prefetchSummaries(visibleLabourIds().filter(id => id !== String(labourId)), month);
+      }
     })
     .catch(err => {
       console.error(err);
@@ -66,6 +132,83 @@ function loadLabourSummary(labourId, month) {
     });
 }
 
+/* ---------- PRINT SITE SUMMARIES ---------- */
+function printSiteSummaries(siteId, month) {
+
+  const params = new URLSearchParams({ month: month });
+  if (siteId) params.set("site_id", siteId);
+
+  fetchSummaries(params)
+    .then(data => {
+      const rows = Object.values(data.summaries).map((s, i) => `
+        <tr>
+          <td>${i + 1}</td>
+          <td>${escapeHtml(s.labour.name)}</td>
+          <td>${escapeHtml(s.labour.gate_pass_id)}</td>
+          <td>${s.attendance_summary.day_shifts}</td>
+          <td>${s.attendance_summary.night_shifts}</td>
+          <td>${s.attendance_summary.total_shifts}</td>
+          <td>${s.attendance_summary.absent_days}</td>
+          <td>${s.payment_summary.daily_wage}</td>
+          <td>${s.payment_summary.earned_pay}</td>
+          <td>${s.payment_summary.advance_paid}</td>
+          <td>${s.payment_summary.mess_canteen}</td>
+          <td>${s.payment_summary.net_payable}</td>
+        </tr>`).join("");
+
+      const first = Object.values(data.summaries)[0];
+      const siteName = first ? escapeHtml(first.labour.site) : "";
+
+      const shown = Object.keys(data.summaries).length;
+      const notice = data.truncated
+        ? `<p class="truncated">Showing ${shown} of ${data.total} labours &mdash; the rest were not included in this printout.</p>`
+        : "";
+
+      if (data.truncated) {
+        alert(`Only the first ${shown} of ${data.total} labours will be printed.`);
+      }
+
+      const win = window.open("", "_blank");
+      if (!win) return;
+
+      win.document.write(`
+        <html>
+        <head>
+          <title>Monthly Summaries ${data.month}</title>
+          <style>
+            body { font-family: sans-serif; font-size: 12px; }
+            table { border-collapse: collapse; width: 100%; }
+            th, td { border: 1px solid #999; padding: 4px 6px; text-align: left; }
+            th { background: #eee; }
+            .truncated { color: #b00; font-weight: bold; }
+          </style>
+        </head>
+        <body>
+          <h3>${siteName} &mdash; ${data.month}</h3>
+          ${notice}
+          <table>
+            <thead>
+              <tr>
+                <th>#</th><th>Name</th><th>Gate Pass</th>
+                <th>Day</th><th>Night</th><th>Total</th><th>Absent</th>
+                <th>Wage</th><th>Earned</th><th>Advance</th>
+                <th>Mess/Canteen</th><th>Net Payable</th>
+              </tr>
+            </thead>
+            <tbody>${rows}</tbody>
+          </table>
+        </body>
+        </html>`);
+      win.document.close();
+      win.focus();
+      win.print();
+    })
+    .catch(err => {
+      console.error(err);
+      alert("Failed to load site summaries");
+    });
+}
+
 /* ---------- FILL MODAL ---------- */
 function fillModal(data) {
 
@@ -86,7 +229,10 @@ function fillModal(data) {
   setText("ps-net", data.payment_summary.net_payable);
 
   /* ---------- PHOTO ---------- */
-  const photoUrl = data.labour.photo_url || "/static/img/user.png";
+  // 240px rendition; WebP when the browser can decode it
+  const photoUrl = (SUPPORTS_WEBP && data.labour.photo_webp_url)
+    || data.labour.photo_url
+    || "/static/img/user.png";
   const avatar = document.getElementById("ls-avatar");
   const photo = document.getElementById("ls-photo");
   
@@ -183,3 +329,9 @@ function setText(id, value) {
   const el = document.getElementById(id);
   if (el) el.innerText = value ?? "-";
 }
+
+function escapeHtml(value) {
+  const div = document.createElement("div");
+  div.innerText = value ?? "-";
+  return div.innerHTML;
+}
@@ -0,0 +1,117 @@
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app as flask_app  # noqa: E402
+from models import db, Attendance, Labour, PayrollRun, Site, User  # noqa: E402
+from services.attendance_sync_service import (  # noqa: E402
+    apply_sync_ops,
+    changes_since,
+    parse_ops,
+)
+
+DAY = date.today() - timedelta(days=1)
+
+
+@pytest.fixture()
+def site():
+    flask_app.config.update(TESTING=True)
+    with flask_app.app_context():
+        db.create_all()
+        site = Site(site_name='North Yard')
+        db.session.add(site)
+        db.session.flush()
+        manager = User(username='mgr', password='x', role='manager', site_id=site.id)
+        labours = [
+            Labour(name=f'Labour {i}', phone=f'90000000{i:02d}', site_id=site.id, is_active=True)
+            for i in range(3)
+        ]
+        db.session.add_all([manager, *labours])
+        db.session.commit()
+
+        yield site, manager, labours
+
+        db.session.remove()
+        db.drop_all()
+
+
+def _op(op_id, labour, edited_at, day=DAY, shift=1):
+    return {
+        'op_id': op_id,
+        'labour_id': labour.id,
+        'date': day.isoformat(),
+        'day_shift': shift,
+        'night_shift': 0,
+        'updated_at': edited_at.isoformat(),
+    }
+
+
+def _sync(site, manager, *ops):
+    results = apply_sync_ops(site.id, parse_ops(list(ops)), user=manager)
+    return {r['op_id']: r['status'] for r in results}
+
+
+def _flags(labour, day=DAY):
+    row = Attendance.query.filter_by(labour_id=labour.id, date=day).one()
+    return bool(row.day_shift_flag), bool(row.night_shift_flag)
+
+
+def test_replayed_op_is_duplicate_and_changes_nothing(site):
+    site, manager, (labour, *_) = site
+    edited = datetime.utcnow() - timedelta(minutes=5)
+
+    assert _sync(site, manager, _op('op-1', labour, edited)) == {'op-1': 'applied'}
+
+    replay = apply_sync_ops(site.id, parse_ops([_op('op-1', labour, edited, shift=0)]), user=manager)
+
+    assert replay == [{'op_id': 'op-1', 'status': 'duplicate', 'original': 'applied'}]
+    assert _flags(labour) == (True, False)
+
+
+def test_last_write_wins_on_edit_time(site):
+    site, manager, (labour, *_) = site
+    now = datetime.utcnow()
+
+    assert _sync(site, manager, _op('late', labour, now - timedelta(minutes=1))) == {'late': 'applied'}
+    # queued offline earlier, uploaded afterwards: loses to the newer edit
+    assert _sync(site, manager, _op('early', labour, now - timedelta(minutes=10), shift=0)) == {'early': 'stale'}
+    assert _flags(labour) == (True, False)
+
+    # inside one batch the newest edit of a cell wins whatever the order
+    statuses = _sync(
+        site, manager,
+        _op('b2', labour, now, shift=0),
+        _op('b1', labour, now - timedelta(seconds=30)),
+    )
+    assert statuses == {'b2': 'applied', 'b1': 'stale'}
+    assert _flags(labour) == (False, False)
+
+
+def test_closed_month_is_rejected(site):
+    site, manager, (labour, *_) = site
+    db.session.add(PayrollRun(site_id=site.id, month=DAY.strftime('%Y-%m')))
+    db.session.commit()
+
+    assert _sync(site, manager, _op('op-1', labour, datetime.utcnow())) == {'op-1': 'rejected'}
+    assert Attendance.query.count() == 0
+
+
+def test_pull_pages_with_cursor_and_holds_back_unsettled_rows(site):
+    site, manager, labours = site
+    edited = datetime.utcnow() - timedelta(minutes=5)
+    _sync(site, manager, *[_op(f'op-{l.id}', l, edited) for l in labours])
+
+    # rows written just now are not settled yet
+    assert changes_since(site.id, lag=60) == ([], None, False)
+
+    first, cursor, has_more = changes_since(site.id, limit=2, lag=0)
+    assert len(first) == 2 and has_more
+
+    rest, cursor, has_more = changes_since(site.id, cursor, limit=2, lag=0)
+    assert len(rest) == 1 and not has_more
+    assert {r['labour_id'] for r in first + rest} == {l.id for l in labours}
+
+    assert changes_since(site.id, cursor, lag=0) == ([], cursor, False)
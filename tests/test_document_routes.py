@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app as flask_app  # noqa: E402
+
+NAME = 'ab' + '0' * 62 + '.jpg'
+
+
+@pytest.fixture()
+def client(tmp_path):
+    flask_app.config.update(
+        TESTING=True,
+        LOGIN_DISABLED=True,
+        DOCUMENT_STORE_DIR=str(tmp_path),
+        DOCUMENT_ACCEL_PREFIX=None,
+        DOCUMENT_MAX_AGE=31536000,
+    )
+    (tmp_path / NAME[:2]).mkdir()
+    (tmp_path / NAME[:2] / NAME).write_bytes(b'\xff\xd8\xff\xe0jpeg')
+    return flask_app.test_client()
+
+
+def _directives(response):
+    return {d.strip() for d in response.headers['Cache-Control'].split(',')}
+
+
+def test_document_is_cached_as_private_immutable(client):
+    response = client.get(f'/documents/{NAME}')
+
+    assert response.status_code == 200
+    assert _directives(response) == {'private', 'max-age=31536000', 'immutable'}
+    assert response.headers['ETag'] == f'"{NAME}"'
+
+
+def test_revalidation_returns_304_with_same_cache_headers(client):
+    response = client.get(f'/documents/{NAME}', headers={'If-None-Match': f'"{NAME}"'})
+
+    assert response.status_code == 304
+    assert _directives(response) == {'private', 'max-age=31536000', 'immutable'}
+
+
+def test_accel_redirect_is_cached_as_private_immutable(client):
+    flask_app.config['DOCUMENT_ACCEL_PREFIX'] = '/_documents'
+
+    response = client.get(f'/documents/{NAME}')
+
+    assert response.headers['X-Accel-Redirect'] == f'/_documents/ab/{NAME}'
+    assert _directives(response) == {'private', 'max-age=31536000', 'immutable'}
+
+
+def test_unknown_document_is_404(client):
+    assert client.get('/documents/' + 'cd' + '0' * 62 + '.jpg').status_code == 404
+    assert client.get('/documents/not-a-key.jpg').status_code == 404